@@ -7,24 +7,33 @@ from .software.baseclass import ProxyHTTPRequestHandler
 
 __all__ = []
 
+import asyncio
 import logging
 import os
+import socket
 import time
-import glob
+import hashlib
 import json
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from http.server import HTTPServer, HTTPStatus
 from queue import Queue
-from threading import Thread
-from typing import Mapping, Any, MutableSet, MutableSequence
+from threading import Event, Thread
+from typing import Mapping, Any, MutableSet, MutableSequence, NamedTuple, Optional, Callable, Tuple, Dict, Hashable
 
 from baseclass import SimplePipe
 
+from .catalog import Catalog
+from .server import PooledHTTPServer
 from .sg_config import SG_CONFIG
 from database.ShotGridDatabase import ShotGridDatabase
+from database.snapshot_store import SnapshotStore
 
 from . import software
 from .software.interface import SoftwareProxyInterface
+from .software.shared.helper.utilities.metadata_index import get_metadata_index
+from .software.shared.helper.utilities.path_resolver import get_path_resolver
+from .software.shared.proxy import schema
 from urllib.parse import urlparse, parse_qs
 
 log = logging.getLogger(__name__)
@@ -75,78 +84,359 @@ log = logging.getLogger(__name__)
 #   When inside software, ``import pipe`` imports the software's pipe tools
 
 
+def _encode_list(items) -> bytes:
+    return ','.join(items).encode('utf-8')
+
+
+def _encode_json(data) -> bytes:
+    return json.dumps(data).encode('utf-8')
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+class PipeRoute(NamedTuple):
+    """How the pipe server answers requests to one path."""
+
+    pipe_method: str
+    """The AccomplicePipe method that takes the parsed query."""
+
+    encode: Optional[Callable[[Any], bytes]] = None
+    """Turns the method's result into the response body, if any."""
+
+    kind: Optional[str] = None
+    """The schema kind of the result, for clients that accept schema.MEDIA_TYPE."""
+
+    after_response: bool = False
+    """Call the method only once the response has been sent."""
+
+    def encode_result(self, result: Any, accept: Optional[str]) -> Tuple[bytes, str]:
+        """Encode a result in the format the client accepts. Returns the body and its content type."""
+        if self.kind is not None and schema.accepts(accept):
+            return schema.encode(self.kind, result), schema.MEDIA_TYPE
+        if self.encode is not None:
+            return self.encode(result), 'text/plain'
+        return b'', 'text/plain'
+
+
+ROUTES: Mapping[Tuple[str, str], PipeRoute] = {
+    ('GET', '/assets'): PipeRoute('get_assets', _encode_list, 'strings'),
+    ('GET', '/assets/bulk'): PipeRoute('get_assets_bulk', _encode_json, 'assets'),
+    ('GET', '/characters'): PipeRoute('get_characters', _encode_list, 'strings'),
+    ('GET', '/shot'): PipeRoute('get_shot', _encode_json, 'shot'),
+    ('GET', '/shots'): PipeRoute('get_shots', _encode_list, 'strings'),
+    ('GET', '/shots/bulk'): PipeRoute('get_shots_bulk', _encode_json, 'shots'),
+    ('GET', '/generation'): PipeRoute('get_generation', str.encode, 'generation'),
+    ('GET', '/catalog/asset_dir'): PipeRoute('find_asset_dir', _encode_list, 'strings'),
+    ('GET', '/catalog/asset_metadata'): PipeRoute('get_asset_metadata', _encode_json, 'metadata'),
+    ('GET', '/catalog/files'): PipeRoute('find_files', _encode_list, 'strings'),
+    ('GET', '/catalog/glob'): PipeRoute('glob_files', _encode_list, 'strings'),
+    ('POST', '/create_asset'): PipeRoute('create_asset', _encode_json, 'asset'), # Send back the asset that was created
+    ('POST', '/refresh'): PipeRoute('refresh_database'),
+    ('POST', '/client/exit'): PipeRoute('exit', after_response=True),
+}
+"""Maps each (method, path) the pipe server supports to its route."""
+
+
 class PipeRequestHandler(BaseHTTPRequestHandler):
     pipe = None
 
+    # Keep connections open between requests. Every response must then
+    # carry a Content-Length so clients know where it ends.
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True # Headers and body are written separately
+
+    # The timeouts come from the server (see PooledHTTPServer), so
+    # there's no handler-wide timeout for StreamRequestHandler.setup()
+    # to apply over them
+
     def __init__(self, pipe: SimplePipe, *args) -> None:
         # TODO: pipe was initially an instance of SimplePipe, but it might make sense to somewhere cast it to AccomplicePipe because this class calls several methods specific to AccomplicePipe
         self.pipe = pipe
+        self._requests_handled = 0
         super().__init__(*args)
 
-    def send_okay(self):
+    def handle_one_request(self):
+        # Between requests, only hold a kept-alive connection as long as
+        # the server allows
+        if self._requests_handled:
+            self.connection.settimeout(getattr(self.server, 'keep_alive_timeout', None))
+        super().handle_one_request()
+        self._requests_handled += 1
+
+    def parse_request(self):
+        # Once a request has started, give it the server's request timeout
+        if hasattr(self.server, 'request_timeout'):
+            self.connection.settimeout(self.server.request_timeout)
+        return super().parse_request()
+
+    def end_headers(self):
+        # An idle keep-alive connection ties up a worker thread, so close
+        # it if other connections are waiting for one. Servers that can't
+        # say handle one request at a time, so always close.
+        if not self.close_connection and getattr(self.server, 'pending_requests', 1):
+            self.send_header('Connection', 'close')
+        super().end_headers()
+
+    def send_okay(self, body: bytes = b'', etag: Optional[str] = None, content_type: str = 'text/plain'):
+        # Let clients revalidate cached responses with If-None-Match
+        if etag is not None and self.headers.get('If-None-Match') == etag:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
         self.send_response(HTTPStatus.OK)
-        self.send_header('Content-type', 'text/plain')
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            self.send_header('ETag', etag)
         self.end_headers()
+        self.wfile.write(body)
     
     def send_not_implemented_error(self):
         self.send_response(HTTPStatus.NOT_IMPLEMENTED)
         self.send_header('Content-type', 'text/html')
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
-    def do_POST(self):
-        log.info(f"Handling POST request with path {self.path}")
+    def _handle_request(self, method: str):
+        log.info(f"Handling {method} request with path {self.path}")
+
+        # Nothing reads request bodies yet, but they have to be consumed
+        # so the next request on the connection starts in the right place
+        content_length = int(self.headers.get('Content-Length', 0))
+        if content_length:
+            self.rfile.read(content_length)
+
         try:
-            url=urlparse(self.path)
+            url = urlparse(self.path)
+            route = ROUTES.get((method, url.path))
+            if route is None:
+                self.send_not_implemented_error()
+                return
 
-            if url.path == '/create_asset':
-                asset_dict = self.pipe.create_asset(parse_qs(url.query))
-                self.send_okay()
-                asset_string = json.dumps(asset_dict)
-                self.wfile.write(asset_string.encode('utf-8')) # Send back the asset that was created
-            elif url.path == '/client/exit':
+            pipe_method = getattr(self.pipe, route.pipe_method)
+            if route.after_response:
                 self.send_okay()
-                self.pipe.exit()
-            else:
-                self.send_not_implemented_error()
+                pipe_method()
+                return
+
+            result = pipe_method(parse_qs(url.query))
+            body, content_type = route.encode_result(result, self.headers.get('Accept'))
+            self.send_okay(body, _etag(body) if method == 'GET' else None, content_type)
         except Exception as ex:
-            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, message=ex.__str__)
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, message=str(ex))
+
+    def do_POST(self):
+        self._handle_request('POST')
 
     def do_GET(self):
-        log.info(f"Handling GET request with path {self.path}")
+        self._handle_request('GET')
 
-        try:
-            url = urlparse(self.path)
 
-            if url.path == '/assets':
-                assets = self.pipe.get_assets(parse_qs(url.query))
-                self.send_okay()
+class AsyncPipeServer:
+    """An asyncio alternative to serving PipeRequestHandler.
 
-                asset_data = ','.join(assets)
-                self.wfile.write(asset_data.encode('utf-8'))
-            elif url.path == '/characters':
-                characters = self.pipe.get_characters(parse_qs(url.query))
-                self.send_okay()
+    Connections are handled on one event loop thread, and the blocking
+    pipe (and so ShotGrid) calls run in a thread pool. Identical GET
+    requests that arrive while one is already in flight share its result
+    instead of querying the database again.
 
-                character_data = ','.join(characters)
-                self.wfile.write(character_data.encode('utf-8'))
-            elif url.path == '/shot':
-                shot = self.pipe.get_shot(parse_qs(url.query))
-                self.send_okay()
-                shot_string = json.dumps(shot)
-                self.wfile.write(shot_string.encode('utf-8'))
-            
-            elif url.path == '/shots':
-                shots = self.pipe.get_shots(parse_qs(url.query))
-                self.send_okay()
+    Exposes the same serve_forever(), shutdown(), server_close() and
+    server_port as http.server.HTTPServer.
+    """
 
-                shot_data = ','.join(shots)
-                self.wfile.write(shot_data.encode('utf-8'))
-            else:
-                self.send_response(HTTPStatus.NOT_IMPLEMENTED)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
+    def __init__(
+        self,
+        pipe: SimplePipe,
+        server_address: Tuple[str, int],
+        workers: int = 8,
+        request_timeout: Optional[float] = 60,
+        keep_alive_timeout: Optional[float] = 10,
+    ) -> None:
+        self.pipe = pipe
+        self.request_timeout = request_timeout
+        self.keep_alive_timeout = keep_alive_timeout
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='PipeWorker')
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._connections: MutableSet[asyncio.StreamWriter] = set()
+        self._loop = None
+        self._stop = None
+        self._stopped = Event()
+        self._stopped.set()
+
+        # Bind now so the port is known before the software is launched
+        self._socket = socket.create_server(server_address)
+        self.server_port = self._socket.getsockname()[1]
+
+    def serve_forever(self) -> None:
+        self._stopped.clear()
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self._stopped.set()
+
+    def shutdown(self) -> None:
+        """Stop serve_forever() and wait for it to return.
+
+        Like HTTPServer.shutdown(), this must be called from a different
+        thread than serve_forever() or it will deadlock.
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+            self._stopped.wait()
+
+    def server_close(self) -> None:
+        self._socket.close()
+        self._executor.shutdown(wait=True)
+
+    async def _serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        server = await asyncio.start_server(self._handle_connection, sock=self._socket)
+        async with server:
+            await self._stop.wait()
+
+            # Hang up on idle keep-alive connections so their handlers finish
+            for writer in list(self._connections):
+                writer.close()
+            while self._connections:
+                await asyncio.sleep(0.01)
+
+    def _call_pipe(self, method: str, route: PipeRoute, query: Mapping[str, Any]) -> asyncio.Future:
+        """Run the route's pipe method in the thread pool, coalescing identical GETs.
+
+        Each GET waits on the shared future through its own shield, so a
+        client that disconnects doesn't cancel it for the others.
+        """
+        pipe_method = getattr(self.pipe, route.pipe_method)
+        if method != 'GET':
+            return self._loop.run_in_executor(self._executor, pipe_method, query)
+
+        key = (route.pipe_method, tuple(sorted((k, tuple(v)) for k, v in query.items())))
+        future = self._in_flight.get(key)
+        if future is None:
+            future = self._loop.run_in_executor(self._executor, pipe_method, query)
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return asyncio.shield(future)
+
+    async def _read_headers(self, reader: asyncio.StreamReader) -> Dict[str, str]:
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return headers
+            key, _, value = line.decode('iso-8859-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """Read a request's method, path, headers, and whether to keep the connection open.
+
+        Returns None once the client closes the connection.
+        """
+        request_line = await asyncio.wait_for(reader.readline(), self.keep_alive_timeout)
+        if not request_line:
+            return None
+        method, path, version = request_line.decode('iso-8859-1').split(' ', 2)
+
+        headers = await asyncio.wait_for(self._read_headers(reader), self.request_timeout)
+        content_length = int(headers.get('content-length', 0))
+        if content_length:
+            await asyncio.wait_for(reader.readexactly(content_length), self.request_timeout)
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' and (
+            version.strip() == 'HTTP/1.1' or connection == 'keep-alive')
+        return method, path, headers, keep_alive
+
+    async def _write_response(
+        self,
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        body: bytes = b'',
+        content_type: str = 'text/plain',
+        keep_alive: bool = False,
+        etag: Optional[str] = None,
+    ) -> None:
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        )
+        if etag is not None:
+            head += f"ETag: {etag}\r\n"
+        head += "\r\n"
+        writer.write(head.encode('iso-8859-1') + body)
+        await writer.drain()
+
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        method: str,
+        path: str,
+        headers: Mapping[str, str],
+        keep_alive: bool,
+    ) -> bool:
+        """Answer one request. Returns whether the connection stays open."""
+        log.info(f"Handling {method} request with path {path}")
+
+        url = urlparse(path)
+        route = ROUTES.get((method, url.path))
+        if route is None:
+            await self._write_response(writer, HTTPStatus.NOT_IMPLEMENTED,
+                                       content_type='text/html', keep_alive=keep_alive)
+            return keep_alive
+
+        if route.after_response:
+            await self._write_response(writer, HTTPStatus.OK)
+            getattr(self.pipe, route.pipe_method)()
+            return False
+
+        try:
+            result = await self._call_pipe(method, route, parse_qs(url.query))
+            body, content_type = route.encode_result(result, headers.get('accept'))
         except Exception as ex:
-            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, message=ex.__str__)
+            log.exception(f"Error handling {path}")
+            await self._write_response(writer, HTTPStatus.INTERNAL_SERVER_ERROR,
+                                       str(ex).encode('utf-8'), keep_alive=keep_alive)
+            return keep_alive
+        if method != 'GET':
+            await self._write_response(writer, HTTPStatus.OK, body, content_type, keep_alive)
+            return keep_alive
+
+        # Let clients revalidate cached responses with If-None-Match
+        etag = _etag(body)
+        if headers.get('if-none-match') == etag:
+            await self._write_response(writer, HTTPStatus.NOT_MODIFIED, keep_alive=keep_alive, etag=etag)
+        else:
+            await self._write_response(writer, HTTPStatus.OK, body, content_type, keep_alive, etag)
+        return keep_alive
+
+    async def _handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        self._connections.add(writer)
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await self._read_request(reader)
+                except asyncio.TimeoutError:
+                    break # The client left the connection idle
+                if request is None:
+                    break
+                keep_alive = await self._respond(writer, *request)
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError) as ex:
+            log.warning(f"Dropping connection: {ex!r}")
+        finally:
+            self._connections.discard(writer)
+            writer.close()
 
 
 class AccomplicePipe(SimplePipe):
@@ -166,11 +456,38 @@ class AccomplicePipe(SimplePipe):
 
     _data_root = "/groups/accomplice/pipeline/production"
 
+    _database_refresh_interval = 60
+    """How often (in seconds) to sync the database snapshot with ShotGrid."""
+
+    _server_workers = 8
+    """How many requests the pipe server handles at once. Use 0 to handle them one at a time."""
+
+    _request_timeout = 60
+    """How long (in seconds) a client connection may stall before it is dropped."""
+
+    _keep_alive_timeout = 10
+    """How long (in seconds) an idle keep-alive connection is held before it is closed."""
+
+    _server_engine = os.getenv('PIPE_SERVER_ENGINE', 'threaded')
+    """Which pipe server to run: 'threaded' or 'asyncio'."""
+
+    _catalog = None
+
+    _catalog_roots = ('asset', 'assets', 'sequences')
+    """The directories under the data root to keep a catalog of."""
+
+    _catalog_watch = os.getenv('PIPE_CATALOG_WATCH', 'auto')
+    """How the catalog notices changes: 'inotify', 'poll' or 'auto'."""
+
+    _catalog_poll_interval = 30
+    """How often (in seconds) the catalog polls for changes when it can't use inotify."""
+
     _database = ShotGridDatabase(
         SG_CONFIG['SITE_NAME'],
         SG_CONFIG['SCRIPT_NAME'],
         SG_CONFIG['SCRIPT_KEY'],
-        SG_CONFIG['ACCOMPLICE_ID']
+        SG_CONFIG['ACCOMPLICE_ID'],
+        snapshot_store=SnapshotStore(SG_CONFIG['ACCOMPLICE_ID']),
     )
 
     @property
@@ -192,14 +509,19 @@ class AccomplicePipe(SimplePipe):
             self.launch(*software)
 
     def launch(self, *software: str) -> None:
+        if software:
+            # Load every asset and shot in the background so menus can be
+            # served from memory once it's done
+            self._database.preload(self._database_refresh_interval, background=True)
+            self._start_catalog()
+
         for name in software:
             if name == 'houdini_old':
                 self.launch_software(name)
             else:
                 # Initialize the pipe server
                 log.info(f"Initializing pipe server on port {self.port}")
-                self._httpd = HTTPServer(
-                    ('localhost', self.port), partial(PipeRequestHandler, self))
+                self._httpd = self._create_server(('localhost', self.port))
                 log.info(f"Pipe server initialized on port {self.port}")
 
                 log.info("Launching software")
@@ -219,9 +541,49 @@ class AccomplicePipe(SimplePipe):
                 log.info("Exiting software")
                 self._get_proxy(name).exit()
     
+    def _start_catalog(self) -> None:
+        """Catalog the production tree in the background."""
+        if AccomplicePipe._catalog is not None:
+            return
+        roots = [os.path.join(self._data_root, root) for root in self._catalog_roots]
+        AccomplicePipe._catalog = Catalog(
+            [root for root in roots if os.path.isdir(root)],
+            watch=self._catalog_watch,
+            poll_interval=self._catalog_poll_interval,
+        )
+        AccomplicePipe._catalog.start()
+
+        # Answer asset metadata and path lookups in this process from the catalog too
+        get_metadata_index().directories = AccomplicePipe._catalog
+        get_path_resolver().directories = AccomplicePipe._catalog
+
+    def _create_server(self, address) -> HTTPServer:
+        if self._server_engine == 'asyncio':
+            return AsyncPipeServer(
+                self, address,
+                workers=self._server_workers or 1,
+                request_timeout=self._request_timeout,
+                keep_alive_timeout=self._keep_alive_timeout,
+            )
+        if self._server_engine != 'threaded':
+            raise ValueError(f"Unknown pipe server engine '{self._server_engine}'")
+
+        handler = partial(PipeRequestHandler, self)
+        if self._server_workers > 0:
+            return PooledHTTPServer(
+                address, handler,
+                workers=self._server_workers,
+                request_timeout=self._request_timeout,
+                keep_alive_timeout=self._keep_alive_timeout,
+            )
+        return HTTPServer(address, handler)
+
     def exit(self) -> None:
         log.warning("Exiting the pipe")
-        raise KeyboardInterrupt
+        # Requests may be handled on worker threads, so stop the server
+        # from another thread instead of raising in this one. shutdown()
+        # blocks until serve_forever() returns, so it can't run here.
+        Thread(target=self._httpd.shutdown, name='PipeShutdown').start()
 
     def _get_proxy(self, name: str) -> SoftwareProxyInterface:
         """Return a proxy object for the given software."""
@@ -253,6 +615,22 @@ class AccomplicePipe(SimplePipe):
             asset_path = query.get('asset_path')[0]
             return self._database.create_asset(asset_name, asset_path=asset_path)
     
+    def get_generation(self, query: Mapping[str, Any]) -> str:
+        """Get a token that changes whenever the pipe's data may have.
+
+        Clients can poll this cheaply and drop their cached responses when
+        it changes. It includes the process ID so that restarting the pipe
+        changes it too. The catalog isn't part of it, since files change all
+        the time and catalog answers are always revalidated by their ETags.
+        """
+        return f'{os.getpid()}.{self._database.generation}'
+
+    def refresh_database(self, query: Mapping[str, Any]) -> None:
+        """Sync the database with ShotGrid. Pass full=1 to reload everything."""
+        full = query.get('full', ['0'])[0] not in ('0', 'false', '')
+        log.info(f"Refreshing the database (full: {full})")
+        self._database.refresh(full)
+
     def get_assets(self, query: Mapping[str, Any]) -> MutableSet:
         # Get the key for all assets
         if 'list' in query:
@@ -265,6 +643,57 @@ class AccomplicePipe(SimplePipe):
             return [asset.path for asset in set(self._database.get_assets(query.get('name')))] # TODO: Hey, this might be calling the get_assets function every time. Also, this isn't following any standard.
         raise ValueError("NEITHER NAME NOR LIST WERE IN QUERY. NOT SURE WHAT TO DO HERE. 373 accomplice.py")
 
+    @staticmethod
+    def _get_query_names(query: Mapping[str, Any]) -> MutableSequence[str]:
+        """Get the names from a query like ?names=a,b&names=c"""
+        return [name for names in query.get('names', []) for name in names.split(',') if name]
+
+    def get_assets_bulk(self, query: Mapping[str, Any]) -> Mapping[str, dict]:
+        """Map each of the named assets to its record, resolving them all at once."""
+        assets = self._database.resolve_assets(self._get_query_names(query))
+        return {
+            name: {'name': asset.name, 'sg_path': asset.path, 'id': asset.id}
+            for name, asset in assets.items()
+        }
+
+    def get_shots_bulk(self, query: Mapping[str, Any]) -> Mapping[str, dict]:
+        """Map each of the named shots to its record, resolving them all at once."""
+        return self._database.resolve_shots(self._get_query_names(query))
+
+    def find_asset_dir(self, query: Mapping[str, Any]) -> MutableSequence[str]:
+        """Find an asset's directory. Returns a list of it, or an empty list."""
+        category = query.get('category', [None])[0]
+        asset_dir = self.get_asset_dir(query.get('name')[0], category)
+        return [asset_dir] if asset_dir is not None else []
+
+    def get_asset_metadata(self, query: Mapping[str, Any]) -> Mapping[str, Mapping[str, MutableSequence[str]]]:
+        """Map an asset's geo variants to its material variants' texture sets."""
+        path = query.get('path')[0]
+        name = query.get('name', [os.path.basename(path)])[0]
+        return get_metadata_index().scan(path, name)
+
+    def _get_catalog(self) -> Catalog:
+        # An empty catalog looks everything up on disk, if the pipe wasn't launched
+        return self._catalog if self._catalog is not None else Catalog(())
+
+    def find_files(self, query: Mapping[str, Any]) -> MutableSequence[str]:
+        """Find the files under a folder whose names contain every one of the given substrings.
+
+        With inotify, the answer includes every change made on this
+        machine. When the catalog polls (e.g. on NFS), each directory is
+        checked when it's read, so the answer is at most as stale as the
+        filesystem's attribute cache (acdirmax, 60 s by default on NFS).
+        """
+        substrings = [s for substrings in query.get('substrings', []) for s in substrings.split(',') if s]
+        return self._get_catalog().find_files(query.get('folder')[0], substrings)
+
+    def glob_files(self, query: Mapping[str, Any]) -> MutableSequence[str]:
+        """Find the paths matching a glob pattern, without '**'.
+
+        As up to date as find_files().
+        """
+        return self._get_catalog().glob(query.get('pattern')[0])
+
     '''Temporary character pipeline'''
     def get_characters(self, query: Mapping[str, Any]) -> MutableSet:
         log.info('doing the things')
@@ -317,24 +746,8 @@ class AccomplicePipe(SimplePipe):
         if category is not None:
             path = os.path.join(path, category)
 
-        # make a regex for the path search
-        found_file = False
-        path_regex = os.path.join(path, "**", "*" + asset + "*")
-        matching_dirs = []
-
-        for filename in glob.iglob(path_regex, recursive=True):
-            found_file = True
-            if os.path.isdir(filename):
-                matching_dirs.append(filename)
-
-        # sort the list of matching directories by length to get the uppermost matching directory
-        matching_dirs.sort(key=lambda x: len(x))
-
-        # no files found
-        if not found_file:
-            return None
-        else:
-            return matching_dirs[0]
+        # get the uppermost matching directory, or None if there isn't one
+        return get_path_resolver().find_dir(path, asset)
 
     def get_shot_dir(self, sequence, shot):
         pass
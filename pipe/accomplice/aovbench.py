@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""Benchmark transferring AOVs between rendered EXRs.
+
+Run from the pipe directory, with OpenImageIO's Python bindings and
+oiiotool installed, e.g.
+
+    python3 -m accomplice.aovbench --frames 10
+
+Writes a rendered frame with cryptomattes and other AOVs, and a denoised
+frame without them, then times copying the AOVs across the way the farm
+originally did (a bash script diffing hoiiotool --printinfo output with
+awk, comm and grep, then merging with a third hoiiotool) against the
+aov_transfer tool, both as a command (as the farm runs it) and in this
+process. oiiotool stands in for Houdini's hoiiotool.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import OpenImageIO as oiio
+
+RENDER_TOOLS = os.path.join(os.path.dirname(__file__), 'software', 'houdini', 'pipe', 'tools', 'render')
+sys.path.insert(0, RENDER_TOOLS)
+import aov_transfer
+
+
+def legacy_aov_transfer_argv(src_exr_path: str, dest_exr_path: str, hoiiotool: str) -> list:
+    # The command the farm originally ran for each transfer
+    return [
+        "/bin/bash",
+        "-exc",
+        """
+            src_exr_path='%(src_exr_path)s'
+            dest_exr_path='%(dest_exr_path)s'
+
+            og_channels_commas=\"$(%(hoiiotool)s \"$src_exr_path\" --printinfo | /usr/bin/awk '/channel list/{ $1 = \"\"; $2 = \"\"; gsub(/^[ \\t]+/, \"\", $0); gsub(\" \", \"\", $0); print $0; exit }')\"
+            og_channels_newlines=\"$(/usr/bin/echo \"$og_channels_commas\" | /usr/bin/tr ',' '\\n')\"
+
+            denoised_channels_commas=\"$(%(hoiiotool)s \"$dest_exr_path\" --printinfo | /usr/bin/awk '/channel list/{ $1 = \"\"; $2 = \"\"; gsub(/^[ \\t]+/, \"\", $0); gsub(\" \", \"\", $0); print $0; exit }')\"
+            denoised_channels_newlines=\"$(/usr/bin/echo \"$denoised_channels_commas\" | /usr/bin/tr ',' '\\n')\"
+
+            shared_channels=\"$(comm -12 <(/usr/bin/echo \"$og_channels_newlines\" | /usr/bin/sort) <(/usr/bin/echo \"$denoised_channels_newlines\" | /usr/bin/tr [:upper:] [:lower:] | /usr/bin/sort))\"
+            transfer_channels_commas=\"$(/usr/bin/grep -vxf <(/usr/bin/echo -e \"$shared_channels\\nCi.r\\nCi.g\\nCi.b\") <(/usr/bin/echo \"$og_channels_newlines\") | /usr/bin/tr '\\n' ',')\"
+
+            if [ ! -z \"$transfer_channels_commas\" ]; then
+                %(hoiiotool)s --metamerge \"$dest_exr_path\" --ch \"$denoised_channels_commas\" \"$src_exr_path\" --ch \"$transfer_channels_commas\" --chappend -o \"$dest_exr_path\"
+            fi
+        """ % {'src_exr_path': src_exr_path, 'dest_exr_path': dest_exr_path, 'hoiiotool': hoiiotool},
+    ]
+
+
+def write_exr(path: str, channels: dict, width: int, height: int) -> None:
+    formats = list(channels.values())
+    spec = oiio.ImageSpec(width, height, len(channels), 'half')
+    spec.channelnames = tuple(channels)
+    spec.channelformats = tuple(oiio.TypeDesc(channel_format) for channel_format in formats)
+    spec.attribute('compression', 'zips')
+    spec.attribute('cryptomatte/0a1b2c3/name', 'crypto_object')
+    rng = np.random.default_rng(0)
+    output = oiio.ImageOutput.create(path)
+    output.open(path, spec)
+    output.write_image(rng.random((height, width, len(channels)), dtype=np.float32))
+    output.close()
+
+
+def write_frames(root: str, width: int, height: int) -> tuple:
+    beauty = {'Ci.r': 'half', 'Ci.g': 'half', 'Ci.b': 'half', 'a': 'half'}
+    aovs = {f'{aov}.{c}': 'half' for aov in ('albedo', 'diffuse', 'specular', 'emissive') for c in 'rgb'}
+    cryptomattes = {f'crypto0{n}.{c}': 'float' for n in range(3) for c in 'RGBA'}
+    src_path = os.path.join(root, 'shot.1001.exr')
+    write_exr(src_path, {**beauty, **aovs, **cryptomattes}, width, height)
+    dest_path = os.path.join(root, 'denoised.1001.exr')
+    write_exr(dest_path, {**beauty, **aovs}, width, height)
+    return src_path, dest_path
+
+
+def run(frames: int, width: int, height: int, oiiotool: str) -> dict:
+    root = tempfile.mkdtemp(prefix='accomplice_aovbench_')
+    try:
+        src_path, dest_template = write_frames(root, width, height)
+        dest_path = os.path.join(root, 'shot.denoised.1001.exr')
+        script = os.path.join(RENDER_TOOLS, 'aov_transfer.py')
+        methods = {
+            'legacy shell': lambda: subprocess.run(legacy_aov_transfer_argv(src_path, dest_path, oiiotool),
+                                                   check=True, capture_output=True),
+            'tool command': lambda: subprocess.run([sys.executable, script, src_path, dest_path],
+                                                   check=True, capture_output=True),
+            'tool, oiiotool': lambda: subprocess.run(
+                [sys.executable, '-c', 'import sys, aov_transfer; aov_transfer.oiio = None; '
+                                       'sys.exit(aov_transfer.main(sys.argv[1:]))',
+                 src_path, dest_path, '--oiiotool', oiiotool],
+                check=True, capture_output=True, cwd=RENDER_TOOLS),
+            'in process': lambda: aov_transfer.transfer_aovs(src_path, dest_path),
+        }
+        results = {}
+        for name, transfer in methods.items():
+            seconds = 0.0
+            for _ in range(frames):
+                shutil.copy(dest_template, dest_path)
+                start = time.perf_counter()
+                transfer()
+                seconds += time.perf_counter() - start
+            channels = oiio.ImageBuf(dest_path).nativespec().channelnames
+            results[name] = (seconds / frames, len(channels))
+        return results
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=5)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--oiiotool', default=shutil.which('oiiotool') or aov_transfer.HOIIOTOOL)
+    args = parser.parse_args()
+
+    for name, (seconds, channels) in run(args.frames, args.width, args.height, args.oiiotool).items():
+        print(f"{name:16} {seconds * 1000:8.1f} ms per frame  ({channels} channels)")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""Benchmark backing up a large scene file.
+
+Run from the pipe directory, e.g.
+
+    python3 -m accomplice.backupbench --size 256
+
+Writes a file of scene-like data (text mixed with incompressible binary
+data), then compares the original uncompressed copy against compressed
+backups. For each, it times how long the caller is blocked, how long the
+backup takes to finish, and how long restoring it takes.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from .software.shared.version_backups import BackupStore, Codec, GzipCodec, ZstdCodec, zstandard
+
+
+def write_scene(path: str, size: int) -> None:
+    """Write size MiB of data that compresses about as well as a scene file."""
+    rng = random.Random(0)
+    with open(path, 'wb') as f:
+        for _ in range(size):
+            lines = [
+                f'setAttr ".node{rng.randrange(10**6)}.translate" -type "double3" '
+                f'{rng.random():.6f} {rng.random():.6f} {rng.random():.6f};\n'
+                for _ in range(6000)
+            ]
+            chunk = ''.join(lines).encode('utf-8')[:768 * 1024]
+            f.write(chunk + os.urandom(1024 * 1024 - len(chunk)))
+
+
+def _legacy_backup(path: str, folder: str) -> float:
+    start = time.perf_counter()
+    os.makedirs(folder, exist_ok=True)
+    shutil.copy(path, os.path.join(folder, os.path.basename(path)))
+    return time.perf_counter() - start
+
+
+def run(size: int) -> dict:
+    root = tempfile.mkdtemp(prefix='accomplice_backupbench_')
+    try:
+        path = os.path.join(root, 'shot.mb')
+        write_scene(path, size)
+        results = {}
+
+        seconds = _legacy_backup(path, os.path.join(root, 'legacy'))
+        results['legacy copy'] = {'blocked': seconds, 'total': seconds, 'restore': seconds,
+                                  'bytes': os.path.getsize(path)}
+
+        codecs = {'none': Codec(), 'gzip -1': GzipCodec(1), 'gzip -6': GzipCodec(6)}
+        if zstandard is not None:
+            codecs['zstd -3'] = ZstdCodec(3)
+        for name, codec in codecs.items():
+            store = BackupStore(os.path.join(root, name), os.path.basename(path), codec)
+            start = time.perf_counter()
+            future = store.backup(path)
+            blocked = time.perf_counter() - start
+            backup_path = future.result()
+            total = time.perf_counter() - start
+
+            start = time.perf_counter()
+            store.restore(store.list_backups()[0], os.path.join(root, 'restored.mb'))
+            restore = time.perf_counter() - start
+            results[name] = {'blocked': blocked, 'total': total, 'restore': restore,
+                             'bytes': os.path.getsize(backup_path)}
+        return results
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=256, help="file size in MiB (default: %(default)s)")
+    args = parser.parse_args()
+
+    for name, stats in run(args.size).items():
+        print(f"{name:12} blocked {stats['blocked'] * 1000:8.1f} ms  "
+              f"total {stats['total'] * 1000:8.1f} ms  "
+              f"restore {stats['restore'] * 1000:8.1f} ms  "
+              f"{stats['bytes'] / 2**20:7.1f} MiB")
@@ -0,0 +1,436 @@
+"""An in-memory catalog of the production tree, kept up to date as it changes.
+
+Tools used to crawl the tree themselves to find asset directories, geo
+and material variants, textures and shot files. The pipe server instead
+lists every directory under the catalog's roots once, keeps those
+listings up to date, and answers the same lookups from memory.
+
+Changes are picked up from inotify where it can see them. inotify only
+reports changes made on this machine, so on network filesystems like
+NFS the catalog polls instead: it stats every directory and lists again
+the ones whose mtime changed. A poll can be up to poll_interval late,
+so when polling, lookups also stat each directory they read and list it
+again if it changed. Their answers are then only as stale as the
+filesystem's own attribute cache (on NFS, acdirmax, 60 s by default).
+"""
+
+import ctypes
+import fnmatch
+import logging
+import os
+import re
+import select
+import struct
+import time
+from threading import Event, Lock, Thread
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .software.shared.helper.utilities.metadata_index import (
+    MTIME_SLACK_NS,
+    DirectoryIndex,
+    Listing,
+)
+
+log = logging.getLogger(__name__)
+
+# Filesystems where inotify misses changes made by other machines
+_NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'ceph', 'lustre', 'gpfs', 'fuse.sshfs'}
+
+_MAGIC = re.compile(r'[*?[]')
+
+
+def _filesystem_type(path: str) -> Optional[str]:
+    """Get the type of the filesystem a path is on, from /proc/mounts."""
+    path = os.path.realpath(path)
+    best, fstype = '', None
+    try:
+        with open('/proc/mounts') as mounts:
+            for line in mounts:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                # Spaces and such are escaped as octal, e.g. \040
+                mount_point = re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), fields[1])
+                inside = path == mount_point or path.startswith(mount_point.rstrip('/') + '/')
+                if inside and len(mount_point) >= len(best):
+                    best, fstype = mount_point, fields[2]
+    except OSError:
+        return None
+    return fstype
+
+
+class _Inotify:
+    """Just enough of Linux's inotify API, through ctypes."""
+
+    # From <sys/inotify.h>
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+
+    # Only entries being added, removed or renamed change a listing
+    WATCH_MASK = (IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                  | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self) -> None:
+        # Raises AttributeError where there's no inotify, e.g. on macOS
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def add_watch(self, path: str) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        # Fails harmlessly if the directory is already gone
+        self._rm_watch(self.fd, wd)
+
+    def read(self, timeout: float) -> List[Tuple[int, int, str]]:
+        """Wait for events. Returns a (watch, mask, name) tuple for each."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class Catalog:
+    """Every directory listing under some roots, kept up to date in the background.
+
+    Lookups never wait for the catalog: paths it hasn't listed yet, or that
+    are outside its roots, are looked up on disk instead. Like glob, hidden
+    entries (e.g. NFS's .snapshot directories) are skipped.
+    """
+
+    def __init__(self, roots: Iterable[str], watch: str = 'auto', poll_interval: float = 30) -> None:
+        """Keyword arguments:
+        roots -- the directories to catalog, along with everything under them
+        watch -- how to notice changes: 'inotify', 'poll', or 'auto' to use
+                 inotify unless a root is on a network filesystem
+        poll_interval -- how often (in seconds) to poll for changes
+        """
+        if watch not in ('auto', 'inotify', 'poll'):
+            raise ValueError(f"Unknown catalog watch mode '{watch}'")
+        self.roots = tuple(os.path.normpath(root) for root in roots)
+        self.watch = watch
+        self.poll_interval = poll_interval
+
+        self.ready = Event()
+        """Set once every root has been listed."""
+
+        self.generation = 0
+        """Bumped whenever a listing changes."""
+
+        self.scans = 0
+        """How many directories have actually been listed."""
+
+        self._listings: Dict[str, Listing] = {}
+        self._lock = Lock()
+        self._refresh_lock = Lock() # Lookups refresh directories too when polling
+        self._stop = Event()
+        self._thread = None
+        self._inotify = None
+        self._watches: Dict[int, str] = {}
+        self._watch_ids: Dict[str, int] = {}
+        self._fallback = DirectoryIndex()
+
+    def start(self) -> None:
+        """Build the catalog and keep it up to date on a background thread."""
+        self._thread = Thread(target=self._run, name='PipeCatalog', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _use_inotify(self) -> bool:
+        """Set up inotify, unless the catalog should poll instead."""
+        if self.watch == 'poll':
+            return False
+        if self.watch == 'auto':
+            network = [root for root in self.roots if _filesystem_type(root) in _NETWORK_FILESYSTEMS]
+            if network:
+                log.info(f"Polling for catalog changes, since {', '.join(network)} "
+                         "is on a network filesystem")
+                return False
+        try:
+            self._inotify = _Inotify()
+        except (AttributeError, OSError) as ex:
+            log.warning(f"inotify is unavailable, polling for catalog changes instead: {ex}")
+            return False
+        return True
+
+    def _run(self) -> None:
+        try:
+            self._use_inotify()
+            start = time.perf_counter()
+            for root in self.roots:
+                self._add_tree(root)
+            self.ready.set()
+            log.info(f"Cataloged {len(self._listings)} directories "
+                     f"in {time.perf_counter() - start:.1f}s")
+
+            while not self._stop.is_set():
+                if self._inotify is not None:
+                    self._read_events()
+                elif not self._stop.wait(self.poll_interval):
+                    self.poll()
+        except Exception:
+            log.exception("The catalog stopped updating")
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+
+    def _list(self, path: str) -> Tuple[Optional[Listing], List[str]]:
+        """List a directory on disk.
+
+        Returns the listing, or None if the directory is gone, along with
+        the subdirectories to catalog. Like os.walk, symlinked directories
+        are listed but not followed.
+        """
+        files = []
+        dirs = []
+        subdirs = []
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir():
+                        dirs.append(entry.name)
+                        if not entry.is_symlink():
+                            subdirs.append(entry.name)
+                    else:
+                        files.append(entry.name)
+        except (FileNotFoundError, NotADirectoryError):
+            return None, []
+        except PermissionError as ex:
+            log.warning(f"Can't catalog {path}: {ex}")
+            return None, []
+        self.scans += 1
+        return Listing(mtime_ns, tuple(sorted(files)), tuple(sorted(dirs))), subdirs
+
+    def _watch(self, path: str) -> None:
+        if self._inotify is None:
+            return
+        try:
+            wd = self._inotify.add_watch(path)
+        except FileNotFoundError:
+            return
+        except OSError as ex:
+            # Most likely out of watches (fs.inotify.max_user_watches)
+            log.warning(f"Can't watch {path}, polling for catalog changes instead: {ex}")
+            self._inotify.close()
+            self._inotify = None
+            self._watches.clear()
+            self._watch_ids.clear()
+            return
+        self._watches[wd] = path
+        self._watch_ids[path] = wd
+
+    def _add_tree(self, top: str) -> None:
+        """Catalog a directory and everything under it."""
+        stack = [top]
+        while stack:
+            path = stack.pop()
+            # Watch before listing, so nothing added in between is missed
+            self._watch(path)
+            listing, subdirs = self._list(path)
+            if listing is None:
+                continue
+            with self._lock:
+                self._listings[path] = listing
+            stack.extend(os.path.join(path, name) for name in reversed(subdirs))
+
+    def _remove_tree(self, top: str) -> None:
+        """Forget a directory and everything under it."""
+        prefix = top + os.sep
+        with self._lock:
+            removed = [path for path in self._listings if path == top or path.startswith(prefix)]
+            for path in removed:
+                del self._listings[path]
+        for path in removed:
+            wd = self._watch_ids.pop(path, None)
+            if wd is not None:
+                self._watches.pop(wd, None)
+                if self._inotify is not None:
+                    self._inotify.rm_watch(wd)
+
+    def _refresh(self, path: str) -> None:
+        """List a cataloged directory again, cataloging or forgetting its subdirectories."""
+        with self._refresh_lock:
+            self._refresh_unlocked(path)
+
+    def _refresh_unlocked(self, path: str) -> None:
+        old = self._listings.get(path)
+        listing, subdirs = self._list(path)
+        if listing is None:
+            if old is not None:
+                self._remove_tree(path)
+                self.generation += 1
+            return
+
+        old_dirs = set(old.dirs) if old is not None else set()
+        for name in old_dirs - set(listing.dirs):
+            self._remove_tree(os.path.join(path, name))
+        with self._lock:
+            self._listings[path] = listing
+        for name in subdirs:
+            if name not in old_dirs:
+                self._add_tree(os.path.join(path, name))
+
+        if old is None or old.files != listing.files or old.dirs != listing.dirs:
+            self.generation += 1
+
+    def _read_events(self) -> None:
+        events = self._inotify.read(timeout=1.0)
+        if not events:
+            return
+
+        dirty = set()
+        for wd, mask, _ in events:
+            if mask & _Inotify.IN_Q_OVERFLOW:
+                # Some events were dropped, so check everything
+                log.warning("Missed catalog changes, polling every directory")
+                self.poll()
+                return
+            path = self._watches.get(wd)
+            if path is None:
+                continue
+            if mask & _Inotify.IN_IGNORED:
+                self._watches.pop(wd, None)
+                self._watch_ids.pop(path, None)
+            elif mask & (_Inotify.IN_DELETE_SELF | _Inotify.IN_MOVE_SELF):
+                dirty.add(path if path in self.roots else os.path.dirname(path))
+            else:
+                dirty.add(path)
+
+        # Parents first, so directories they remove aren't listed for nothing
+        for path in sorted(dirty, key=len):
+            if path in self._listings:
+                self._refresh(path)
+
+    @staticmethod
+    def _has_changed(path: str, listing: Listing) -> bool:
+        """Whether a directory may have changed since it was listed."""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return True
+        # The mtime might not change again if the directory changes soon
+        # after being listed, so list recent changes twice
+        return mtime_ns != listing.mtime_ns or time.time_ns() - listing.mtime_ns < MTIME_SLACK_NS
+
+    def poll(self) -> None:
+        """List every directory again whose mtime changed."""
+        with self._lock:
+            listings = list(self._listings.items())
+        for path, listing in listings:
+            if path not in self._listings:
+                continue # Its parent was removed
+            if self._has_changed(path, listing):
+                self._refresh(path)
+        for root in self.roots:
+            if root not in self._listings:
+                self._refresh(root)
+
+    def _get_listing(self, path: str) -> Optional[Listing]:
+        """Get a cataloged directory's listing. When polling, list it again first if it changed."""
+        listing = self._listings.get(path)
+        if listing is None or self._inotify is not None or not self.ready.is_set():
+            return listing
+        if self._has_changed(path, listing):
+            self._refresh(path)
+            listing = self._listings.get(path)
+        return listing
+
+    def listdir(self, path: str) -> Listing:
+        """List a directory's files and subdirectories, or nothing if it doesn't exist."""
+        path = os.path.normpath(path)
+        listing = self._get_listing(path)
+        if listing is None:
+            listing = self._fallback.listdir(path)
+        return listing
+
+    def walk(self, top: str) -> Iterator[Tuple[str, Sequence[str], Sequence[str]]]:
+        """Like os.walk(), from memory if the catalog covers the whole tree."""
+        top = os.path.normpath(top)
+        if not self.ready.is_set() or top not in self._listings:
+            yield from os.walk(top)
+            return
+
+        stack = [top]
+        while stack:
+            path = stack.pop()
+            listing = self._get_listing(path)
+            # Skip symlinked directories, and those removed in the meantime
+            if listing is None:
+                continue
+            yield path, listing.dirs, listing.files
+            stack.extend(os.path.join(path, name) for name in reversed(listing.dirs))
+
+    def glob(self, pattern: str) -> List[str]:
+        """Like glob.glob(), for absolute patterns without '**'."""
+        parts = os.path.normpath(pattern).split(os.sep)
+        literal = 1
+        while literal < len(parts) - 1 and not _MAGIC.search(parts[literal]):
+            literal += 1
+
+        paths = [os.sep.join(parts[:literal]) or os.sep]
+        for depth, part in enumerate(parts[literal:], literal + 1):
+            last = depth == len(parts)
+            matches = []
+            for path in paths:
+                listing = self.listdir(path)
+                names = listing.dirs + listing.files if last else listing.dirs
+                if _MAGIC.search(part):
+                    names = fnmatch.filter(names, part)
+                elif part not in names:
+                    continue
+                else:
+                    names = [part]
+                matches.extend(os.path.join(path, name) for name in names)
+            paths = matches
+        return sorted(paths)
+
+    def find_files(self, folder: str, substrings: Iterable[str]) -> List[str]:
+        """Find the files under a folder whose names contain every substring, ignoring case."""
+        substrings = [substring.lower() for substring in substrings]
+        return [
+            os.path.join(path, file)
+            for path, _, files in self.walk(folder)
+            for file in files
+            if all(substring in file.lower() for substring in substrings)
+        ]
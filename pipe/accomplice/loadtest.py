@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+"""Load test the pipe server against a stubbed database.
+
+Run from the pipe directory, e.g.
+
+    python3 -m accomplice.loadtest --workers 8 --clients 32
+    python3 -m accomplice.loadtest --workers 0   # one request at a time
+    python3 -m accomplice.loadtest --engine asyncio
+    python3 -m accomplice.loadtest --keep-alive  # reuse connections like _PipeProxy
+
+Each client repeatedly requests /assets, /shots and /shot and the
+latency of every request is recorded.
+"""
+
+import io
+import statistics
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stderr
+from http.client import HTTPConnection
+from threading import Thread
+from typing import List, Sequence
+
+from .accomplice import AccomplicePipe
+from .software.shared.proxy.connection import ConnectionPool
+
+_PATHS = [
+    '/assets?list=name',
+    '/shots?list=name',
+    '/shot?name=A_010',
+]
+
+
+class StubDatabase:
+    """Stands in for ShotGridDatabase, sleeping to simulate ShotGrid."""
+
+    generation = 0
+
+    def __init__(self, latency: float, assets: int = 500, shots: int = 200) -> None:
+        self.latency = latency
+        self.asset_names = [f'asset{i}' for i in range(assets)]
+        self.shot_names = [f'A_{i:03}' for i in range(shots)]
+
+    def get_asset_list(self) -> Sequence[str]:
+        time.sleep(self.latency)
+        return self.asset_names
+
+    def get_shot_list(self) -> Sequence[str]:
+        time.sleep(self.latency)
+        return self.shot_names
+
+    def get_shot(self, name: str) -> dict:
+        time.sleep(self.latency)
+        return {'code': name, 'id': 1, 'sg_cut_in': 1001, 'sg_cut_out': 1100}
+
+
+def percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _run_client(port: int, requests: int, keep_alive: bool = False) -> List[float]:
+    latencies = []
+    pool = ConnectionPool('localhost', port, size=1)
+    for i in range(requests):
+        start = time.perf_counter()
+        if keep_alive:
+            response, _ = pool.request('GET', _PATHS[i % len(_PATHS)])
+        else:
+            # A fresh connection per request
+            conn = HTTPConnection('localhost', port)
+            conn.request('GET', _PATHS[i % len(_PATHS)])
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+        latencies.append(time.perf_counter() - start)
+        assert response.status == 200, response.reason
+    pool.close()
+    return latencies
+
+
+def run(
+    workers: int,
+    clients: int,
+    requests: int,
+    latency: float,
+    engine: str = 'threaded',
+    keep_alive: bool = False,
+) -> dict:
+    """Serve a stubbed pipe and hammer it with concurrent clients."""
+    pipe = AccomplicePipe()
+    pipe._database = StubDatabase(latency)
+    pipe._server_workers = workers
+    pipe._server_engine = engine
+    pipe._httpd = pipe._create_server(('localhost', 0))
+
+    server_thread = Thread(target=pipe._httpd.serve_forever, daemon=True)
+    server_thread.start()
+
+    try:
+        # Keep the server's per-request access log out of the results
+        with redirect_stderr(io.StringIO()):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(clients) as executor:
+                results = executor.map(
+                    _run_client, [pipe.port] * clients, [requests] * clients,
+                    [keep_alive] * clients)
+                latencies = [latency for result in results for latency in result]
+            elapsed = time.perf_counter() - start
+    finally:
+        pipe._httpd.shutdown()
+        pipe._httpd.server_close()
+
+    return {
+        'requests': len(latencies),
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'mean': statistics.mean(latencies),
+    }
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=AccomplicePipe._server_workers,
+                        help="worker threads, or 0 for one request at a time (default: %(default)s)")
+    parser.add_argument('--engine', choices=['threaded', 'asyncio'], default='threaded',
+                        help="pipe server engine (default: %(default)s)")
+    parser.add_argument('--keep-alive', action='store_true',
+                        help="reuse each client's connection between requests")
+    parser.add_argument('--clients', type=int, default=16,
+                        help="concurrent clients (default: %(default)s)")
+    parser.add_argument('--requests', type=int, default=30,
+                        help="requests per client (default: %(default)s)")
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help="simulated ShotGrid latency in seconds (default: %(default)s)")
+    args = parser.parse_args()
+
+    stats = run(args.workers, args.clients, args.requests, args.latency,
+                args.engine, args.keep_alive)
+    print(f"{stats['requests']} requests in {stats['seconds']:.2f}s "
+          f"({stats['throughput']:.1f} req/s)")
+    print(f"p50 {stats['p50'] * 1000:.1f} ms, p99 {stats['p99'] * 1000:.1f} ms, "
+          f"mean {stats['mean'] * 1000:.1f} ms")
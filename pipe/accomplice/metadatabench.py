@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+"""Benchmark scanning asset metadata over a synthetic texture tree.
+
+Run from the pipe directory, e.g.
+
+    python3 -m accomplice.metadatabench --assets 20 --udims 10
+
+Builds assets with geo variants, material variants and UDIM textures in a
+temporary directory, then times the original os.walk/glob scan against
+the metadata index, both cold and after one texture set was added.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from .software.shared.helper.utilities.metadata_index import AssetMetadataIndex
+
+_MAPS = ['BaseColor', 'Roughness', 'Normal', 'Metallic']
+
+
+def build_tree(root: str, assets: int, geo_variants: int, mat_variants: int,
+               texture_sets: int, udims: int) -> list:
+    """Create a synthetic asset tree. Returns (path, name) for each asset."""
+    created = []
+    for a in range(assets):
+        name = f'asset{a}'
+        path = os.path.join(root, name)
+        os.makedirs(os.path.join(path, 'geo'))
+        for g in range(geo_variants):
+            geo = f'geo{g}'
+            Path(path, 'geo', f'{geo}.usdc').touch()
+            for m in range(mat_variants):
+                mat = f'mat{m}'
+                textures = os.path.join(path, 'textures', geo, mat)
+                os.makedirs(textures)
+                for t in range(texture_sets):
+                    for texture_map in _MAPS:
+                        for udim in range(1001, 1001 + udims):
+                            Path(textures, f'{name}_{geo}_{mat}_set{t}_{texture_map}.{udim}.png').touch()
+        created.append((path, name))
+    return created
+
+
+def legacy_scan(path: str, name: str) -> dict:
+    """Scan an asset the way Asset.create_metadata() originally did."""
+    hierarchy = {}
+    _, _, files = next(os.walk(os.path.join(path, 'geo')))
+    for geo in [file.split('.')[0] for file in files]:
+        hierarchy[geo] = {}
+        textures = Path(path, 'textures', geo)
+        for mat in [str(d.name) for d in textures.glob('*/') if d.is_dir()]:
+            sets = {}
+            for file in Path(textures, mat).glob(f'{name}_{geo}_{mat}_*.1001.*'):
+                sets[re.match('(?:[^_]*_){3}(.*)_', os.path.basename(file)).group(1)] = True
+            hierarchy[geo][mat] = sorted(sets)
+    return hierarchy
+
+
+def _time(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def run(assets: int, geo_variants: int, mat_variants: int, texture_sets: int, udims: int) -> dict:
+    root = tempfile.mkdtemp(prefix='accomplice_metadatabench_')
+    try:
+        tree = build_tree(root, assets, geo_variants, mat_variants, texture_sets, udims)
+        files = sum(len(f) for _, _, f in os.walk(root))
+
+        # Make the directories look settled, as they would be on a real show
+        past = time.time() - 60
+        for directory, _, _ in os.walk(root):
+            os.utime(directory, (past, past))
+
+        index = AssetMetadataIndex()
+        scan_all = lambda scan: [scan(path, name) for path, name in tree]
+        results = {'files': files}
+        results['legacy'] = _time(lambda: scan_all(legacy_scan))
+        results['index cold'] = _time(lambda: scan_all(index.scan))
+        results['index warm'] = _time(lambda: scan_all(index.scan))
+
+        # Add a texture set to one material variant; only it is re-listed
+        path, name = tree[0]
+        textures = os.path.join(path, 'textures', 'geo0', 'mat0')
+        Path(textures, f'{name}_geo0_mat0_new_BaseColor.1001.png').touch()
+        os.utime(textures, (past + 1, past + 1))
+        scans = index.directories.scans
+        results['index changed'] = _time(lambda: scan_all(index.scan))
+        results['rescanned directories'] = index.directories.scans - scans
+
+        for path, name in tree:
+            expected = legacy_scan(path, name)
+            actual = {geo: {mat: sorted(sets) for mat, sets in mats.items()}
+                      for geo, mats in index.scan(path, name).items()}
+            assert actual == expected, name
+        return results
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--assets', type=int, default=20)
+    parser.add_argument('--geo-variants', type=int, default=3)
+    parser.add_argument('--mat-variants', type=int, default=4)
+    parser.add_argument('--texture-sets', type=int, default=3)
+    parser.add_argument('--udims', type=int, default=10,
+                        help="UDIM tiles per texture (default: %(default)s)")
+    args = parser.parse_args()
+
+    results = run(args.assets, args.geo_variants, args.mat_variants,
+                  args.texture_sets, args.udims)
+    print(f"{results.pop('files')} files, "
+          f"{results.pop('rescanned directories')} directory re-listed after a change")
+    for case, seconds in results.items():
+        print(f"{case:14} {seconds * 1000:8.1f} ms")
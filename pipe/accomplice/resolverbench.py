@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+"""Benchmark finding asset directories in a generated asset tree.
+
+Run from the pipe directory, e.g.
+
+    python3 -m accomplice.resolverbench --categories 10 --assets 40
+
+Builds <category>/<subcategory>/<asset>/<department>/<variant> directories
+(about 50,000 of them by default) in a temporary directory, then times
+looking up assets with the original recursive glob against the path
+resolver, cold, warm, and backed by the pipe's catalog.
+"""
+
+import glob
+import os
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from .catalog import Catalog
+from .software.shared.helper.utilities.path_resolver import PathResolver
+
+_DEPARTMENTS = ['geo', 'textures', 'rig', 'anim', 'material']
+
+
+def build_tree(root: str, categories: int, subcategories: int, assets: int, variants: int) -> list:
+    """Create a synthetic asset tree. Returns the name of each asset."""
+    names = []
+    for c in range(categories):
+        for s in range(subcategories):
+            for a in range(assets):
+                name = f'asset{c:02}{s:02}{a:04}'
+                for department in _DEPARTMENTS:
+                    for v in range(variants):
+                        os.makedirs(os.path.join(root, f'category{c}', f'sub{s}', name, department, f'v{v}'))
+                names.append(name)
+    return names
+
+
+def legacy_find_dir(path: str, asset: str):
+    """Find an asset's directory the way AccomplicePipe.get_asset_dir() originally did."""
+    matching_dirs = [
+        filename for filename in glob.iglob(os.path.join(path, "**", "*" + asset + "*"), recursive=True)
+        if os.path.isdir(filename)
+    ]
+    matching_dirs.sort(key=lambda x: len(x))
+    return matching_dirs[0] if matching_dirs else None
+
+
+def _time(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def run(categories: int, subcategories: int, assets: int, variants: int, lookups: int) -> dict:
+    root = tempfile.mkdtemp(prefix='accomplice_resolverbench_')
+    try:
+        names = build_tree(root, categories, subcategories, assets, variants)
+        step = max(1, len(names) // lookups)
+        sample = names[::step][:lookups] + ['missing']
+        results = {'directories': sum(len(d) for _, d, _ in os.walk(root))}
+
+        # Make the directories look settled, as they would be on a real show
+        past = time.time() - 60
+        for directory, _, _ in os.walk(root):
+            os.utime(directory, (past, past))
+
+        resolver = PathResolver()
+        find_all = lambda find: [find(root, name) for name in sample]
+        results['legacy glob'] = _time(lambda: find_all(legacy_find_dir)) / len(sample)
+        results['resolver cold'] = _time(lambda: find_all(resolver.find_dir)) / len(sample)
+        results['resolver warm'] = _time(lambda: find_all(resolver.find_dir)) / len(sample)
+
+        catalog = Catalog([root], watch='poll', poll_interval=3600)
+        catalog.start()
+        catalog.ready.wait()
+        cataloged = PathResolver(catalog)
+        find_all(cataloged.find_dir)
+        results['resolver catalog'] = _time(lambda: find_all(cataloged.find_dir)) / len(sample)
+        catalog.stop()
+
+        for name in sample:
+            assert resolver.find_dir(root, name) == legacy_find_dir(root, name), name
+        return results
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--categories', type=int, default=10)
+    parser.add_argument('--subcategories', type=int, default=5)
+    parser.add_argument('--assets', type=int, default=40, help="per subcategory (default: %(default)s)")
+    parser.add_argument('--variants', type=int, default=4, help="per department (default: %(default)s)")
+    parser.add_argument('--lookups', type=int, default=20,
+                        help="assets to look up, plus one missing asset (default: %(default)s)")
+    args = parser.parse_args()
+
+    results = run(args.categories, args.subcategories, args.assets, args.variants, args.lookups)
+    print(f"{results.pop('directories')} directories")
+    for case, seconds in results.items():
+        print(f"{case:16} {seconds * 1000:8.2f} ms per lookup")
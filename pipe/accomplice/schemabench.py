@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""Benchmark encoding and decoding pipe responses.
+
+Run from the pipe directory, e.g.
+
+    python3 -m accomplice.schemabench --assets 2000
+
+Times a 2,000-asset listing and a bulk asset lookup in the schema's
+format against the original text and JSON formats, end to end from the
+pipe method's result to the strings or Asset objects tools use.
+"""
+
+import json
+import timeit
+from argparse import ArgumentParser
+
+from .accomplice import ROUTES
+from .software.shared.proxy import schema
+
+
+def _legacy_decode_assets(content: bytes) -> dict:
+    return {
+        name: schema.asset_from_sg_path(record['sg_path'])
+        for name, record in json.loads(content).items()
+    }
+
+
+def run(assets: int, repeat: int) -> dict:
+    names = [f'asset{i:04}' for i in range(assets)]
+    records = {
+        name: {'name': name, 'sg_path': f'/environment/setdressing/{name}', 'id': i}
+        for i, name in enumerate(names)
+    }
+    list_route = ROUTES[('GET', '/assets')]
+    bulk_route = ROUTES[('GET', '/assets/bulk')]
+
+    cases = {
+        'list text': (
+            lambda: list_route.encode_result(names, None)[0],
+            lambda body: body.decode('utf-8').split(','),
+        ),
+        'list schema': (
+            lambda: list_route.encode_result(names, schema.MEDIA_TYPE)[0],
+            lambda body: schema.decode(body, 'strings'),
+        ),
+        'bulk json': (
+            lambda: bulk_route.encode_result(records, None)[0],
+            _legacy_decode_assets,
+        ),
+        'bulk schema': (
+            lambda: bulk_route.encode_result(records, schema.MEDIA_TYPE)[0],
+            schema.decode_assets,
+        ),
+    }
+
+    results = {}
+    for case, (encode, decode) in cases.items():
+        body = encode()
+        assert len(decode(body)) == assets, case
+        encode_time = min(timeit.repeat(encode, number=1, repeat=repeat))
+        decode_time = min(timeit.repeat(lambda: decode(body), number=1, repeat=repeat))
+        results[case] = {
+            'bytes': len(body),
+            'encode': encode_time,
+            'decode': decode_time,
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--assets', type=int, default=2000,
+                        help="assets in the listing (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=50,
+                        help="runs to take the best of (default: %(default)s)")
+    args = parser.parse_args()
+
+    for case, stats in run(args.assets, args.repeat).items():
+        print(f"{case:12} {stats['bytes']:8} bytes  "
+              f"encode {stats['encode'] * 1000:6.2f} ms ({1 / stats['encode']:8.0f}/s)  "
+              f"decode {stats['decode'] * 1000:6.2f} ms ({1 / stats['decode']:8.0f}/s)")
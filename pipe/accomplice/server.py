@@ -2,8 +2,10 @@
 
 import atexit
 import logging
+import time
 from http.client import HTTPConnection
 from http.server import HTTPServer
+from queue import Full, Queue
 from socketserver import BaseRequestHandler
 from threading import Thread
 from typing import Optional, Tuple, Union
@@ -11,6 +13,100 @@ from typing import Optional, Tuple, Union
 log = logging.getLogger(__name__)
 
 
+class PooledHTTPServer(HTTPServer):
+    """An HTTP server that handles requests on a fixed pool of threads.
+
+    Accepted connections wait in a bounded queue until a worker is free.
+    When the queue is full, the accept loop blocks, which pushes back on
+    clients through the listen backlog instead of spawning more threads.
+    """
+
+    def __init__(
+        self,
+        server_address: Tuple[Union[str, bytes, bytearray], int],
+        RequestHandlerClass: BaseRequestHandler,
+        bind_and_activate: bool = True,
+        workers: int = 8,
+        queue_size: int = 64,
+        request_timeout: Optional[float] = 60,
+        keep_alive_timeout: Optional[float] = 10,
+        shutdown_timeout: float = 30,
+    ) -> None:
+        """Initialize a PooledHTTPServer object.
+
+        Keyword arguments:
+        - workers -- the number of threads handling requests
+        - queue_size -- the most accepted connections that may wait for
+          a worker
+        - request_timeout -- seconds a connection may sit idle while its
+          request or response is in transit before it is dropped
+        - keep_alive_timeout -- seconds a kept-alive connection may wait
+          for its next request. The request handler applies it.
+        - shutdown_timeout -- seconds server_close() waits for in-flight
+          requests to finish
+        """
+        super().__init__(server_address, RequestHandlerClass, bind_and_activate)
+        self.request_timeout = request_timeout
+        self.keep_alive_timeout = keep_alive_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self._requests = Queue(maxsize=queue_size)
+        self._workers = [
+            Thread(target=self._work, name=f'PipeWorker-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    @property
+    def pending_requests(self) -> int:
+        """How many accepted connections are waiting for a worker."""
+        return self._requests.qsize()
+
+    def process_request(self, request, client_address) -> None:
+        """Queue the request for the worker pool.
+
+        Overrides socketserver.BaseServer.process_request().
+        """
+        request.settimeout(self.request_timeout)
+        self._requests.put((request, client_address))
+
+    def _work(self) -> None:
+        while True:
+            item = self._requests.get()
+            if item is None:
+                break
+
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self) -> None:
+        """Stop accepting requests and let in-flight ones finish.
+
+        Overrides socketserver.TCPServer.server_close().
+        """
+        super().server_close()
+
+        # Queued requests are still handled before the workers see the
+        # sentinel, so every accepted request gets a response
+        deadline = time.monotonic() + self.shutdown_timeout
+        try:
+            for _ in self._workers:
+                self._requests.put(None, timeout=max(0, deadline - time.monotonic()))
+        except Full:
+            pass
+
+        for worker in self._workers:
+            worker.join(max(0, deadline - time.monotonic()))
+            if worker.is_alive():
+                log.warning(f"{worker.name} did not finish within "
+                            f"{self.shutdown_timeout} seconds")
+
+
 class HTTPServerThread(Thread):
     """A thread that runs an HTTP server."""
 
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""Benchmark the first asset menu with and without a saved ShotGrid snapshot.
+
+Run from the pipe directory, e.g.
+
+    python3 -m accomplice.snapshotbench --assets 2000 --latency 0.3
+
+Starts the database the way AccomplicePipe does, restoring the saved
+snapshot and then preloading in the background, and times how long the
+first get_asset_list() takes: cold, with nothing saved, and warm, with
+the snapshot the cold run saved. ShotGrid is stubbed, taking --latency
+seconds for each page of up to 500 records a find returns.
+"""
+
+import math
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+
+from database.ShotGridDatabase import ShotGridDatabase
+from database.snapshot_store import SnapshotStore
+
+PROJECT_ID = 1
+PAGE_SIZE = 500
+
+
+class StubShotGrid:
+    """Stands in for a ShotGrid connection, sleeping to simulate the site."""
+
+    def __init__(self, latency: float, assets: int, shots: int) -> None:
+        self.latency = latency
+        updated_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.entities = {
+            'Asset': [{
+                'type': 'Asset',
+                'id': i,
+                'code': f'asset{i}',
+                'sg_path': f'/environment/setdressing/asset{i}',
+                'sg_asset_type': 'Environment',
+                'sg_status_list': 'ip',
+                'parents': [],
+                'tags': [],
+                'updated_at': updated_at,
+            } for i in range(1, assets + 1)],
+            'Shot': [{
+                'type': 'Shot',
+                'id': i,
+                'code': f'A_{i:03}',
+                'sg_cut_in': 1001,
+                'sg_cut_out': 1100,
+                'sg_status_list': 'ip',
+                'updated_at': updated_at,
+            } for i in range(1, shots + 1)],
+        }
+
+    def find(self, entity_type, filters, fields=None, retired_only=False, **kwargs) -> list:
+        entities = [] if retired_only else self.entities[entity_type]
+        time.sleep(self.latency * max(1, math.ceil(len(entities) / PAGE_SIZE)))
+        return [
+            {field: entity[field] for field in ['type', 'id', *(fields or [])]}
+            for entity in entities
+        ]
+
+    def find_one(self, entity_type, filters, fields=None, **kwargs):
+        time.sleep(self.latency)
+        return None
+
+
+def first_menu(sg: StubShotGrid, store: SnapshotStore) -> dict:
+    """Time starting the database and listing the assets once."""
+    start = time.perf_counter()
+    db = ShotGridDatabase(None, None, None, PROJECT_ID, connection=sg, snapshot_store=store)
+    restored = time.perf_counter()
+    was_restored = db.snapshot.is_loaded
+    db.preload(refresh_interval=None, background=True)
+    assets = db.get_asset_list()
+    listed = time.perf_counter()
+    assert len(assets) == len(sg.entities['Asset'])
+
+    # Let the background load finish and save the snapshot
+    refresher = db._refresher
+    db.stop_refreshing()
+    refresher.join()
+    return {
+        'restore': restored - start,
+        'first menu': listed - start,
+        'restored': was_restored,
+    }
+
+
+def run(assets: int, shots: int, latency: float) -> dict:
+    root = tempfile.mkdtemp(prefix='accomplice_snapshotbench_')
+    try:
+        sg = StubShotGrid(latency, assets, shots)
+        store = SnapshotStore(PROJECT_ID, f'{root}/shotgrid_snapshot_{PROJECT_ID}.json.gz')
+        cold = first_menu(sg, store)
+        warm = first_menu(sg, store)
+        assert not cold['restored'] and warm['restored']
+        return {'cold': cold, 'warm': warm}
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--assets', type=int, default=2000)
+    parser.add_argument('--shots', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.3,
+                        help="simulated ShotGrid latency per page of results in seconds (default: %(default)s)")
+    args = parser.parse_args()
+
+    results = run(args.assets, args.shots, args.latency)
+    for case, times in results.items():
+        print(f"{case:5} restore {times['restore'] * 1000:8.1f} ms  "
+              f"first menu {times['first menu'] * 1000:8.1f} ms")
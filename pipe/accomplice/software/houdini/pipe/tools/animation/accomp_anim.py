@@ -9,10 +9,6 @@ from pipe.shared.object import Asset
 from pipe.shared.helper.utilities.houdini_utils import HoudiniUtils
 import pipe
 
-from pipe.shared.helper.utilities.optimization_utils import DataCache
-
-data_cache = DataCache()
-
 
 # Constants
 ANIM_SUBDIRECTORY = 'anim'
@@ -28,8 +24,7 @@ class AnimationImporter():
 
     def get_shot(self):
         shot_name = HoudiniUtils.get_shot_name()
-        # shot = pipe.server.get_shot(shot_name)
-        shot = data_cache.retrieve_from_cache(shot_name, pipe.server.get_shot, shot_name)
+        shot = pipe.server.get_shot(shot_name)
         return shot
 
     def get_character_options_list(self):
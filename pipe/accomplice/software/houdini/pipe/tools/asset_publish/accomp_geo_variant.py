@@ -1,9 +1,7 @@
 import hou
 import os
 import pipe
-from pipe.shared.helper.utilities.optimization_utils import DataCache
 
-data_cache = DataCache()
 
 
 class GeoVariant:
@@ -42,8 +40,7 @@ class GeoVariant:
 
 
     def get_asset_menu():
-        # asset_names = pipe.server.get_asset_list()
-        asset_names = data_cache.retrieve_from_cache('asset_list', pipe.server.get_asset_list)
+        asset_names = pipe.server.get_asset_list()
         menu_items = []
         
         for name in asset_names:
@@ -60,10 +57,9 @@ class GeoVariant:
         
     def get_variant_menu():
         asset_name = hou.pwd().evalParm("asset")
-        # asset = pipe.server.get_asset(asset_name)
         if asset_name is None or asset_name == "":
             return []
-        asset = data_cache.retrieve_from_cache(asset_name, pipe.server.get_asset, asset_name)
+        asset = pipe.server.get_asset(asset_name)
         
         if os.path.isdir(asset.get_geo_path()):
             menu_items = []
@@ -79,14 +75,16 @@ class GeoVariant:
         
             
     def get_save_names():
-        # geo_names = pipe.server.get_asset_list()
-        geo_names = data_cache.retrieve_from_cache('asset_list', pipe.server.get_asset_list)
+        geo_names = pipe.server.get_asset_list()
+        # Look up every asset in one round trip instead of one per asset
+        assets = pipe.server.get_assets_bulk(geo_names)
         
         menu_items = []
         
         for name in geo_names:
-            # asset = pipe.server.get_asset(name)
-            asset = data_cache.retrieve_from_cache(name, pipe.server.get_asset, name)
+            asset = assets.get(name)
+            if asset is None:
+                continue
             
             if os.path.isdir(asset.get_geo_path()):
                 path, _, files = next(os.walk(asset.get_geo_path()))
@@ -176,8 +174,7 @@ class GeoVariant:
                         )
                         return
                     
-                    # asset = pipe.server.get_asset(asset_name)
-                    asset = data_cache.retrieve_from_cache(asset_name, pipe.server.get_asset, asset_name)
+                    asset = pipe.server.get_asset(asset_name)
                     save_path = asset.get_geo_path() + variant_name + ".usdc"
                     
                     if not os.path.exists(asset.get_geo_path()):
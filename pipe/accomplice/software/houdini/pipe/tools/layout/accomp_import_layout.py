@@ -3,10 +3,8 @@ import pipe
 import re
 import hou
 import json
-from pipe.shared.helper.utilities.optimization_utils import DataCache
 from pipe.shared.helper.utilities.houdini_utils import HoudiniUtils
 
-data_cache = DataCache()
 
 class ImportLayout:
     
@@ -24,11 +22,11 @@ class ImportLayout:
 
 
     def get_shot_menu(self):
-        shot_names = data_cache.retrieve_from_cache('shot_list', pipe.server.get_shot_list)
+        shot_names = pipe.server.get_shot_list()
         menu_items = []
         
         for shot_name in shot_names:
-            shot = data_cache.retrieve_from_cache(shot_name, pipe.server.get_shot, shot_name)
+            shot = pipe.server.get_shot(shot_name)
             if os.path.isfile(shot.get_layout_path()):
                 menu_items.append(shot_name)
                 menu_items.append(shot_name)
@@ -45,20 +43,20 @@ class ImportLayout:
         
         if self.node.evalParm("import_from") == "specified_shot":
             shot_name = self.node.evalParm("specified_shot")
-            shot = data_cache.retrieve_from_cache(shot_name, pipe.server.get_shot, shot_name)
+            shot = pipe.server.get_shot(shot_name)
             path = shot.get_layout_path()
         
         elif self.node.evalParm("import_from") == "master":
             current_sequence = hou.hipFile.basename()[0]
             master_shot_name = current_sequence + "_000"
-            master_shot = data_cache.retrieve_from_cache(master_shot_name, pipe.server.get_shot, master_shot_name)
+            master_shot = pipe.server.get_shot(master_shot_name)
             path = master_shot.get_layout_path()
 
         elif self.node.evalParm("import_from") == "auto":
             current_shot_name = HoudiniUtils.get_shot_name()
 
             if re.match(r"[A-Z]_[0-9][0-9][0-9A-Z]", current_shot_name):
-                shot_names = sorted(data_cache.retrieve_from_cache('shot_list', pipe.server.get_shot_list))
+                shot_names = sorted(pipe.server.get_shot_list())
 
                 current_shot_index = 0
                 for shot_name in shot_names:
@@ -70,19 +68,19 @@ class ImportLayout:
                 
                 if "layout" in hou.hipFile.basename():
                     for index in range(previous_shot_index, -1, -1):
-                        previous_shot = data_cache.retrieve_from_cache(shot_names[index], pipe.server.get_shot, shot_names[index])
+                        previous_shot = pipe.server.get_shot(shot_names[index])
 
                         if os.path.isfile(previous_shot.get_layout_path()):
                             path = previous_shot.get_layout_path()
                             break
                 else:
-                    current_shot = data_cache.retrieve_from_cache(current_shot_name, pipe.server.get_shot, current_shot_name)
+                    current_shot = pipe.server.get_shot(current_shot_name)
                     
                     if os.path.isfile(current_shot.get_layout_path()):
                         path = current_shot.get_layout_path()
                     else:
                         for index in range(previous_shot_index, -1, -1):
-                            previous_shot = data_cache.retrieve_from_cache(shot_names[index], pipe.server.get_shot, shot_names[index])
+                            previous_shot = pipe.server.get_shot(shot_names[index])
                             if os.path.isfile(previous_shot.get_layout_path()):
                                 path = previous_shot.get_layout_path()
                                 break
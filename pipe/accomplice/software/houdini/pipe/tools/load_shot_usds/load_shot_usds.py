@@ -2,10 +2,8 @@ import hou
 from pipe.shared.object import Shot
 from pipe.shared.helper.utilities.houdini_utils import HoudiniUtils, HoudiniNodeUtils
 from pipe.shared.helper.utilities.usd_utils import UsdUtils
-from pipe.shared.helper.utilities.optimization_utils import DataCache
 import os
 
-data_cache = DataCache()
 
 class LoadShotUsds: # TODO: note that this node has been updated to be called 'accomp_load_department_layers' in the hda. When you have time, it would make sense to rewrite this code so that people don't get confused.
     def get_departments_menu_list():
@@ -64,8 +62,7 @@ class LoadShotUsds: # TODO: note that this node has been updated to be called 'a
             checkbox.set(0)
 
     def on_created(myself: hou.Node):
-        # shot = HoudiniUtils.get_shot_for_file()
-        shot = data_cache.retrieve_from_cache('shot', HoudiniUtils.get_shot_for_file)
+        shot = HoudiniUtils.get_shot_for_file()
         # import pdb; pdb.set_trace()
         # print('THIS IS THE SHOT NAME! :', shot)
         user_selected_department = None
@@ -82,7 +79,7 @@ class LoadShotUsds: # TODO: note that this node has been updated to be called 'a
 
     
     def get_shot_usd_path(department_specific=False):
-        shot = data_cache.retrieve_from_cache('shot', HoudiniUtils.get_shot_for_file)
+        shot = HoudiniUtils.get_shot_for_file()
         if department_specific:
             return shot.get_shot_usd_path(HoudiniUtils.get_department())
         else:
@@ -0,0 +1,124 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import OpenImageIO as oiio
+
+# Run test from this directory, with OpenImageIO's Python bindings (and
+# optionally oiiotool) installed, with
+# python3 -m unittest AovTransferTest
+
+try:
+    from pipe.tools.render import aov_transfer
+except ImportError:
+    import aov_transfer
+
+OIIOTOOL = shutil.which('oiiotool')
+
+
+def write_exr(path, channels, value, metadata={}):
+    """Write a small EXR, with each channel's pixel type given by channels."""
+    formats = list(channels.values())
+    spec = oiio.ImageSpec(8, 4, len(channels), formats[0])
+    spec.channelnames = tuple(channels)
+    if len(set(formats)) > 1:
+        spec.channelformats = tuple(oiio.TypeDesc(channel_format) for channel_format in formats)
+    for name, attribute in metadata.items():
+        spec.attribute(name, attribute)
+    spec.attribute('compression', 'zip')
+    output = oiio.ImageOutput.create(path)
+    output.open(path, spec)
+    output.write_image(np.full((4, 8, len(channels)), value, dtype=np.float32))
+    output.close()
+
+
+def read_exr(path):
+    """Get an EXR's pixel type and first pixel's value by channel, and its spec."""
+    buf = oiio.ImageBuf(path)
+    spec = buf.nativespec()
+    pixel = buf.get_pixels(oiio.FLOAT)[0, 0]
+    formats = [str(channel_format) for channel_format in spec.channelformats] or [str(spec.format)] * spec.nchannels
+    return {
+        channel: (formats[index], float(pixel[index])) for index, channel in enumerate(spec.channelnames)
+    }, spec
+
+
+class AovTransferTest(unittest.TestCase):
+    def setUp(self): # Runs before each test
+        self.root = tempfile.mkdtemp(prefix='accomplice_aov_transfer_')
+        self.addCleanup(shutil.rmtree, self.root)
+
+        # A frame as rendered, with its cryptomattes and other AOVs...
+        self.src_path = os.path.join(self.root, 'undenoised', 'shot.1001.exr')
+        os.makedirs(os.path.dirname(self.src_path))
+        write_exr(self.src_path, {
+            'Ci.r': 'half', 'Ci.g': 'half', 'Ci.b': 'half', 'a': 'half',
+            'albedo.r': 'half', 'crypto00.R': 'float', 'crypto00.G': 'float',
+        }, 0.25, {'cryptomatte/0a1b2c3/name': 'crypto', 'renderer': 'src'})
+
+        # ...and denoised, which loses the AOVs the denoiser doesn't use
+        self.dest_path = os.path.join(self.root, 'shot.1001.exr')
+        write_exr(self.dest_path, {
+            'Ci.r': 'half', 'Ci.g': 'half', 'Ci.b': 'half', 'a': 'half', 'ALBEDO.R': 'half',
+        }, 0.75, {'renderer': 'dest'})
+
+    def test_transfer_channels(self):
+        self.assertEqual(
+            aov_transfer.get_transfer_channels(
+                ['Ci.r', 'Ci.g', 'Ci.b', 'a', 'albedo.r', 'crypto00.R', 'crypto00.G'],
+                ['Ci.r', 'Ci.g', 'Ci.b', 'a', 'ALBEDO.R'],
+            ),
+            ['crypto00.R', 'crypto00.G'],
+        )
+        # The beauty is never transferred, even when the destination doesn't have it
+        self.assertEqual(aov_transfer.get_transfer_channels(['Ci.r', 'a'], []), ['a'])
+
+    def check_transferred(self):
+        channels, spec = read_exr(self.dest_path)
+        self.assertEqual(channels, {
+            'Ci.r': ('half', 0.75), 'Ci.g': ('half', 0.75), 'Ci.b': ('half', 0.75), 'a': ('half', 0.75),
+            'ALBEDO.R': ('half', 0.75), 'crypto00.R': ('float', 0.25), 'crypto00.G': ('float', 0.25),
+        })
+        # The source's metadata is merged in, without replacing the destination's
+        self.assertEqual(spec.getattribute('cryptomatte/0a1b2c3/name'), 'crypto')
+        self.assertEqual(spec.getattribute('renderer'), 'dest')
+        self.assertEqual(spec.getattribute('compression'), 'zip')
+        # No temporary files are left behind
+        self.assertEqual(sorted(os.listdir(self.root)), ['shot.1001.exr', 'undenoised'])
+
+    def test_transfer_aovs(self):
+        self.assertEqual(aov_transfer.transfer_aovs(self.src_path, self.dest_path), ['crypto00.R', 'crypto00.G'])
+        self.check_transferred()
+
+        # Transferring again (e.g. when Tractor retries the task) changes nothing
+        stat = os.stat(self.dest_path)
+        self.assertEqual(aov_transfer.transfer_aovs(self.src_path, self.dest_path), [])
+        self.assertEqual(os.stat(self.dest_path).st_mtime_ns, stat.st_mtime_ns)
+
+    @unittest.skipIf(OIIOTOOL is None, "oiiotool isn't installed")
+    def test_transfer_aovs_with_oiiotool(self):
+        with mock.patch.object(aov_transfer, 'oiio', None):
+            self.assertEqual(aov_transfer.transfer_aovs(self.src_path, self.dest_path, OIIOTOOL),
+                             ['crypto00.R', 'crypto00.G'])
+        self.check_transferred()
+
+    def test_command_line(self):
+        script = os.path.join(os.path.dirname(os.path.abspath(aov_transfer.__file__)), 'aov_transfer.py')
+        result = subprocess.run([sys.executable, script, self.src_path, self.dest_path],
+                                capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.check_transferred()
+
+        result = subprocess.run([sys.executable, script, self.src_path, os.path.join(self.root, 'missing.exr')],
+                                capture_output=True, text=True)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('missing.exr', result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+import OpenImageIO as oiio
+
+# Run test from this directory, with OpenImageIO's Python bindings
+# installed, with
+# python3 -m unittest RenderOutputsTest
+
+try:
+    from pipe.tools.render import render_outputs
+except ImportError:
+    import render_outputs
+
+
+def write_exr(path, channels=('R', 'G', 'B', 'A'), compression='zip', tile_size=None):
+    spec = oiio.ImageSpec(67, 45, len(channels), 'half')
+    spec.channelnames = channels
+    spec.attribute('compression', compression)
+    if tile_size is not None:
+        spec.tile_width, spec.tile_height = tile_size
+    output = oiio.ImageOutput.create(path)
+    output.open(path, spec)
+    output.write_image(np.random.default_rng(0).random((45, 67, len(channels)), dtype=np.float32))
+    output.close()
+
+
+class RenderOutputsTest(unittest.TestCase):
+    def setUp(self): # Runs before each test
+        self.root = tempfile.mkdtemp(prefix='accomplice_render_outputs_')
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, 'shot.1001.exr')
+
+    def test_complete(self):
+        for compression in ('none', 'zips', 'zip', 'piz', 'dwab'):
+            write_exr(self.path, compression=compression)
+            # EXRs store their channels sorted by name
+            self.assertEqual(render_outputs.check_exr(self.path),
+                             render_outputs.ExrHeader(('A', 'B', 'G', 'R'), os.path.getsize(self.path)))
+
+        write_exr(self.path, tile_size=(16, 16))
+        self.assertIsNotNone(render_outputs.check_exr(self.path))
+
+        oiio.ImageBufAlgo.make_texture(oiio.MakeTxTexture, oiio.ImageBuf(self.path), self.path)
+        self.assertIsNotNone(render_outputs.check_exr(self.path))
+
+    def test_multipart(self):
+        beauty = oiio.ImageSpec(20, 10, 3, 'half')
+        cryptomatte = oiio.ImageSpec(20, 10, 2, 'float')
+        cryptomatte.channelnames = ('crypto00.R', 'crypto00.G')
+        output = oiio.ImageOutput.create(self.path)
+        output.open(self.path, [beauty, cryptomatte])
+        output.write_image(np.zeros((10, 20, 3), dtype=np.float32))
+        output.open(self.path, cryptomatte, 'AppendSubimage')
+        output.write_image(np.zeros((10, 20, 2), dtype=np.float32))
+        output.close()
+
+        self.assertEqual(render_outputs.check_exr(self.path).channels, ('B', 'G', 'R', 'crypto00.G', 'crypto00.R'))
+
+    def test_incomplete(self):
+        write_exr(self.path)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+
+        # Cut off at any point
+        for size in (len(data) - 1, len(data) // 2, 100, 4, 0):
+            with open(self.path, 'wb') as f:
+                f.write(data[:size])
+            self.assertIsNone(render_outputs.check_exr(self.path), size)
+
+        # With its offset table still zeroed, as it is until OpenEXR closes
+        # the file. Its 45 scanlines are in 3 ZIP chunks, so the table's
+        # first offset is to just past the table.
+        table_start = next(
+            pos for pos in range(8, len(data) - 8) if struct.unpack_from('<Q', data, pos)[0] == pos + 3 * 8
+        )
+        with open(self.path, 'wb') as f:
+            f.write(data[:table_start] + bytes(3 * 8) + data[table_start + 3 * 8:])
+        self.assertIsNone(render_outputs.check_exr(self.path))
+
+        with open(self.path, 'wb') as f:
+            f.write(b'Not an EXR')
+        self.assertIsNone(render_outputs.check_exr(self.path))
+        self.assertIsNone(render_outputs.check_exr(os.path.join(self.root, 'missing.exr')))
+
+    def test_scan(self):
+        paths = [os.path.join(self.root, f'shot.{frame}.exr') for frame in range(1001, 1021)]
+        for path in paths[:15]:
+            write_exr(path)
+        with open(paths[14], 'r+b') as f:
+            f.truncate(200)
+
+        headers = render_outputs.scan_exrs(paths + paths[:3], max_workers=4)
+        self.assertEqual(list(headers), paths)
+        self.assertEqual([path for path, header in headers.items() if header is None], paths[14:])
@@ -0,0 +1,413 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from pxr import Gf, Sdf, Usd
+
+# Run test from this directory, with usd-core installed and the pipe
+# package's parent directory on PYTHONPATH, with
+# python3 -m unittest TractorJobTest
+
+import offline
+from offline import FakeJob, fake_author
+offline.setup()
+
+from pipe.tools.render import render_outputs, tractor_job
+
+FRAMES = range(1001, 1011)
+
+
+class TractorJobTest(unittest.TestCase):
+    def setUp(self): # Runs before each test
+        patcher = mock.patch.object(tractor_job, 'author', fake_author)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.root = tempfile.mkdtemp(prefix='accomplice_tractor_job_')
+        self.addCleanup(shutil.rmtree, self.root)
+        self.render_dir = os.path.join(self.root, 'render')
+        self.usd_file = os.path.join(self.root, 'shot.usd')
+
+    def write_usd_file(self, cryptomatte=True, resolution=None, max_samples=None):
+        """Write a USD file like the ones the USD ROP writes for husk."""
+        stage = Usd.Stage.CreateNew(self.usd_file)
+        product = stage.DefinePrim('/Render/Products/renderproduct', 'RenderProduct')
+        output_path_attr = product.CreateAttribute('productName', Sdf.ValueTypeNames.Token)
+        settings = stage.DefinePrim('/Render/rendersettings', 'RenderSettings')
+        if resolution is not None:
+            product.CreateAttribute('resolution', Sdf.ValueTypeNames.Int2).Set(Gf.Vec2i(*resolution))
+        if max_samples is not None:
+            settings.CreateAttribute(tractor_job.MAX_SAMPLES_ATTR, Sdf.ValueTypeNames.Int).Set(max_samples)
+        if cryptomatte:
+            cryptomatte_attr = settings.CreateAttribute(
+                'ri:displayFilters:cryptomatte:PxrCryptomatte:filename', Sdf.ValueTypeNames.String
+            )
+        for frame in FRAMES:
+            output_path_attr.Set(os.path.join(self.render_dir, f'shot.{frame:04}.exr'), frame)
+            if cryptomatte:
+                cryptomatte_attr.Set(os.path.join(self.render_dir, 'crypto', f'shot.{frame:04}.exr'), frame)
+        stage.Save()
+
+    def saved_output_paths(self):
+        stage = Usd.Stage.Open(self.usd_file)
+        output_path_attr = stage.GetAttributeAtPath(tractor_job.OUTPUT_PATH_ATTR)
+        return {frame: output_path_attr.Get(frame) for frame in FRAMES}
+
+    def build_job(self, options, **kwargs):
+        job = FakeJob()
+        render_file = tractor_job.RenderFile(
+            path=self.usd_file, frame_range=[FRAMES[0], FRAMES[-1], 1], **kwargs
+        )
+        tractor_job.add_tasks(job, [render_file], options)
+        return job
+
+    def test_denoise_renders_to_undenoised(self):
+        self.write_usd_file()
+        job = self.build_job(tractor_job.JobOptions('BRAY_HdPrman', denoise=True))
+
+        # Every frame is rendered to the undenoised folder, and denoised to its original path
+        undenoised_dir = os.path.join(self.render_dir, 'aux', 'undenoised')
+        self.assertEqual(self.saved_output_paths(), {
+            frame: os.path.join(undenoised_dir, f'shot.{frame:04}.exr') for frame in FRAMES
+        })
+        self.assertTrue(os.path.isdir(os.path.join(self.render_dir, 'aux', 'denoised')))
+        self.assertTrue(os.path.isdir(os.path.join(self.render_dir, 'crypto')))
+
+        file_task = job.children[0]
+        self.assertEqual(file_task.title, 'shot.usd')
+        render_task = file_task.child('render')
+        frame_tasks = [child for child in render_task.children if child.title != 'denoise']
+        self.assertEqual([task.title for task in frame_tasks], [f'Frame {frame} f0' for frame in FRAMES])
+        self.assertIn('--frame 1001 ', frame_tasks[0].commands[0].argv[2])
+
+        # Denoising a frame waits on the frames up to three either side of it
+        denoise_tasks = render_task.child('denoise').children
+        self.assertEqual(len(denoise_tasks), len(FRAMES))
+        self.assertEqual(
+            [dependency.title for dependency in denoise_tasks[0].children],
+            [f'Frame {frame} f0' for frame in range(1001, 1005)],
+        )
+        self.assertEqual(
+            [dependency.title for dependency in denoise_tasks[5].children],
+            [f'Frame {frame} f0' for frame in range(1003, 1010)],
+        )
+
+        # The submitter writes each frame's denoise config
+        with open(os.path.join(self.render_dir, 'aux', 'denoised', 'config.1005.json')) as f:
+            config = json.load(f)
+        self.assertEqual(config['config']['frame-include'], '3')
+        self.assertEqual(config['primary'], [
+            os.path.join(undenoised_dir, f'shot.{frame:04}.exr') for frame in range(1002, 1009)
+        ])
+
+        # Cryptomattes are transferred to the final, denoised frames
+        transfer_tasks = file_task.child('post').children
+        self.assertEqual(len(transfer_tasks), len(FRAMES))
+        self.assertEqual(transfer_tasks[0].children[0].title, 'Denoise Frame 1001 f0')
+        self.assertEqual(transfer_tasks[0].argv[-2:], [
+            os.path.join(self.render_dir, 'crypto', 'shot.1001.exr'),
+            os.path.join(self.render_dir, 'shot.1001.exr'),
+        ])
+
+    def test_output_path_overrides(self):
+        self.write_usd_file(cryptomatte=False)
+        override_dir = os.path.join(self.root, 'override')
+        overrides = [os.path.join(override_dir, f'beauty.{frame:04}.exr') for frame in FRAMES]
+        job = self.build_job(
+            tractor_job.JobOptions('BRAY_HdPrman', playblast=True, playblast_location='/playblasts'),
+            output_path_overrides=overrides,
+            delete_usd=True,
+        )
+
+        self.assertEqual(self.saved_output_paths(), dict(zip(FRAMES, overrides)))
+
+        file_task = job.children[0]
+        self.assertIn(f"/usr/bin/rm '{self.usd_file}'", file_task.commands[0].argv[2])
+        playblast_task = file_task.child('post').child('playblast')
+        self.assertTrue(playblast_task.argv[2].endswith(f'{override_dir} /playblasts'))
+
+    def test_prepare_files_in_parallel(self):
+        usd_files = []
+        for file_num in range(6):
+            self.usd_file = os.path.join(self.root, f'shot{file_num}.usd')
+            self.write_usd_file()
+            usd_files.append(self.usd_file)
+
+        def render_files():
+            # Like TractorSubmit, which exports each file before yielding it
+            for usd_file in usd_files:
+                yield tractor_job.RenderFile(path=usd_file, frame_range=[FRAMES[0], FRAMES[-1], 1])
+
+        options = tractor_job.JobOptions('BRAY_HdPrman', denoise=True)
+        job = FakeJob()
+        tractor_job.add_tasks(job, render_files(), options, max_workers=4)
+
+        # The tasks are in the files' order, and numbered by it
+        self.assertEqual([task.title for task in job.children], [os.path.basename(path) for path in usd_files])
+        for file_num, file_task in enumerate(job.children):
+            self.assertEqual(file_task.child('render').children[1].title, f'Frame 1001 f{file_num}')
+            self.usd_file = usd_files[file_num]
+            self.assertTrue(self.saved_output_paths()[1001].endswith(os.path.join('undenoised', 'shot.1001.exr')))
+
+    def test_chunked_render_tasks(self):
+        self.write_usd_file()
+        job = self.build_job(tractor_job.JobOptions('BRAY_HdPrman', denoise=True, frames_per_task=4))
+
+        file_task = job.children[0]
+        render_task = file_task.child('render')
+        chunk_tasks = [child for child in render_task.children if child.title != 'denoise']
+        self.assertEqual([task.title for task in chunk_tasks],
+                         ['Frames 1001-1004 f0', 'Frames 1005-1008 f0', 'Frames 1009-1010 f0'])
+        self.assertIn('--frame-count', chunk_tasks[0].commands[0].argv[2])
+        self.assertEqual(chunk_tasks[0].commands[0].attributes['maxrunsecs'], 4 * 60 * 60)
+
+        # Denoising a frame still waits on the frames up to three either
+        # side of it, through each chunk that renders one of them
+        denoise_tasks = render_task.child('denoise').children
+        self.assertEqual([dependency.title for dependency in denoise_tasks[0].children], ['Frames 1001-1004 f0'])
+        self.assertEqual([dependency.title for dependency in denoise_tasks[4].children],
+                         ['Frames 1001-1004 f0', 'Frames 1005-1008 f0'])
+        self.assertEqual([dependency.title for dependency in denoise_tasks[6].children],
+                         ['Frames 1001-1004 f0', 'Frames 1005-1008 f0', 'Frames 1009-1010 f0'])
+
+        # And transferring a frame's cryptomattes waits on its own denoise task
+        transfer_tasks = file_task.child('post').children
+        self.assertEqual([task.children[0].title for task in transfer_tasks],
+                         [f'Denoise Frame {frame} f0' for frame in FRAMES])
+
+        # Without denoising, it waits on the chunk that renders the frame
+        job = self.build_job(tractor_job.JobOptions('BRAY_HdPrman', frames_per_task=4))
+        transfer_tasks = job.children[0].child('post').children
+        self.assertEqual(transfer_tasks[4].children[0].title, 'Frames 1005-1008 f0')
+
+    def test_denoise_windows(self):
+        self.write_usd_file()
+        job = self.build_job(tractor_job.JobOptions('BRAY_HdPrman', denoise=True, denoise_frames_per_task=4))
+        file_task = job.children[0]
+        undenoised_dir = os.path.join(self.render_dir, 'aux', 'undenoised')
+        denoised_dir = os.path.join(self.render_dir, 'aux', 'denoised')
+
+        denoise_tasks = file_task.child('render').child('denoise').children
+        self.assertEqual([task.title for task in denoise_tasks],
+                         ['Denoise Frames 1001-1004 f0', 'Denoise Frames 1005-1008 f0', 'Denoise Frames 1009-1010 f0'])
+
+        # Each window is denoised in one go, reading the frames up to three either side of it
+        self.assertEqual([dependency.title for dependency in denoise_tasks[1].children],
+                         [f'Frame {frame} f0' for frame in range(1002, 1011)])
+        config_path = os.path.join(denoised_dir, 'config.1005-1008.json')
+        with open(config_path) as f:
+            config = json.load(f)
+        self.assertEqual(config['primary'], [
+            os.path.join(undenoised_dir, f'shot.{frame:04}.exr') for frame in range(1002, 1011)
+        ])
+        self.assertEqual(config['config']['frame-include'], '3-6')
+
+        # Then every frame in it has its AOVs transferred and is moved to its final path
+        commands = [command.argv for command in denoise_tasks[1].commands]
+        self.assertIn(config_path, commands[0][2])
+        self.assertEqual(len(commands), 1 + 2 * 4)
+        self.assertEqual(commands[-1], [
+            '/usr/bin/mv', os.path.join(denoised_dir, 'shot.1008.exr'), os.path.join(self.render_dir, 'shot.1008.exr'),
+        ])
+
+        # And its cryptomattes wait on the window it's denoised in
+        transfer_tasks = file_task.child('post').children
+        self.assertEqual(transfer_tasks[5].children[0].title, 'Denoise Frames 1005-1008 f0')
+
+    def test_adaptive_chunking(self):
+        options = tractor_job.JobOptions('BRAY_HdPrman', frames_per_task=5, chunking=tractor_job.CHUNK_ADAPTIVE)
+
+        # Cheap frames are rendered as many at a time as allowed...
+        self.write_usd_file(resolution=(960, 540))
+        render_task = self.build_job(options).children[0].child('render')
+        self.assertEqual([task.title for task in render_task.children], ['Frames 1001-1005 f0', 'Frames 1006-1010 f0'])
+
+        # ...and expensive ones one at a time, as before
+        self.write_usd_file(resolution=(3840, 2160), max_samples=256)
+        render_task = self.build_job(options).children[0].child('render')
+        self.assertEqual([task.title for task in render_task.children], [f'Frame {frame} f0' for frame in FRAMES])
+
+        # The resolution the submitter sets wins over the file's
+        render_task = self.build_job(options, resolution=['480', '270']).children[0].child('render')
+        self.assertEqual(len(render_task.children), 2)
+
+    def test_render_chunk_resumes(self):
+        # Stand-ins for husk, which logs the frames it's asked to render, and hserver
+        bin_dir = os.path.join(self.root, 'bin')
+        os.makedirs(bin_dir)
+        husk = os.path.join(bin_dir, 'husk')
+        husk_log = os.path.join(self.root, 'husk.log')
+        with open(husk, 'w') as f:
+            f.write(f'#!/bin/bash\necho "$@" > \'{husk_log}\'\n')
+        os.chmod(husk, 0o755)
+
+        output_paths = [os.path.join(self.render_dir, f'shot.{frame:04}.exr') for frame in range(1001, 1011, 2)]
+        os.makedirs(self.render_dir)
+        submit_time = int(time.time())
+        with mock.patch.object(tractor_job, 'HUSK', husk), mock.patch.object(tractor_job, 'HSERVER', '/bin/true'):
+            task = tractor_job.create_render_chunk_task(
+                'Frames 1001-1009 f0', self.usd_file, range(1001, 1011, 2), 'BRAY_HdPrman', output_paths, submit_time,
+            )
+
+        def render_args():
+            subprocess.run(task.commands[0].argv, check=True)
+            with open(husk_log) as f:
+                return f.read().split()
+
+        # Frames rendered before the job was submitted are rendered again...
+        for path in output_paths:
+            open(path, 'w').close()
+            os.utime(path, (submit_time - 60, submit_time - 60))
+        args = render_args()
+        self.assertEqual(args[args.index('--frame') + 1], '1001')
+        self.assertEqual(args[args.index('--frame-count') + 1], '5')
+        self.assertEqual(args[args.index('--frame-inc') + 1], '2')
+        self.assertEqual(args[-1], self.usd_file)
+
+        # ...and a retry resumes from the last frame it rendered, in case it was cut off
+        for path in output_paths[:3]:
+            os.utime(path, (submit_time + 1, submit_time + 1))
+        os.remove(output_paths[3])
+        args = render_args()
+        self.assertEqual(args[args.index('--frame') + 1], '1005')
+        self.assertEqual(args[args.index('--frame-count') + 1], '3')
+
+    def test_resume(self):
+        self.write_usd_file()
+        undenoised_dir = os.path.join(self.render_dir, 'aux', 'undenoised')
+        cryptomatte_dir = os.path.join(self.render_dir, 'crypto')
+        beauty = ('Ci.r', 'Ci.g', 'Ci.b', 'a')
+        cryptomattes = ('crypto00.R', 'crypto00.G')
+
+        # Frames 1003 and 1004 are finished. 1001 lost its cryptomatte EXR
+        # and 1002's was cut off, 1005 hasn't had its cryptomattes
+        # transferred, 1006 hasn't been denoised, 1007 was cut off while
+        # rendering, and the rest haven't been rendered.
+        exrs = {}
+        for frame in FRAMES:
+            if frame <= 1007:
+                exrs[os.path.join(cryptomatte_dir, f'shot.{frame:04}.exr')] = cryptomattes
+                exrs[os.path.join(undenoised_dir, f'shot.{frame:04}.exr')] = beauty
+            if frame <= 1005:
+                exrs[os.path.join(self.render_dir, f'shot.{frame:04}.exr')] = beauty + cryptomattes
+        exrs[os.path.join(self.render_dir, 'shot.1005.exr')] = beauty
+        exrs[os.path.join(undenoised_dir, 'shot.1007.exr')] = None
+        del exrs[os.path.join(cryptomatte_dir, 'shot.1001.exr')]
+        exrs[os.path.join(cryptomatte_dir, 'shot.1002.exr')] = None
+        exrs[os.path.join(self.render_dir, 'shot.1001.exr')] = beauty
+
+        def read_exr_header(path):
+            if path not in exrs:
+                raise FileNotFoundError(path)
+            if exrs[path] is None:
+                raise render_outputs.InvalidExrError("The file is truncated")
+            return render_outputs.ExrHeader(exrs[path], 1024)
+
+        options = tractor_job.JobOptions('BRAY_HdPrman', denoise=True, frames_per_task=4, resume=True)
+        with mock.patch.object(render_outputs, 'read_exr_header', read_exr_header):
+            job = self.build_job(options)
+
+        file_task = job.children[0]
+        render_task = file_task.child('render')
+        self.assertEqual([task.title for task in render_task.children],
+                         ['denoise', 'Frames 1001-1002 f0', 'Frames 1007-1010 f0'])
+
+        # Frames are denoised if they're rendered again, or weren't denoised,
+        # waiting on the frames either side that are rendered again
+        denoise_tasks = render_task.child('denoise').children
+        self.assertEqual([task.title for task in denoise_tasks],
+                         [f'Denoise Frame {frame} f0' for frame in (1001, 1002, *range(1006, 1011))])
+        self.assertEqual([dependency.title for dependency in denoise_tasks[0].children], ['Frames 1001-1002 f0'])
+        self.assertEqual([dependency.title for dependency in denoise_tasks[2].children], ['Frames 1007-1010 f0'])
+
+        transfer_tasks = file_task.child('post').children
+        self.assertEqual([task.title for task in transfer_tasks],
+                         [f'Cryptomatte Transfer Frame {frame} f0' for frame in (1001, 1002, *range(1005, 1011))])
+        self.assertEqual(transfer_tasks[0].children[0].title, 'Denoise Frame 1001 f0')
+        self.assertEqual(transfer_tasks[2].children, [])
+        self.assertEqual(transfer_tasks[3].children[0].title, 'Denoise Frame 1006 f0')
+
+        # Once every frame is finished, there's nothing to submit
+        self.write_usd_file()
+        for frame in FRAMES:
+            exrs[os.path.join(cryptomatte_dir, f'shot.{frame:04}.exr')] = cryptomattes
+            exrs[os.path.join(undenoised_dir, f'shot.{frame:04}.exr')] = beauty
+            exrs[os.path.join(self.render_dir, f'shot.{frame:04}.exr')] = beauty + cryptomattes
+        job = FakeJob()
+        render_file = tractor_job.RenderFile(path=self.usd_file, frame_range=[FRAMES[0], FRAMES[-1], 1])
+        with mock.patch.object(render_outputs, 'read_exr_header', read_exr_header):
+            self.assertEqual(tractor_job.add_tasks(job, [render_file], options), 0)
+        self.assertEqual(job.children, [])
+
+    def write_layer(self, path, text):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('#usda 1.0\n' + text)
+
+    def test_usdnc_converter(self):
+        # The shot sublayers an animation layer saved as .usdnc, which
+        # references a chair that's only a .usdnc too
+        self.write_layer(self.usd_file, '(\n    subLayers = [@./layers/anim.usd@, @./layers/light.usda@]\n)\n')
+        self.write_layer(os.path.join(self.root, 'layers', 'light.usda'), 'def "Light" {}\n')
+        self.write_layer(os.path.join(self.root, 'layers', 'anim.usdnc'),
+                         'def "Chair" (\n    references = @../assets/chair.usd@\n)\n{\n}\n')
+        chair_usdnc = os.path.join(self.root, 'assets', 'chair.usdnc')
+        self.write_layer(chair_usdnc, '(\n    defaultPrim = "Chair"\n)\ndef "Chair" {\n    int legs = 4\n}\n')
+
+        converted = []
+
+        def convert_usdnc(usdnc_file_path, file_path):
+            # Stands in for usdcat, since the .usdnc files here are plain text
+            converted.append(file_path)
+            shutil.copy(usdnc_file_path, file_path)
+
+        class TextUsdncConverter(tractor_job.UsdncConverter):
+            def _extract_references(self, layer_path):
+                if layer_path.endswith('.usdnc'):
+                    usda_path = os.path.join(tempfile.mkdtemp(dir=os.path.dirname(layer_path)), 'layer.usda')
+                    shutil.copy(layer_path, usda_path)
+                    return super()._extract_references(usda_path)
+                return super()._extract_references(layer_path)
+
+        converter = TextUsdncConverter(max_workers=4)
+        with mock.patch.object(tractor_job, 'convert_usdnc', convert_usdnc), \
+                mock.patch.object(tractor_job, '_usdnc_converter', converter):
+            stage = tractor_job.open_stage(self.usd_file)
+            self.assertEqual(sorted(converted), [
+                os.path.join(self.root, 'assets', 'chair.usd'),
+                os.path.join(self.root, 'layers', 'anim.usd'),
+            ])
+            self.assertEqual(stage.GetAttributeAtPath('/Chair.legs').Get(), 4)
+
+            # Layers are only converted again once their .usdnc changes
+            self.assertEqual(converter.find_conversions(self.usd_file), {})
+            stat = os.stat(chair_usdnc)
+            os.utime(chair_usdnc, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**10))
+            self.assertEqual(converter.find_conversions(self.usd_file), {
+                os.path.join(self.root, 'assets', 'chair.usd'): chair_usdnc,
+            })
+
+    def test_set_time_samples_overrides_weaker_layers(self):
+        # The output paths come from a sublayer, so the root layer needs an over for them
+        self.write_usd_file(cryptomatte=False)
+        root_file = os.path.join(self.root, 'root.usd')
+        stage = Usd.Stage.CreateNew(root_file)
+        stage.GetRootLayer().subLayerPaths.append(self.usd_file)
+        output_path_attr = stage.GetAttributeAtPath(tractor_job.OUTPUT_PATH_ATTR)
+
+        tractor_job.set_time_samples(output_path_attr, {frame: f'out.{frame:04}.exr' for frame in FRAMES})
+        stage.Save()
+
+        self.assertEqual(Sdf.Layer.FindOrOpen(root_file).ListTimeSamplesForPath(output_path_attr.GetPath()),
+                         [float(frame) for frame in FRAMES])
+        self.assertEqual(self.saved_output_paths()[1001], os.path.join(self.render_dir, 'shot.1001.exr'))
+        self.assertEqual(output_path_attr.Get(1005), 'out.1005.exr')
+
+
+if __name__ == '__main__':
+    unittest.main()
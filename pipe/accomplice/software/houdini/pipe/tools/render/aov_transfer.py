@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+"""Copy the AOVs one EXR has and another doesn't into the other.
+
+Run on the blades after denoising (the denoiser drops the AOVs it doesn't
+denoise) and to add cryptomattes to the final frames:
+
+    python3 aov_transfer.py SRC_EXR DEST_EXR
+
+The channels of SRC_EXR that DEST_EXR doesn't have, other than the
+beauty's, are appended to DEST_EXR, and SRC_EXR's metadata (e.g. the
+cryptomatte manifests) is merged into DEST_EXR's. DEST_EXR is replaced
+once the merged file is written, so it's never left half-written.
+
+Each file's header is read once, and the merged file is written in one
+pass. With OpenImageIO's Python bindings that all happens in this
+process; without them, it's done with oiiotool (one header read per
+file, then the merge).
+"""
+
+import os
+import subprocess
+import sys
+import uuid
+from argparse import ArgumentParser
+from typing import List, Optional, Sequence
+
+try:
+    import OpenImageIO as oiio
+except ImportError:
+    oiio = None
+
+HOIIOTOOL = '/opt/hfs19.5/bin/hoiiotool'
+
+# The denoised beauty replaces these, so they're never transferred
+BEAUTY_CHANNELS = ('Ci.r', 'Ci.g', 'Ci.b')
+
+
+def get_transfer_channels(src_channels: Sequence[str], dest_channels: Sequence[str]) -> List[str]:
+    """Get the channels to transfer, in the order the source has them.
+
+    The denoiser changes the case of some channel names, so channels are
+    compared ignoring case.
+    """
+    dest_lower = {channel.lower() for channel in dest_channels}
+    return [
+        channel for channel in src_channels
+        if channel.lower() not in dest_lower and channel not in BEAUTY_CHANNELS
+    ]
+
+
+def _temp_path(path: str) -> str:
+    # Keep the extension, so the temporary file is written as an EXR
+    return os.path.join(os.path.dirname(path), f'.{uuid.uuid4().hex[:8]}.{os.path.basename(path)}')
+
+
+def _write_merged_oiio(src_buf, dest_buf, channels: Sequence[str], path: str) -> None:
+    # The specs of the files, rather than of the pixels read into memory
+    src_spec = src_buf.nativespec()
+    dest_spec = dest_buf.nativespec()
+
+    transfer_buf = oiio.ImageBufAlgo.channels(src_buf, tuple(channels))
+    merged_buf = oiio.ImageBufAlgo.channel_append(dest_buf, transfer_buf)
+    if merged_buf.has_error:
+        raise RuntimeError(merged_buf.geterror())
+
+    # Merge the metadata, keeping the destination's where both have it
+    merged_spec = merged_buf.specmod()
+    for attrib in src_spec.extra_attribs:
+        if merged_spec.getattribute(attrib.name) is None:
+            merged_spec.attribute(attrib.name, attrib.type, attrib.value)
+
+    # Keep each channel's pixel type, e.g. half beauty and float cryptomattes
+    def channel_format(spec, channel):
+        if spec.channelformats:
+            return spec.channelformats[spec.channelindex(channel)]
+        return spec.format
+    merged_buf.set_write_format(
+        [channel_format(dest_spec, channel) for channel in dest_spec.channelnames]
+        + [channel_format(src_spec, channel) for channel in channels]
+    )
+
+    if not merged_buf.write(path):
+        raise RuntimeError(merged_buf.geterror())
+
+
+def _read_channels_oiiotool(oiiotool: str, path: str) -> List[str]:
+    info = subprocess.run(
+        [oiiotool, path, '--printinfo'], check=True, capture_output=True, text=True
+    ).stdout
+    for line in info.splitlines():
+        if 'channel list:' in line:
+            return [channel.strip() for channel in line.split(':', 1)[1].split(',')]
+    raise RuntimeError(f"Couldn't find the channels of {path} in:\n{info}")
+
+
+def transfer_aovs(src_exr_path: str, dest_exr_path: str, oiiotool: Optional[str] = None) -> List[str]:
+    """Copy the AOVs a source EXR has and a destination doesn't into it. Returns the channels copied.
+
+    Keyword arguments:
+    src_exr_path -- the EXR to copy the AOVs from
+    dest_exr_path -- the EXR to copy them into
+    oiiotool -- the oiiotool to use if OpenImageIO's Python bindings
+                aren't installed (default: Houdini's hoiiotool)
+    """
+    tmp_path = _temp_path(dest_exr_path)
+    try:
+        if oiio is not None:
+            # Opening an image only reads its header, until its pixels are needed
+            src_buf = oiio.ImageBuf(src_exr_path)
+            dest_buf = oiio.ImageBuf(dest_exr_path)
+            for buf in (src_buf, dest_buf):
+                if buf.has_error:
+                    raise RuntimeError(buf.geterror())
+            dest_channels = list(dest_buf.nativespec().channelnames)
+            channels = get_transfer_channels(src_buf.nativespec().channelnames, dest_channels)
+            if channels:
+                _write_merged_oiio(src_buf, dest_buf, channels, tmp_path)
+        else:
+            oiiotool = oiiotool or HOIIOTOOL
+            dest_channels = _read_channels_oiiotool(oiiotool, dest_exr_path)
+            channels = get_transfer_channels(_read_channels_oiiotool(oiiotool, src_exr_path), dest_channels)
+            if channels:
+                subprocess.run([
+                    oiiotool,
+                    '--metamerge',
+                    dest_exr_path, '--ch', ','.join(dest_channels),
+                    src_exr_path, '--ch', ','.join(channels),
+                    '--chappend',
+                    '-o', tmp_path,
+                ], check=True)
+
+        if channels:
+            os.replace(tmp_path, dest_exr_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return channels
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('src_exr_path')
+    parser.add_argument('dest_exr_path')
+    parser.add_argument('--oiiotool', help="oiiotool to use without OpenImageIO's Python bindings "
+                                           f"(default: {HOIIOTOOL})")
+    args = parser.parse_args(argv)
+
+    try:
+        channels = transfer_aovs(args.src_exr_path, args.dest_exr_path, args.oiiotool)
+    except (OSError, RuntimeError, subprocess.CalledProcessError) as ex:
+        print(f"Failed to transfer AOVs from {args.src_exr_path} to {args.dest_exr_path}: {ex}", file=sys.stderr)
+        return 1
+
+    if channels:
+        print(f"Transferred {', '.join(channels)} from {args.src_exr_path} to {args.dest_exr_path}")
+    else:
+        print(f"{args.dest_exr_path} already has every AOV in {args.src_exr_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
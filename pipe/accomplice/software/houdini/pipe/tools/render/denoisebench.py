@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""Measure what denoising a shot reads against how many frames each task denoises.
+
+Run from this directory, with usd-core installed and the pipe package's
+parent directory on PYTHONPATH, e.g.
+
+    python3 -m denoisebench --frames 240 --window 1 5 10 24
+
+Builds the denoise tasks for a shot the way the Tractor submitter does,
+then counts the tasks and reads the configs they'd run denoise_batch
+with. Every frame a config lists is read in full, so the bytes read are
+the frames listed times the size of a frame rendered with the
+denoiser's AOVs (--frame-mb).
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from argparse import ArgumentParser
+
+from submitbench import tractor_job, write_usd_file
+
+
+def run(frames: int, window: int, frame_bytes: int) -> dict:
+    root = tempfile.mkdtemp(prefix='accomplice_denoisebench_')
+    try:
+        path = os.path.join(root, 'shot.usd')
+        write_usd_file(path, frames, 0)
+        job = tractor_job.author.Job()
+        tractor_job.add_tasks(job, [tractor_job.RenderFile(path, [1001, 1000 + frames, 1])],
+                              tractor_job.JobOptions('BRAY_HdPrman', denoise=True, denoise_frames_per_task=window))
+
+        config_dir = os.path.join(root, 'render', 'aux', 'denoised')
+        frames_read = 0
+        for config_name in os.listdir(config_dir):
+            with open(os.path.join(config_dir, config_name)) as f:
+                frames_read += len(json.load(f)['primary'])
+        return {
+            'tasks': len(os.listdir(config_dir)),
+            'frames read': frames_read,
+            'bytes read': frames_read * frame_bytes,
+        }
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=240)
+    parser.add_argument('--window', type=int, nargs='+', default=[1, 5, 10, 24],
+                        help="frames per denoise task to compare")
+    parser.add_argument('--frame-mb', type=float, default=80.0,
+                        help="size of a rendered frame in MB (default: %(default)s)")
+    args = parser.parse_args()
+
+    baseline = None
+    for window in args.window:
+        results = run(args.frames, window, int(args.frame_mb * 1024 * 1024))
+        baseline = baseline or results
+        print(f"{window:3} frames per task  {results['tasks']:5} tasks  "
+              f"{results['frames read']:6} frames read  {results['bytes read'] / 1024 ** 3:8.1f} GB"
+              f"  ({results['bytes read'] / baseline['bytes read']:.0%} of {args.window[0]} per task)")
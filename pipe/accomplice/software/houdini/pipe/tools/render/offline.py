@@ -0,0 +1,78 @@
+"""Run the render tools outside Houdini and off the farm.
+
+The tests and benchmarks here import the render tools from the repo's
+pipe package, with usd-core instead of Houdini's pxr. Call setup() before
+importing them: it adds Houdini's tools to the pipe package and, where
+Tractor isn't installed, stands in for its job authoring API with the
+fake below, which records what's added to a job rather than spooling it.
+"""
+
+import os
+import sys
+import types
+
+HOUDINI_PIPE = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+
+class FakeTask:
+    """Records what the job building adds to a Tractor task."""
+
+    def __init__(self, title=None, argv=None, **kwargs):
+        self.title = title
+        self.argv = argv
+        self.attributes = kwargs
+        self.children = []
+        self.commands = []
+
+    def addChild(self, child):
+        self.children.append(child)
+
+    def addCommand(self, command):
+        self.commands.append(command)
+
+    def newCommand(self, **kwargs):
+        command = FakeCommand(**kwargs)
+        self.commands.append(command)
+        return command
+
+    def child(self, title):
+        return next(child for child in self.children if child.title == title)
+
+
+class FakeCommand:
+    def __init__(self, argv=None, **kwargs):
+        self.argv = argv
+        self.attributes = kwargs
+
+
+class FakeInstance:
+    def __init__(self, title=None):
+        self.title = title
+
+
+class FakeJob(FakeTask):
+    def spool(self):
+        pass
+
+
+fake_author = types.ModuleType('tractor.api.author')
+fake_author.Job = FakeJob
+fake_author.Task = FakeTask
+fake_author.Command = FakeCommand
+fake_author.Instance = FakeInstance
+
+
+def setup() -> None:
+    """Make the render tools importable from the repo's pipe package."""
+    # Outside the farm's environment there's no Tractor to import
+    try:
+        import tractor.api.author
+    except ImportError:
+        sys.modules['tractor'] = types.ModuleType('tractor')
+        sys.modules['tractor.api'] = types.ModuleType('tractor.api')
+        sys.modules['tractor.api.author'] = fake_author
+
+    # Outside Houdini, the pipe package is the repo's, so add Houdini's tools to it
+    import pipe
+    if HOUDINI_PIPE not in pipe.__path__:
+        pipe.__path__.append(HOUDINI_PIPE)
@@ -0,0 +1,251 @@
+"""Check which rendered frames are complete.
+
+A frame's EXR is complete when its header can be read and every chunk of
+pixels its offset table lists was written. OpenEXR fills in the offset
+table when it closes the file, so a render that died partway leaves it
+zeroed or pointing past the end of the file. Only the header, the offset
+table and the last chunk's size are read, so checking a frame takes a
+few small reads however big it is, and doesn't need OpenEXR.
+"""
+
+import math
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+EXR_MAGIC = 20000630
+
+# Version field flags
+_TILED = 0x200
+_NON_IMAGE = 0x800
+_MULTIPART = 0x1000
+
+# How many scanlines each compression method stores per chunk
+_SCANLINES_PER_CHUNK = {
+    0: 1,       # NONE
+    1: 1,       # RLE
+    2: 1,       # ZIPS
+    3: 16,      # ZIP
+    4: 32,      # PIZ
+    5: 16,      # PXR24
+    6: 32,      # B44
+    7: 32,      # B44A
+    8: 32,      # DWAA
+    9: 256,     # DWAB
+}
+
+# Reading headers is mostly waiting on the file server
+SCAN_WORKERS = 16
+
+
+class InvalidExrError(ValueError):
+    pass
+
+
+class ExrHeader(NamedTuple):
+    """What's checked about an EXR that's complete."""
+
+    channels: Tuple[str, ...]
+    """The channels of every part, in order"""
+    size: int
+    """The file's size in bytes"""
+
+
+class _Part(NamedTuple):
+    type: str
+    channels: Tuple[str, ...]
+    chunk_count: Optional[int]
+
+
+def _read(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) < size:
+        raise InvalidExrError("Unexpected end of file")
+    return data
+
+
+def _read_string(f: BinaryIO) -> str:
+    chars = bytearray()
+    while True:
+        char = _read(f, 1)
+        if char == b'\0':
+            return chars.decode('utf-8', 'replace')
+        chars += char
+
+
+def _parse_channels(value: bytes) -> Tuple[str, ...]:
+    # Each channel is its name, then 16 bytes of pixel type and sampling,
+    # and the list ends with an empty name
+    channels = []
+    pos = 0
+    while pos < len(value) and value[pos] != 0:
+        end = value.index(b'\0', pos)
+        channels.append(value[pos:end].decode('utf-8', 'replace'))
+        pos = end + 1 + 16
+    return tuple(channels)
+
+
+def _num_levels(size: int, round_up: bool) -> int:
+    levels = size.bit_length() - 1
+    if round_up and size & (size - 1):
+        levels += 1
+    return levels + 1
+
+
+def _level_size(size: int, level: int, round_up: bool) -> int:
+    if round_up:
+        return max(1, (size + (1 << level) - 1) >> level)
+    return max(1, size >> level)
+
+
+def _count_tiles(width: int, height: int, tiles: bytes) -> Optional[int]:
+    tile_width, tile_height, mode = struct.unpack('<IIB', tiles)
+    level_mode, round_up = mode & 0x0f, bool(mode >> 4)
+    if level_mode == 0:
+        levels = [(width, height)]
+    elif level_mode == 1:
+        levels = [
+            (_level_size(width, level, round_up), _level_size(height, level, round_up))
+            for level in range(_num_levels(max(width, height), round_up))
+        ]
+    elif level_mode == 2:
+        levels = [
+            (_level_size(width, x_level, round_up), _level_size(height, y_level, round_up))
+            for y_level in range(_num_levels(height, round_up))
+            for x_level in range(_num_levels(width, round_up))
+        ]
+    else:
+        return None
+    return sum(
+        math.ceil(level_width / tile_width) * math.ceil(level_height / tile_height)
+        for level_width, level_height in levels
+    )
+
+
+def _read_part(f: BinaryIO, tiled: bool) -> Optional[_Part]:
+    # Returns None for the empty header that ends a multi-part file's headers
+    attributes = {}
+    while True:
+        name = _read_string(f)
+        if not name:
+            break
+        _read_string(f)
+        size, = struct.unpack('<i', _read(f, 4))
+        if size < 0:
+            raise InvalidExrError(f"Attribute {name} has a negative size")
+        if name in ('channels', 'compression', 'dataWindow', 'tiles', 'chunkCount', 'type'):
+            attributes[name] = _read(f, size)
+        else:
+            f.seek(size, os.SEEK_CUR)
+    if not attributes:
+        return None
+
+    for name in ('channels', 'compression', 'dataWindow'):
+        if name not in attributes:
+            raise InvalidExrError(f"The header has no {name}")
+    part_type = attributes['type'].decode('utf-8', 'replace') if 'type' in attributes else (
+        'tiledimage' if tiled else 'scanlineimage'
+    )
+
+    if 'chunkCount' in attributes:
+        chunk_count, = struct.unpack('<i', attributes['chunkCount'])
+    else:
+        x_min, y_min, x_max, y_max = struct.unpack('<iiii', attributes['dataWindow'])
+        width, height = x_max - x_min + 1, y_max - y_min + 1
+        if width < 1 or height < 1:
+            raise InvalidExrError("The data window is empty")
+        if part_type == 'tiledimage' and 'tiles' in attributes:
+            chunk_count = _count_tiles(width, height, attributes['tiles'])
+        elif part_type == 'scanlineimage' and attributes['compression'][0] in _SCANLINES_PER_CHUNK:
+            chunk_count = math.ceil(height / _SCANLINES_PER_CHUNK[attributes['compression'][0]])
+        else:
+            # Compression this doesn't know, so only the header is checked
+            chunk_count = None
+
+    return _Part(part_type, _parse_channels(attributes['channels']), chunk_count)
+
+
+def _chunk_end(f: BinaryIO, offset: int, part_type: str, multipart: bool) -> int:
+    f.seek(offset + (4 if multipart else 0))
+    if part_type == 'scanlineimage':
+        _, data_size = struct.unpack('<ii', _read(f, 8))
+    elif part_type == 'tiledimage':
+        *_, data_size = struct.unpack('<iiiii', _read(f, 20))
+    elif part_type == 'deepscanline':
+        _, table_size, data_size, _ = struct.unpack('<iqqq', _read(f, 28))
+        data_size += table_size
+    elif part_type == 'deeptile':
+        *_, table_size, data_size, _ = struct.unpack('<iiiiqqq', _read(f, 40))
+        data_size += table_size
+    else:
+        raise InvalidExrError(f"Unknown part type {part_type}")
+    if data_size < 0:
+        raise InvalidExrError("A chunk has a negative size")
+    return f.tell() + data_size
+
+
+def read_exr_header(path: str) -> ExrHeader:
+    """Read an EXR's header and check every chunk of its pixels was written.
+
+    Raises InvalidExrError if it's incomplete or isn't an EXR.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        magic, version = struct.unpack('<ii', _read(f, 8))
+        if magic != EXR_MAGIC:
+            raise InvalidExrError("Not an EXR")
+        multipart = bool(version & _MULTIPART)
+
+        parts: List[_Part] = []
+        while True:
+            part = _read_part(f, bool(version & _TILED))
+            if part is None:
+                break
+            parts.append(part)
+            if not multipart:
+                break
+        if not parts:
+            raise InvalidExrError("The file has no parts")
+        if any(part.chunk_count is None for part in parts):
+            return ExrHeader(tuple(channel for part in parts for channel in part.channels), size)
+
+        # Every chunk must start after the offset tables, and the last one
+        # must end within the file
+        chunk_count = sum(part.chunk_count for part in parts)
+        tables_end = f.tell() + 8 * chunk_count
+        offsets = struct.unpack(f'<{chunk_count}Q', _read(f, 8 * chunk_count))
+        if any(offset < tables_end or offset >= size for offset in offsets):
+            raise InvalidExrError("The offset table is incomplete")
+        last_offset = max(offsets)
+        last_part = parts[0]
+        if multipart:
+            f.seek(last_offset)
+            part_num, = struct.unpack('<i', _read(f, 4))
+            if not 0 <= part_num < len(parts):
+                raise InvalidExrError("A chunk belongs to a part that doesn't exist")
+            last_part = parts[part_num]
+        if _chunk_end(f, last_offset, last_part.type, multipart) > size:
+            raise InvalidExrError("The file is truncated")
+
+    return ExrHeader(tuple(channel for part in parts for channel in part.channels), size)
+
+
+def check_exr(path: str) -> Optional[ExrHeader]:
+    """Get a complete EXR's header, or None if it's missing or incomplete."""
+    try:
+        return read_exr_header(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, InvalidExrError, struct.error) as e:
+        print(f"{path} is incomplete or corrupt: {e}")
+        return None
+
+
+def scan_exrs(paths: Iterable[str], max_workers: int = SCAN_WORKERS) -> Dict[str, Optional[ExrHeader]]:
+    """Check many EXRs at once. Returns each one's header, or None if it's missing or incomplete."""
+    paths = list(dict.fromkeys(paths))
+    if max_workers <= 1 or len(paths) <= 1:
+        return {path: check_exr(path) for path in paths}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ScanExrs') as executor:
+        return dict(zip(paths, executor.map(check_exr, paths)))
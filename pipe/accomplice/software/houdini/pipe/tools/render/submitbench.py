@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+"""Benchmark building a Tractor render job against its frame count.
+
+Run from this directory, with usd-core installed and the pipe package's
+parent directory on PYTHONPATH, e.g.
+
+    python3 -m submitbench --frames 10 50 100 250
+
+Writes a USD file like the ones the Tractor submitter renders (a render
+product with a time-sampled output path, plus other prims so saving it
+takes as long as saving a shot does), then times setting every frame's
+output path the original way, setting and saving it once per frame,
+against authoring the samples in memory and saving once. It also times
+building the whole job, denoise tasks included.
+
+With --files, it also times submitting several files, writing each one
+(standing in for Houdini exporting it) just before it's submitted, with
+the files prepared one at a time, against prepared on a pool of threads.
+
+With --layers, it also times opening a USD file that sublayers that many
+layers only saved as .usdnc, converting them with a stand-in for usdcat
+that copies the file, one at a time and on a pool of threads. The
+.usdnc files here are plain text USD, since usd-core can't read real ones.
+
+Uses Tractor's job authoring API if it's installed, and the fake in
+offline.py otherwise.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from pxr import Sdf, Usd
+
+import offline
+offline.setup()
+
+from pipe.tools.render import tractor_job
+
+
+def write_usd_file(path: str, frames: int, prims: int) -> None:
+    stage = Usd.Stage.CreateNew(path)
+    output_path_attr = stage.DefinePrim('/Render/Products/renderproduct', 'RenderProduct').CreateAttribute(
+        'productName', Sdf.ValueTypeNames.Token
+    )
+    stage.DefinePrim('/Render/rendersettings', 'RenderSettings')
+    render_dir = os.path.join(os.path.dirname(path), 'render')
+    for frame in range(1001, 1001 + frames):
+        output_path_attr.Set(os.path.join(render_dir, f'shot.{frame:04}.exr'), frame)
+    for prim_num in range(prims):
+        prim = stage.DefinePrim(f'/World/geo/prim{prim_num}', 'Xform')
+        prim.CreateAttribute('xformOp:translate', Sdf.ValueTypeNames.Double3).Set((prim_num, 0, 0))
+        prim.CreateAttribute('primvars:variant', Sdf.ValueTypeNames.String).Set(f'variant{prim_num % 7}')
+    stage.Save()
+
+
+def _legacy_set_output_paths(path: str, frames: int) -> float:
+    # Set and save each frame's output path, the way the submitter originally did
+    start = time.perf_counter()
+    stage = Usd.Stage.Open(path)
+    output_path_attr = stage.GetAttributeAtPath(tractor_job.OUTPUT_PATH_ATTR)
+    for frame in range(1001, 1001 + frames):
+        frame_path = output_path_attr.Get(frame)
+        output_path_attr.Set(os.path.join(os.path.dirname(frame_path), 'aux', 'undenoised',
+                                          os.path.basename(frame_path)), frame)
+        stage.Save()
+    return time.perf_counter() - start
+
+
+def _set_output_paths(path: str, frames: int) -> float:
+    start = time.perf_counter()
+    stage = Usd.Stage.Open(path)
+    output_path_attr = stage.GetAttributeAtPath(tractor_job.OUTPUT_PATH_ATTR)
+    samples = {}
+    for frame in range(1001, 1001 + frames):
+        frame_path = output_path_attr.Get(frame)
+        samples[frame] = os.path.join(os.path.dirname(frame_path), 'aux', 'undenoised', os.path.basename(frame_path))
+    tractor_job.set_time_samples(output_path_attr, samples)
+    stage.Save()
+    return time.perf_counter() - start
+
+
+def _build_job(path: str, frames: int) -> float:
+    start = time.perf_counter()
+    render_file = tractor_job.RenderFile(path, [1001, 1000 + frames, 1])
+    options = tractor_job.JobOptions('BRAY_HdPrman', denoise=True)
+    tractor_job.add_tasks(tractor_job.author.Job(), [render_file], options)
+    return time.perf_counter() - start
+
+
+def _build_multi_file_job(root: str, files: int, frames: int, prims: int, workers: int) -> float:
+    def render_files():
+        for file_num in range(files):
+            path = os.path.join(root, f'shot{file_num}.usd')
+            write_usd_file(path, frames, prims)
+            yield tractor_job.RenderFile(path, [1001, 1000 + frames, 1])
+
+    start = time.perf_counter()
+    options = tractor_job.JobOptions('BRAY_HdPrman', denoise=True)
+    tractor_job.add_tasks(tractor_job.author.Job(), render_files(), options, max_workers=workers)
+    return time.perf_counter() - start
+
+
+def run_files(files: int, frames: int, prims: int, workers: int) -> dict:
+    root = tempfile.mkdtemp(prefix='accomplice_submitbench_')
+    try:
+        return {
+            'one at a time': _build_multi_file_job(root, files, frames, prims, 1),
+            f'{workers} workers': _build_multi_file_job(root, files, frames, prims, workers),
+        }
+    finally:
+        shutil.rmtree(root)
+
+
+class TextUsdncConverter(tractor_job.UsdncConverter):
+    """Reads the plain text .usdnc files written by write_usdnc_layers."""
+
+    def _extract_references(self, layer_path: str) -> list:
+        if layer_path.endswith('.usdnc'):
+            usda_path = layer_path + '.usda'
+            shutil.copy(layer_path, usda_path)
+            return super()._extract_references(usda_path)
+        return super()._extract_references(layer_path)
+
+
+def write_usdnc_layers(root: str, layers: int) -> str:
+    bin_dir = os.path.join(root, 'bin')
+    os.makedirs(bin_dir)
+    usdcat = os.path.join(bin_dir, 'usdcat')
+    with open(usdcat, 'w') as f:
+        f.write(f'#!{sys.executable}\nimport shutil, sys\nshutil.copy(sys.argv[3], sys.argv[2])\n')
+    os.chmod(usdcat, 0o755)
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ['PATH']
+
+    layer_paths = []
+    for layer_num in range(layers):
+        layer_path = os.path.join(root, 'layers', f'layer{layer_num}.usd')
+        os.makedirs(os.path.dirname(layer_path), exist_ok=True)
+        with open(layer_path + 'nc', 'w') as f:
+            f.write(f'#usda 1.0\ndef "Layer{layer_num}" {{\n    int layer = {layer_num}\n}}\n')
+        layer_paths.append(f'@./layers/layer{layer_num}.usd@')
+    usd_file = os.path.join(root, 'shot.usda')
+    with open(usd_file, 'w') as f:
+        f.write(f'#usda 1.0\n(\n    subLayers = [{", ".join(layer_paths)}]\n)\n')
+    return usd_file
+
+
+def run_layers(layers: int, workers: int) -> dict:
+    results = {}
+    for name, count in (('one at a time', 1), (f'{workers} workers', workers)):
+        root = tempfile.mkdtemp(prefix='accomplice_submitbench_')
+        path = os.environ['PATH']
+        try:
+            usd_file = write_usdnc_layers(root, layers)
+            converter = TextUsdncConverter(max_workers=count)
+            tractor_job._usdnc_converter = converter
+            start = time.perf_counter()
+            stage = tractor_job.open_stage(usd_file)
+            results[name] = time.perf_counter() - start
+            assert stage.GetAttributeAtPath(f'/Layer{layers - 1}.layer').Get() == layers - 1
+        finally:
+            os.environ['PATH'] = path
+            shutil.rmtree(root)
+    return results
+
+
+def run(frames: int, prims: int) -> dict:
+    root = tempfile.mkdtemp(prefix='accomplice_submitbench_')
+    try:
+        path = os.path.join(root, 'shot.usd')
+        results = {}
+        for name, time_it in (
+            ('legacy', _legacy_set_output_paths),
+            ('in memory', _set_output_paths),
+            ('whole job', _build_job),
+        ):
+            write_usd_file(path, frames, prims)
+            results[name] = time_it(path, frames)
+        return results
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, nargs='+', default=[10, 50, 100, 250])
+    parser.add_argument('--prims', type=int, default=5000, help="other prims in the file (default: %(default)s)")
+    parser.add_argument('--files', type=int, default=0, help="also time submitting this many files")
+    parser.add_argument('--layers', type=int, default=0, help="also time converting this many .usdnc layers")
+    parser.add_argument('--workers', type=int, default=min(8, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    print(f"Job authoring API: {tractor_job.author.__name__}"
+          f"{' (fake)' if tractor_job.author is offline.fake_author else ''}")
+    for frames in args.frames:
+        results = run(frames, args.prims)
+        print(f"{frames:5} frames  " + "  ".join(
+            f"{name} {seconds * 1000:8.1f} ms" for name, seconds in results.items()
+        ))
+
+    if args.files:
+        results = run_files(args.files, args.frames[-1], args.prims, args.workers)
+        print(f"{args.files:5} files   " + "  ".join(
+            f"{name} {seconds * 1000:8.1f} ms" for name, seconds in results.items()
+        ))
+
+    if args.layers:
+        results = run_layers(args.layers, args.workers)
+        print(f"{args.layers:5} layers  " + "  ".join(
+            f"{name} {seconds * 1000:8.1f} ms" for name, seconds in results.items()
+        ))
@@ -4,16 +4,13 @@ import os
 import re
 import functools
 import glob
-from typing import Sequence, Iterable, Mapping, Any, Optional, Literal
+from typing import Sequence, Iterable, Iterator, Mapping, Any, Optional, Literal
 import inspect
 import string
-import subprocess
-import sys
 
-import pxr
 from pxr import Usd
 from pipe.shared.helper.utilities.houdini_utils import HoudiniUtils
-from pipe.shared.object import JsonSerializable
+from pipe.tools.render.tractor_job import CHUNK_FRAMES, JobOptions, RenderFile, add_tasks
 
 # Tractor requires all necessary environment paths of the job to function.
 # Add any additonal required paths to the list: ENV_PATHS
@@ -35,6 +32,22 @@ ENV_KEY = functools.reduce(
 )
 # ENV_KEY = [key + '=' + os.getenv(key) for key in ENV_PATHS]
 
+# How many USDs to open, convert, and inspect at once while submitting.
+# By default each one is prepared in turn after it's exported. Preparing
+# them on a pool hasn't been tried inside Houdini yet, so it's opt in:
+# set PIPE_SUBMIT_WORKERS to more than 1 to use one.
+SUBMIT_WORKERS = int(os.getenv('PIPE_SUBMIT_WORKERS', 1))
+
+# How many frames each render task renders, and whether to chunk them by
+# count ('frames') or by estimated cost ('adaptive'), for nodes without
+# the framespertask and chunking parms
+FRAMES_PER_TASK = int(os.getenv('PIPE_FRAMES_PER_TASK', 1))
+CHUNKING = os.getenv('PIPE_CHUNKING', CHUNK_FRAMES)
+
+# How many consecutive frames each denoise task denoises, for nodes
+# without the denoiseframespertask parm
+DENOISE_FRAMES_PER_TASK = int(os.getenv('PIPE_DENOISE_FRAMES_PER_TASK', 1))
+
 
 # This function runs when the submit button on the node is pushed
 # Creates TractorJob object and submits the job
@@ -44,14 +57,24 @@ def farm_render(node: hou.Node) -> None:
     job.spoolJob()
 
 
+# Resubmits the job, leaving out the frames that are already finished,
+# e.g. after a job died partway through
+def farm_resume(node: hou.Node) -> None:
+    author.setEngineClientParam(hostname="hopps.cs.byu.edu", port=443)
+    job = TractorSubmit(node, resume=True)
+    job.spoolJob()
+
+
 # This class holds all the variables and methods required to gather the paramters
 # from the tractor lop user interface and convert them to a tractor job
 class TractorSubmit:
     # Constructor method which takes the node and sets the job title variable
-    def __init__(self, node):
+    def __init__(self, node, resume: bool = False):
         # Necessary variables declared here for easy readibility
         # Reference to the lop node
         self.node: hou.Node = node
+        # Whether to only render the frames that aren't finished
+        self.resume = resume
 
         # Tractor library Job class object used to submit jobs
         self.job = author.Job()
@@ -73,6 +96,14 @@ class TractorSubmit:
     # Gets the directory paths and render output overrides when
     # USDs are inputted manually with the "From Disk" Render method
     def input_usd_info(self):
+        for _ in self.iter_usd_info():
+            pass
+
+        print(self.filepaths, self.frame_ranges, self.output_path_overrides)
+
+    # Gets the USDs to render one at a time, exporting the ones from node
+    # sources as it goes, so each can be prepared while the next exports
+    def iter_usd_info(self) -> Iterator[RenderFile]:
         num_sources = get_parm_int(self.node, 'sources')
 
         # For loop for getting variables from dynamically changing parameters
@@ -81,13 +112,13 @@ class TractorSubmit:
             if source_is_enabled(self.node, source_num):
                 source_type = get_source_type_name(self.node, source_num)
 
-                filepaths = []
                 if source_type == 'file':
                     # Get filepaths for the pattern
                     filepaths = validate_files(
                         self.node, get_parm(self.node, 'filepath', source_num)
                     )
-                    self.delete_usd.extend([False] * len(filepaths))
+                    for filepath in filepaths:
+                        yield self.add_usd_info(filepath, source_num, source_type, False)
                 elif source_type == 'node':
                     # Prepare for and render the USD
                     usd_node = get_usd_node(self.node)
@@ -100,8 +131,8 @@ class TractorSubmit:
                         if get_parm_bool(self.node, 'layerenable', source_num, layer_num):
                             update_layer_nodes(self.node, source_num, layer_num)
                             
-                            filepaths.append(get_parm_str(usd_node, 'lopoutput'))
-                            self.delete_usd.append(get_parm_bool(self.node, 'deleteusd', source_num, layer_num))
+                            filepath = get_parm_str(usd_node, 'lopoutput')
+                            delete_usd = get_parm_bool(self.node, 'deleteusd', source_num, layer_num)
 
                             # Make sure the internal nodes recook
                             get_fetch_node(self.node).cook(force=True)
@@ -113,6 +144,8 @@ class TractorSubmit:
 
                             usd_node.parm('execute').pressButton()
 
+                            yield self.add_usd_info(filepath, source_num, source_type, delete_usd)
+
                 ## DEPRECATED, HERE FOR POSTERITY
                 # Create a lopimportcam node in /obj
                 # sop_cam_node = hou.node('/obj').createNode('lopimportcam')
@@ -126,36 +159,44 @@ class TractorSubmit:
                 # Destroy the lopimportcam node
                 # sop_cam_node.destroy()
 
-                for filepath in filepaths:
-                    # Add the file to the filepaths
-                    self.filepaths.append(filepath)
-
-                    # Get the frame range for the file
-                    frame_range = get_frame_range(self.node, source_num)
-                    self.frame_ranges.append(frame_range)
-
-                    # Get the output path overrides for file sources
-                    output_path_override = None
-                    resolution = None
-                    if source_type == 'file':
-                        if get_parm_bool(self.node, source_type + 'useoutputoverride' + str(source_num)):
-                            output_path_override = []
-                            hou.hscript(
-                                f"set -g FILE={os.path.splitext(os.path.basename(filepath))[0]}"
-                            )
-                            for frame in range(frame_range[0], frame_range[1] + 1):
-                                output_path_override.append(
-                                    self.node.parm(
-                                        source_type + "outputoverride" + str(source_num)
-                                    ).evalAtFrame(frame)
-                                )
-                    elif source_type == 'node':
-                        resolution = get_resolution(self.node, source_num)
-                    
-                    self.resolutions.append(resolution)
-                    self.output_path_overrides.append(output_path_override)
+    # Adds a USD's frame range, output path overrides, and resolution
+    def add_usd_info(self, filepath: str, source_num: int, source_type: str, delete_usd: bool) -> RenderFile:
+        # Add the file to the filepaths
+        self.filepaths.append(filepath)
+        self.delete_usd.append(delete_usd)
 
-        print(self.filepaths, self.frame_ranges, self.output_path_overrides)
+        # Get the frame range for the file
+        frame_range = get_frame_range(self.node, source_num)
+        self.frame_ranges.append(frame_range)
+
+        # Get the output path overrides for file sources
+        output_path_override = None
+        resolution = None
+        if source_type == 'file':
+            if get_parm_bool(self.node, source_type + 'useoutputoverride' + str(source_num)):
+                output_path_override = []
+                hou.hscript(
+                    f"set -g FILE={os.path.splitext(os.path.basename(filepath))[0]}"
+                )
+                for frame in range(frame_range[0], frame_range[1] + 1):
+                    output_path_override.append(
+                        self.node.parm(
+                            source_type + "outputoverride" + str(source_num)
+                        ).evalAtFrame(frame)
+                    )
+        elif source_type == 'node':
+            resolution = get_resolution(self.node, source_num)
+        
+        self.resolutions.append(resolution)
+        self.output_path_overrides.append(output_path_override)
+
+        return RenderFile(
+            path = filepath,
+            frame_range = frame_range,
+            output_path_overrides = output_path_override,
+            resolution = resolution,
+            delete_usd = delete_usd,
+        )
 
     # Gets the job priority from the node user interface
     def input_priority(self):
@@ -175,231 +216,56 @@ class TractorSubmit:
 
         self.job.service = blade_pattern
 
-    # Creates all tasks for each USD and adds them to the job
-    def add_tasks(self):
-        denoise = get_parm_bool(self.node, 'denoise')
-        playblast = get_parm_bool(self.node, 'createplayblasts')
-
-        # Create all tasks for each USD file
-        for file_num in range(0, len(self.filepaths)):
-            delete_usd = self.delete_usd[file_num]
-            frame_start, frame_end, frame_increment = self.frame_ranges[file_num]
-
-            usd_file_task = author.Task(
-                title=os.path.basename(self.filepaths[file_num]),
-                serialsubtasks=1,
-            )
-
-            # Create the cleanup commands if necessary
-            if delete_usd:
-                delete_usd_command = author.Command(argv=[
-                    "/bin/bash",
-                    "-c",
-                    f"/usr/bin/rm '{self.filepaths[file_num]}'",
-                ])
-                usd_file_task.addCommand(delete_usd_command)
-
-            # Open the USD file's stage
-            are_usdnc_errors = True
-            number_of_attempts = 0
-            while are_usdnc_errors and number_of_attempts < 20:
-                try:
-                    current_file_stage: Usd.Stage = Usd.Stage.Open(
-                        self.filepaths[file_num]
-                    )
-                    are_usdnc_errors = False
-                except pxr.Tf.ErrorException as e:
-                    exception_string = str(e)
-                    if ".usd" in exception_string:
-                        start_index = start_index = exception_string.find("@/") + 1 # include the first / sybmol
-                        end_index = exception_string.find(".usd") + 4
-                        file_path = exception_string[start_index:end_index]
-                        usdnc_file_path = file_path.replace('.usd', '.usdnc')
-
-                        print(f"Converting {file_path} to {usdnc_file_path}")
-                        try:
-                            number_of_attempts += 1
-                            subprocess.run(["usdcat", "-o", file_path, usdnc_file_path], check=True)
-                        except subprocess.CalledProcessError as e:
-                            print(e)
-                            raise e
-                    else:
-                        print(e)
-                        raise e
-                except Exception as e:
-                    print("An unexpected error occurred:", sys.exc_info()[0])
-                    raise e
-            
-            if number_of_attempts >= 20:
-                print("Failed to convert all USD files to USDNC after " + str(number_of_attempts) + " attempts")
-
-
-
-
-            output_path_attr = current_file_stage.GetAttributeAtPath(
-                "/Render/Products/renderproduct.productName"
-            )
-
-            # Get the resolution if necessary
-            if self.resolutions[file_num] != None:
-                resolution = self.resolutions[file_num]
-            else:
-                resolution = current_file_stage.GetAttributeAtPath(
-                    "/Render/Products/renderproduct.resolution"
-                ).Get(0)
-
-            # Create the output directory if necessary
-            if self.output_path_overrides[file_num] != None:
-                output_dir = os.path.dirname(self.output_path_overrides[file_num][0])
-            else:
-                output_dir = os.path.dirname(output_path_attr.Get(0))
-            
-            os.makedirs(output_dir, exist_ok=True)
-
-            # Create denoise-specific directories if necessary
-            aux_dir = os.path.join(output_dir, 'aux')
-            if denoise:
-                # Create the denoised directory if necessary
-                denoised_exr_dir = os.path.join(aux_dir, 'denoised')
-                os.makedirs(denoised_exr_dir, exist_ok=True)
-
-                # Create the undenoised directory if necessary
-                undenoised_exr_dir = os.path.join(aux_dir, 'undenoised')
-                os.makedirs(undenoised_exr_dir, exist_ok=True)
-            
-            # Create the cryptomatte directories if necessary
-            cryptomatte_path_attrs = [
-                attr for attr in
-                current_file_stage.GetPrimAtPath('/Render/rendersettings').GetAttributes()
-                if attr.GetName().endswith('PxrCryptomatte:filename')
-            ]
-            if len(cryptomatte_path_attrs) > 0:
-                for cryptomatte_attr in cryptomatte_path_attrs:
-                    cryptomatte_dir = os.path.dirname(cryptomatte_attr.Get(0))
-                    os.makedirs(cryptomatte_dir, exist_ok=True)
-            
-            # Create any necessary base tasks
-            render_task = author.Task(title='render')
-            usd_file_task.addChild(render_task)
-
-            if denoise:
-                denoise_task = author.Task(title='denoise')
-                render_task.addChild(denoise_task)
-
-            if playblast or len(cryptomatte_path_attrs) == 1:
-                post_task = author.Task(title='post')
-                usd_file_task.addChild(post_task)
-
-                if playblast:
-                    playblast_location = get_parm_str(self.node, 'playblast_location')
-
-                    if self.output_path_overrides[file_num] != None:
-                        frame_output_path = os.path.dirname(self.output_path_overrides[file_num][frame_start])
-                    else:
-                        frame_output_path = os.path.dirname(output_path_attr.Get(frame_start))
-
-                    playblast_command = [
-                        "/bin/bash", "-c",  # Using bash to process the inline command
-                        "export NUKE_PATH='/groups/accomplice/pipeline/pipe/accomplice/software/nuke/plugins' && " +
-                        "/opt/Nuke14.0v5/Nuke14.0 --nukex -t " +
-                        "/groups/accomplice/pipeline/pipe/accomplice/software/nuke/plugins/Auto_Beauty/run_autobeauty_headless.py " +
-                        frame_output_path + " " + playblast_location
-                    ]
-
-
-                    playblast_task = author.Task(title='playblast', argv=playblast_command)
-                    playblast_task.addChild(author.Instance(title=f"render"))
-                    post_task.addChild(playblast_task)
-
-            # Create the tasks for each frame
-            for frame in range(frame_start, frame_end + 1, frame_increment):
-                # Get the output path of the frame
-                frame_output_path = None
-                final_frame_path = None
-                if self.output_path_overrides[file_num] != None:
-                    frame_output_path = self.output_path_overrides[file_num][frame - frame_start]
-                else:
-                    frame_output_path = output_path_attr.Get(frame)
-                
-                final_frame_path = frame_output_path
-
-                if denoise:
-                    frame_output_path = os.path.join(undenoised_exr_dir, os.path.basename(frame_output_path))
-                
-                # Set the output path for the frame
-                output_path_attr.Set(frame_output_path, frame)
-                current_file_stage.Save()
-
-                # Create and add the render frame task
-                render_frame_task = create_render_frame_task(
-                    title = f"Frame {str(frame)} f{file_num}",
-                    usd_file = self.filepaths[file_num],
-                    frame = frame,
-                    frame_increment = frame_increment,
-                    renderer = get_parm_str(self.node, 'renderer'),
+    # Creates all tasks for each USD and adds them to the job. The USDs
+    # are the ones already gathered unless render_files is given.
+    # Returns how many USDs have frames to render.
+    def add_tasks(self, render_files: Optional[Iterable[RenderFile]] = None) -> int:
+        if render_files is None:
+            render_files = [
+                RenderFile(
+                    path = self.filepaths[file_num],
+                    frame_range = self.frame_ranges[file_num],
+                    output_path_overrides = self.output_path_overrides[file_num],
+                    resolution = self.resolutions[file_num],
+                    delete_usd = self.delete_usd[file_num],
                 )
-                render_task.addChild(render_frame_task)
-
-                # Create task to denoise the frame
-                if denoise:
-                    asymmetry = get_parm_float(self.node, "denoise_asymmetry")
-                    
-                    # Determine the crossframe-denoising frame range
-                    crossframe_start = max(frame_start, frame - (3 * frame_increment))
-                    crossframe_end = min(frame + (3 * frame_increment), frame_end)
-
-                    # Get the dependencies for the denoising task
-                    dependencies = []
-                    for crossframe in range(crossframe_start, crossframe_end + 1):
-                       dependencies.append(author.Instance(title=f"Frame {crossframe} f{file_num}"))
-
-                    # Create and add the denoise frame task
-                    denoise_frame_task = create_denoise_frame_task(
-                        title = f"Denoise Frame {str(frame)} f{file_num}",
-                        frame = frame,
-                        exr_path = frame_output_path,
-                        asymmetry = asymmetry,
-                        crossframe_range = (crossframe_start, crossframe_end),
-                        frame_increment = frame_increment,
-                        dependencies = dependencies,
-                    )
-                    denoise_task.addChild(denoise_frame_task)
-                
-                # Create post task to transfer the frame's cryptomattes
-                if len(cryptomatte_path_attrs) == 1:
-                    cryptomatte_path = cryptomatte_path_attrs[0].Get(frame)
-                
-                    # Get the dependencies for the cryptomatte transfer task
-                    dependency_title = f"Frame {str(frame)} f{file_num}"
-                    if denoise:
-                        dependency_title = "Denoise " + dependency_title
-                    dependencies = [author.Instance(title=dependency_title)]
-                    
-                    transfer_cryptomatte_task = create_cryptomatte_transfer_task(
-                        title = f"Cryptomatte Transfer Frame {str(frame)} f{file_num}",
-                        exr_path = final_frame_path,
-                        cryptomatte_path = cryptomatte_path,
-                        dependencies = dependencies,
-                    )
-                    post_task.addChild(transfer_cryptomatte_task)
-                    
+                for file_num in range(0, len(self.filepaths))
+            ]
+        options = JobOptions(
+            renderer = get_parm_str(self.node, 'renderer'),
+            denoise = get_parm_bool(self.node, 'denoise'),
+            denoise_asymmetry = get_parm_float(self.node, 'denoise_asymmetry'),
+            playblast = get_parm_bool(self.node, 'createplayblasts'),
+            playblast_location = get_parm_str(self.node, 'playblast_location'),
+            frames_per_task = int(get_optional_parm_value(self.node, 'framespertask', FRAMES_PER_TASK)),
+            chunking = str(get_optional_parm_value(self.node, 'chunking', CHUNKING)),
+            resume = self.resume,
+            denoise_frames_per_task = int(
+                get_optional_parm_value(self.node, 'denoiseframespertask', DENOISE_FRAMES_PER_TASK)
+            ),
+        )
 
-            # Add task to job
-            self.job.addChild(usd_file_task)
+        return add_tasks(self.job, render_files, options, max_workers=SUBMIT_WORKERS)
 
 
     # Calls all functions in this class required to gather parameter info, create, and spool the Tractor Job
     def spoolJob(self):
-        self.input_usd_info()
-        if len(self.filepaths) > 0:
-            self.input_priority()
-            self.input_blades()
-            self.add_tasks()
+        self.input_priority()
+        self.input_blades()
+        # Each USD is opened, converted, and inspected on a worker thread
+        # as soon as it's ready, while the next one is exported
+        num_file_tasks = self.add_tasks(self.iter_usd_info())
+        print(self.filepaths, self.frame_ranges, self.output_path_overrides)
+        if num_file_tasks > 0:
             # print(self.job.asTcl())
             self.job.spool()
             self.cleanup()
             if get_parm_bool(self.node, 'ui_notify_on_job_submission'):
                 hou.ui.displayMessage("Job sent to tractor")
+        elif len(self.filepaths) > 0:
+            # Resuming a job whose frames are all finished
+            self.cleanup()
+            hou.ui.displayMessage("Every frame is already rendered")
     
     def cleanup(self):
         fetch_node = get_fetch_node(self.node)
@@ -429,266 +295,6 @@ class TractorSubmit:
 #             )
 
 
-class DenoiseConfig(JsonSerializable):
-    primary: Sequence[str] = None
-    aux: set[str, Sequence[Mapping[str, Sequence[str]]]] = None
-    config: Mapping[str, Any] = None
-
-    def __init__(
-            self,
-            files: Sequence[str],
-            asymmetry: float = 0.0,
-            flow: bool = False,
-            debug: bool = False,
-            output_dir: str = None,
-            frame_include: int = None,
-            passes: Sequence[str] = ['diffuse', 'specular', 'alpha', 'albedo', 'irradiance'],
-            parameters: str = '/opt/pixar/RenderManProServer-25.2/lib/denoise/20970-renderman.param',
-            topology: str = '/opt/pixar/RenderManProServer-25.2/lib/denoise/full_w7_4sv2_sym_gen2.topo',
-        ) -> None:
-        self.primary = files
-        self.aux = {}
-        
-        for render_pass in passes:
-            if render_pass == 'diffuse' or render_pass == 'specular':
-                self.aux.update(
-                    {
-                        render_pass: [
-                            {
-                                'paths': files,
-                                'layers': ['directdiffuse', 'subsurface'] if render_pass == 'diffuse' else ['directspecular'],
-                            }
-                        ]
-                    }
-                )
-            else:
-                self.aux.update({render_pass: []})
-        
-        self.config = {
-            'asymmetry': asymmetry,
-            'flow': flow,
-            'debug': debug,
-            'output-dir': output_dir,
-            'frame-include': str(frame_include),
-            'passes': passes,
-            'parameters': parameters,
-            'topology': topology,
-        }
-
-
-def create_convert_frame_task(
-    title: str,
-    exr_path: str,
-    output_path: str,
-    dependencies: Iterable[author.Task],
-    channels: Sequence[str] = ['Ci.r', 'Ci.g', 'Ci.b', 'a'],
-):
-    convert_frame_command = [
-        "/bin/bash",
-        "-c",
-        "OCIO='/opt/pixar/RenderManProServer-25.2/lib/ocio/ACES-1.2/config.ocio' "
-        + "/opt/hfs19.5/bin/hoiiotool "
-        + f"'{exr_path}' "
-        + f"--ch {','.join(channels)} "
-        + "--colorconvert linear 'Output - Rec.709' "
-        + "-o "
-        + f"'{output_path}'",
-    ]
-
-    # Create the convert frame task
-    convert_frame_task = author.Task(
-        title=title,
-        argv=convert_frame_command,
-    )
-
-    # Add dependencies
-    for dependency in dependencies:
-        convert_frame_task.addChild(dependency)
-
-    return convert_frame_task
-    
-
-def create_render_frame_task(
-        title: str,
-        usd_file: str,
-        frame: int,
-        frame_increment: int,
-        renderer: str,
-        output_path: str = None,
-    ) -> author.Task:
-    # Build render command from USD info
-    render_frame_command = [
-        "/bin/bash",
-        "-c",
-        "PIXAR_LICENSE_FILE='9010@animlic.cs.byu.edu' "
-        + "RMAN_SHADERPATH=/groups/accomplice/shading/hGeoPatterns/shaders "
-        + "RMAN_RIXPLUGINPATH=/groups/accomplice/shading/hGeoPatterns/rixplugins " 
-        + "/opt/hfs19.5/bin/husk --renderer "
-        + str(renderer)
-        + " --frame "
-        + str(frame)
-        + " --frame-inc "
-        + str(frame_increment)
-        + " --make-output-path -Vaet2",
-    ]
-
-    # NOTE: Setting the output path this way will prevent checkpointing
-    if output_path != None:
-        render_frame_command[-1] += f" --output '{str(output_path)}'"
-    
-    render_frame_command[-1] += f" '{usd_file}'"
-    # + " &> /tmp/test.log"
-    # renderCommand = ["/opt/hfs19.5/bin/husk", "--renderer", get_parm_str(self.node, "renderer"),
-    #                  "--frame", str(j), "--frame-count", "1", "--frame-inc", str(self.frame_ranges[i][2]), "--make-output-path"]
-
-    render_frame_task = author.Task(title=title)
-
-    # HACK: Make sure the blade is pointing to animlic
-    render_frame_command[2] = "/opt/hfs19.5/bin/hserver -S animlic.cs.byu.edu && " + render_frame_command[2]
-    
-    render_frame_task.newCommand(
-        argv = render_frame_command,
-        retryrc = [
-            -11,    # Segmentation fault
-            -9,     # Unknown
-            3,      # Can't get license
-            135,    # Bus error
-            139,    # Segmentation fault
-            222,    # Silent error
-            223,    # Silent error
-            255,    # Decompression failure
-            10111,  # Exceeded maximum time
-        ],
-        maxrunsecs = 1 * 60 * 60,
-    )
-    
-    return render_frame_task
-
-
-def create_aov_transfer_argv(src_exr_path: str, dest_exr_path: str) -> str:
-    return [
-        "/bin/bash",
-        "-exc",
-        """
-            src_exr_path='%(src_exr_path)s'
-            dest_exr_path='%(dest_exr_path)s'
-            
-            og_channels_commas=\"$(/opt/hfs19.5/bin/hoiiotool \"$src_exr_path\" --printinfo | /usr/bin/awk '/channel list/{ $1 = \"\"; $2 = \"\"; gsub(/^[ \\t]+/, \"\", $0); gsub(\" \", \"\", $0); print $0; exit }')\"
-            og_channels_newlines=\"$(/usr/bin/echo \"$og_channels_commas\" | /usr/bin/tr ',' '\\n')\"
-            
-            denoised_channels_commas=\"$(/opt/hfs19.5/bin/hoiiotool \"$dest_exr_path\" --printinfo | /usr/bin/awk '/channel list/{ $1 = \"\"; $2 = \"\"; gsub(/^[ \\t]+/, \"\", $0); gsub(\" \", \"\", $0); print $0; exit }')\"
-            denoised_channels_newlines=\"$(/usr/bin/echo \"$denoised_channels_commas\" | /usr/bin/tr ',' '\\n')\"
-            
-            shared_channels=\"$(comm -12 <(/usr/bin/echo \"$og_channels_newlines\" | /usr/bin/sort) <(/usr/bin/echo \"$denoised_channels_newlines\" | /usr/bin/tr [:upper:] [:lower:] | /usr/bin/sort))\"
-            transfer_channels_commas=\"$(/usr/bin/grep -vxf <(/usr/bin/echo -e \"$shared_channels\\nCi.r\\nCi.g\\nCi.b\") <(/usr/bin/echo \"$og_channels_newlines\") | /usr/bin/tr '\\n' ',')\"
-            
-            if [ ! -z \"$transfer_channels_commas\" ]; then
-                /opt/hfs19.5/bin/hoiiotool --metamerge \"$dest_exr_path\" --ch \"$denoised_channels_commas\" \"$src_exr_path\" --ch \"$transfer_channels_commas\" --chappend -o \"$dest_exr_path\"
-            fi
-        """ % {'src_exr_path':src_exr_path, 'dest_exr_path':dest_exr_path},
-    ]
-
-def create_cryptomatte_transfer_task(
-        title: str,
-        exr_path: str,
-        cryptomatte_path: str,
-        dependencies: Iterable[author.Task]
-    ) -> author.Task:
-    cryptomatte_transfer_task = author.Task(
-        title = title,
-        argv = create_aov_transfer_argv(cryptomatte_path, exr_path)
-    )
-    
-    # Add dependencies for cryptomatte transfer
-    for dependency in dependencies:
-        cryptomatte_transfer_task.addChild(dependency)
-    
-    return cryptomatte_transfer_task
-    
-
-def create_denoise_frame_task(
-        title: str,
-        frame: int,
-        exr_path: str,
-        asymmetry: int,
-        crossframe_range: tuple,
-        frame_increment: int,
-        dependencies: Iterable[author.Task],
-    ) -> author.Task:
-    crossframe_start, crossframe_end = crossframe_range
-
-    denoise_frame_task = author.Task(title=title)
-    
-    aux_dir = os.path.join(os.path.dirname(exr_path), os.path.pardir)
-    output_dir = os.path.join(aux_dir, 'denoised')
-    
-    final_exr_path = os.path.join(aux_dir, os.path.pardir, os.path.basename(exr_path))
-    denoised_exr_path = os.path.join(output_dir, os.path.basename(exr_path))
-
-    # denoise_command_argv = [
-    #     "/bin/bash",
-    #     "-c",
-    #     "PIXAR_LICENSE_FILE='9010@animlic.cs.byu.edu' "
-    #     + "/opt/pixar/RenderManProServer-25.2/bin/denoise_batch "
-    #     + f"--asymmetry {asymmetry} "
-    #     + "--crossframe "
-    #     + f"--frame-include {int((frame - crossframe_start) / frame_increment)} "
-    #     + re.sub(r'\.\d{4}\.', '.####.', exr_path) + f" {crossframe_start}-{crossframe_end} "
-    #     + f"--output {os.path.join(frame_dir, 'denoised')} "
-    #     + "&& "
-    #     + "/usr/bin/test "
-    #     + "-f "
-    #     + denoised_exr_path
-    # ]
-
-    frame_paths = [re.sub(r'\.\d{4}\.', f'.{frame_num:>04}.', exr_path) for frame_num in range(crossframe_start, crossframe_end + 1, frame_increment)]
-
-    frame_conf = DenoiseConfig(
-        files = frame_paths,
-        asymmetry = asymmetry,
-        output_dir = output_dir,
-        frame_include = int((frame - crossframe_start) / frame_increment),
-        passes = ['diffuse', 'specular', 'alpha', 'albedo'],
-    ).to_json()
-    config_path = os.path.join(output_dir, f"config.{frame:>04}.json")
-
-    # Create the denoising config file
-    denoise_frame_task.newCommand(argv=[
-        "/bin/bash",
-        "-c",
-        f"/usr/bin/echo "
-        + f"'{frame_conf}' "
-        + "> "
-        + f"'{config_path}' "
-        + "&& "
-        + "/usr/bin/test "
-        + "-f "
-        + f"'{config_path}'"
-    ])
-
-    # Denoise the frame (and verify that it was)
-    denoise_frame_task.newCommand(argv=[
-        "/bin/bash",
-        "-c",
-        "PIXAR_LICENSE_FILE='9010@animlic.cs.byu.edu' "
-        + "/opt/pixar/RenderManProServer-25.2/bin/denoise_batch "
-        + "-j "
-        + f"'{config_path}'"
-    ])
-
-    # Transfer unique AOVs from the original frame to the denoised frame
-    denoise_frame_task.newCommand(argv=create_aov_transfer_argv(exr_path, denoised_exr_path))
-
-    # Move the denoised frame file to the final location
-    denoise_frame_task.newCommand(argv=[f"/usr/bin/mv", denoised_exr_path, final_exr_path])
-
-    # Add dependencies for denoising
-    for dependency in dependencies:
-        denoise_frame_task.addChild(dependency)
-    
-    return denoise_frame_task
-
-
 SOURCE_TYPES = [
         'file',
         'node',
@@ -1477,6 +1083,12 @@ def get_parm_str(
     return parm.evalAsString()
 
 
+def get_optional_parm_value(node: hou.Node, parm_name: str, default: Any) -> Any:
+    # For parms older versions of the node don't have
+    parm = node.parm(parm_name)
+    return default if parm is None else parm.eval()
+
+
 def source_is_enabled(node: hou.Node, source_num: int) -> bool:
     return get_parm_bool(node, 'fileenable', source_num)
 
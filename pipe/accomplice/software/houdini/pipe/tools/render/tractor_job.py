@@ -0,0 +1,982 @@
+"""Build Tractor jobs that render USD files.
+
+This is the part of the Tractor submitter that doesn't need Houdini: given
+the USD files to render and the job options, it authors each file's render
+outputs and adds its render, denoise and post tasks to a job. It only
+needs pxr and tractor.api.author, so it can be run (and tested) outside a
+DCC with usd-core.
+
+Each frame's output path is authored as a time sample on the render
+product's productName. All of a file's samples are authored in memory in
+a single change block, and the file is saved once, rather than once per
+frame.
+
+Preparing a file means opening its stage (converting the .usdnc layers
+it's missing), reading its render products and authoring its outputs.
+None of that needs the DCC, so add_tasks() can prepare several files at
+once on a pool of threads while the DCC exports the next one.
+
+Frames can be rendered several at a time, with one husk rendering a
+chunk of them so the stage is only loaded once per chunk, and denoised
+in windows of consecutive frames, with one denoise_batch reading each
+window and the frames around it once. The denoise and post tasks still
+wait on the frames they need, through the tasks that make them.
+
+When resuming a job, the frames that are already finished are found by
+checking their EXRs, and only the tasks the rest still need are created.
+"""
+
+import os
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+import pxr
+from pxr import Sdf, Usd, UsdUtils
+import tractor.api.author as author
+
+from pipe.shared.object import JsonSerializable
+from pipe.tools.render.aov_transfer import get_transfer_channels
+from pipe.tools.render.render_outputs import SCAN_WORKERS, scan_exrs
+
+OUTPUT_PATH_ATTR = "/Render/Products/renderproduct.productName"
+RENDER_SETTINGS_PRIM = "/Render/rendersettings"
+
+# How many missing .usdnc files to convert before giving up on a stage,
+# for the ones the layer graph doesn't show
+MAX_USDNC_CONVERSIONS = 20
+
+# Files prepared at the same time can share the layers they're missing,
+# so each layer is only converted by one thread at a time
+_conversion_locks: Dict[str, threading.Lock] = {}
+_conversion_locks_lock = threading.Lock()
+
+# Copies AOVs between EXRs on the blades, which see the pipeline's copy of
+# it at the same path as the submitting workstation does
+AOV_TRANSFER_PYTHON = '/usr/bin/python3'
+AOV_TRANSFER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'aov_transfer.py')
+
+HUSK = '/opt/hfs19.5/bin/husk'
+HSERVER = '/opt/hfs19.5/bin/hserver'
+
+# How render tasks are split into chunks of frames
+CHUNK_FRAMES = 'frames'
+"""Every chunk has JobOptions.frames_per_task frames"""
+CHUNK_ADAPTIVE = 'adaptive'
+"""Chunks have as many frames as add up to about ADAPTIVE_CHUNK_COST, up
+to JobOptions.frames_per_task"""
+
+# Adaptive chunks aim to cost about as much as rendering this many 1080p
+# frames at RenderMan's default maximum samples
+ADAPTIVE_CHUNK_COST = 8 * 1920 * 1080 * 64
+DEFAULT_RESOLUTION = (1920, 1080)
+DEFAULT_MAX_SAMPLES = 64
+MAX_SAMPLES_ATTR = 'ri:hider:maxsamples'
+
+# The longest a render task can run for, per frame it renders
+MAX_RUN_SECS_PER_FRAME = 1 * 60 * 60
+
+# How many frames either side of a frame are read to denoise it
+DENOISE_CROSSFRAMES = 3
+
+
+class RenderFile(NamedTuple):
+    """A USD file to render, and how to render it."""
+
+    path: str
+    frame_range: Sequence[int]
+    """The start frame, end frame and frame increment"""
+    output_path_overrides: Optional[Sequence[str]] = None
+    """The output path of every frame from the start to the end frame, or
+    None to keep the ones in the file"""
+    resolution: Optional[Sequence[int]] = None
+    delete_usd: bool = False
+    """Whether to remove the file once it's rendered"""
+
+
+class JobOptions(NamedTuple):
+    """The options that apply to every file in a job."""
+
+    renderer: str
+    denoise: bool = False
+    denoise_asymmetry: float = 0.0
+    playblast: bool = False
+    playblast_location: str = ''
+    frames_per_task: int = 1
+    """How many frames each render task renders, or the most it renders
+    with adaptive chunking"""
+    chunking: str = CHUNK_FRAMES
+    """CHUNK_FRAMES or CHUNK_ADAPTIVE"""
+    resume: bool = False
+    """Whether to only create the tasks for frames that aren't finished"""
+    denoise_frames_per_task: int = 1
+    """How many consecutive frames each denoise task denoises"""
+
+
+class UnfinishedFrames(NamedTuple):
+    """The frames of a file that still need each step."""
+
+    render: Set[int]
+    denoise: Set[int]
+    transfer: Set[int]
+    """The frames whose cryptomattes need transferring"""
+
+
+def open_stage(usd_file: str) -> Usd.Stage:
+    """Open a USD file's stage, converting the .usdnc files it's missing.
+
+    Houdini Apprentice only saves .usdnc files, so layers that reference
+    a .usd file that only exists as .usdnc fail to open until it's
+    converted. The layers the file needs are found and converted up
+    front; any the layer graph doesn't show (e.g. ones found through
+    search paths) are converted when opening the stage fails on them.
+    """
+    get_usdnc_converter().convert_dependencies(usd_file)
+
+    number_of_attempts = 0
+    while True:
+        try:
+            return Usd.Stage.Open(usd_file)
+        except pxr.Tf.ErrorException as e:
+            exception_string = str(e)
+            if ".usd" not in exception_string or number_of_attempts >= MAX_USDNC_CONVERSIONS:
+                if number_of_attempts >= MAX_USDNC_CONVERSIONS:
+                    print(f"Failed to convert all USD files to USDNC after {number_of_attempts} attempts")
+                print(e)
+                raise e
+            start_index = exception_string.find("@/") + 1 # include the first / symbol
+            end_index = exception_string.find(".usd") + 4
+            file_path = exception_string[start_index:end_index]
+            usdnc_file_path = file_path.replace('.usd', '.usdnc')
+
+            number_of_attempts += 1
+            convert_usdnc(usdnc_file_path, file_path)
+        except Exception as e:
+            print("An unexpected error occurred:", sys.exc_info()[0])
+            raise e
+
+
+def get_usdnc_path(file_path: str) -> Optional[str]:
+    """Get the .usdnc a .usd file is converted from, or None if it isn't a .usd file."""
+    root, ext = os.path.splitext(file_path)
+    return root + '.usdnc' if ext == '.usd' else None
+
+
+def _is_converted(usdnc_file_path: str, file_path: str) -> bool:
+    try:
+        return os.stat(file_path).st_mtime_ns >= os.stat(usdnc_file_path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def needs_conversion(file_path: str) -> bool:
+    """Whether a .usd file is missing, or older than the .usdnc next to it."""
+    usdnc_file_path = get_usdnc_path(file_path)
+    return (
+        usdnc_file_path is not None
+        and os.path.exists(usdnc_file_path)
+        and not _is_converted(usdnc_file_path, file_path)
+    )
+
+
+def convert_usdnc(usdnc_file_path: str, file_path: str) -> None:
+    """Convert a .usdnc file to .usd, unless it already has been since the .usdnc changed."""
+    with _conversion_locks_lock:
+        lock = _conversion_locks.setdefault(file_path, threading.Lock())
+    with lock:
+        if _is_converted(usdnc_file_path, file_path):
+            return
+        print(f"Converting {file_path} to {usdnc_file_path}")
+        try:
+            subprocess.run(["usdcat", "-o", file_path, usdnc_file_path], check=True)
+        except subprocess.CalledProcessError as e:
+            print(e)
+            raise e
+
+
+class UsdncConverter:
+    """Converts every .usdnc layer a USD file needs, before its stage is opened.
+
+    The layer graph (sublayers, references and payloads, including the
+    ones in variants) is walked without composing it, reading a layer's
+    .usdnc where its .usd still needs converting, and then all the
+    layers that need it are converted at once on a pool of threads.
+    """
+
+    LAYER_EXTENSIONS = ('.usd', '.usda', '.usdc', '.usdnc')
+    """The layers that are walked. Others, like .usdz packages and files
+    read through Houdini's file format plugins, can't need converting."""
+
+    def __init__(self, max_workers: int = None) -> None:
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        # The layers each layer depends on, keyed by the layer's path and
+        # checked against its modification time and size
+        self._dependencies: Dict[str, Tuple[Tuple[int, int], List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def _extract_references(self, layer_path: str) -> Iterable[str]:
+        sublayers, references, payloads = UsdUtils.ExtractExternalReferences(layer_path)
+        return sublayers + references + payloads
+
+    def get_dependencies(self, layer_path: str) -> List[str]:
+        """Get the absolute paths of the layers a layer sublayers, references or loads."""
+        try:
+            stat = os.stat(layer_path)
+        except FileNotFoundError:
+            return []
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._dependencies.get(layer_path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        try:
+            asset_paths = self._extract_references(layer_path)
+        except pxr.Tf.ErrorException as e:
+            # Opening the stage reports it properly
+            print(f"Couldn't read the layers {layer_path} depends on: {e}")
+            asset_paths = []
+
+        dependencies = []
+        for asset_path in asset_paths:
+            if os.path.splitext(asset_path)[1] not in self.LAYER_EXTENSIONS:
+                continue
+            # Relative paths are anchored to the layer. Search path ones
+            # that aren't next to it are left to the fallback.
+            dependencies.append(os.path.normpath(os.path.join(os.path.dirname(layer_path), asset_path)))
+
+        with self._lock:
+            self._dependencies[layer_path] = (key, dependencies)
+        return dependencies
+
+    def find_conversions(self, usd_file: str) -> Dict[str, str]:
+        """Find the layers a USD file needs converted. Returns their .usdnc path by .usd path."""
+        conversions = {}
+        visited = set()
+        queue = deque([os.path.abspath(usd_file)])
+        while queue:
+            file_path = queue.popleft()
+            if file_path in visited:
+                continue
+            visited.add(file_path)
+
+            layer_path = file_path
+            if needs_conversion(file_path):
+                layer_path = conversions[file_path] = get_usdnc_path(file_path)
+            queue.extend(self.get_dependencies(layer_path))
+        return conversions
+
+    def convert_dependencies(self, usd_file: str) -> List[str]:
+        """Convert the layers a USD file needs, in parallel. Returns the .usd files converted."""
+        conversions = self.find_conversions(usd_file)
+        if len(conversions) > 1 and self.max_workers > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='Usdcat') as executor:
+                for future in [
+                    executor.submit(convert_usdnc, usdnc_file_path, file_path)
+                    for file_path, usdnc_file_path in conversions.items()
+                ]:
+                    future.result()
+        else:
+            for file_path, usdnc_file_path in conversions.items():
+                convert_usdnc(usdnc_file_path, file_path)
+        return list(conversions)
+
+
+_usdnc_converter = None
+
+
+def get_usdnc_converter() -> UsdncConverter:
+    global _usdnc_converter
+    if _usdnc_converter is None:
+        _usdnc_converter = UsdncConverter()
+    return _usdnc_converter
+
+
+def set_time_samples(attr: Usd.Attribute, samples: Mapping[int, Any]) -> None:
+    """Author time samples on an attribute in its stage's edit target.
+
+    The samples are all authored in one change block, so the stage is
+    only recomposed once, however many there are.
+    """
+    if not samples:
+        return
+
+    layer = attr.GetStage().GetEditTarget().GetLayer()
+    path = attr.GetPath()
+    if layer.GetAttributeAtPath(path) is None:
+        # Let Usd create the overs the layer needs to hold the attribute
+        frame, value = next(iter(samples.items()))
+        attr.Set(value, frame)
+
+    with Sdf.ChangeBlock():
+        for frame, value in samples.items():
+            layer.SetTimeSample(path, frame, value)
+
+
+def estimate_frame_cost(stage: Usd.Stage, resolution: Optional[Sequence[int]] = None) -> int:
+    """Estimate how expensive a frame of a stage is to render, in pixel samples.
+
+    Keyword arguments:
+    stage -- the stage to render
+    resolution -- the resolution it's rendered at (default: the render
+                  product's, or else the render settings')
+    """
+    settings = stage.GetPrimAtPath(RENDER_SETTINGS_PRIM)
+    if resolution is None:
+        for prim in (stage.GetPrimAtPath(OUTPUT_PATH_ATTR.split('.')[0]), settings):
+            resolution_attr = prim.GetAttribute('resolution') if prim else None
+            if resolution_attr and resolution_attr.HasAuthoredValue():
+                resolution = resolution_attr.Get()
+                break
+        else:
+            resolution = DEFAULT_RESOLUTION
+
+    max_samples = DEFAULT_MAX_SAMPLES
+    max_samples_attr = settings.GetAttribute(MAX_SAMPLES_ATTR) if settings else None
+    if max_samples_attr and max_samples_attr.HasAuthoredValue():
+        max_samples = max_samples_attr.Get()
+
+    return int(resolution[0]) * int(resolution[1]) * int(max_samples)
+
+
+def get_frames_per_task(stage: Usd.Stage, render_file: RenderFile, options: JobOptions) -> int:
+    """Get how many frames each of a file's render tasks should render."""
+    frames_per_task = max(1, options.frames_per_task)
+    if options.chunking == CHUNK_ADAPTIVE:
+        frame_cost = max(1, estimate_frame_cost(stage, render_file.resolution))
+        frames_per_task = min(frames_per_task, max(1, round(ADAPTIVE_CHUNK_COST / frame_cost)))
+    return frames_per_task
+
+
+def find_unfinished_frames(
+        frames: Sequence[int],
+        frame_output_paths: Mapping[int, str],
+        final_frame_paths: Mapping[int, str],
+        cryptomatte_paths: Mapping[int, str],
+        denoise: bool,
+        max_workers: int = SCAN_WORKERS,
+    ) -> UnfinishedFrames:
+    """Find the frames that still need rendering, denoising or their cryptomattes transferred.
+
+    A frame is finished when its final EXR is complete and, if it has
+    cryptomattes, its cryptomatte EXR is complete and its channels are
+    already in the final EXR. Otherwise, it's rendered again
+    unless the EXRs it renders are complete, and denoised again unless
+    it's rendered again or its final EXR is complete. Every EXR is
+    checked on a pool of threads.
+
+    Keyword arguments:
+    frames -- the frames to check
+    frame_output_paths -- the path each frame renders to
+    final_frame_paths -- the path each frame ends up at, which is the
+                         path it renders to unless it's denoised
+    cryptomatte_paths -- the path each frame's cryptomattes render to,
+                         for files with cryptomattes
+    denoise -- whether the frames are denoised
+    max_workers -- how many EXRs to check at once
+    """
+    headers = scan_exrs(
+        [frame_output_paths[frame] for frame in frames]
+        + [final_frame_paths[frame] for frame in frames]
+        + [cryptomatte_paths[frame] for frame in frames if frame in cryptomatte_paths],
+        max_workers,
+    )
+
+    unfinished = UnfinishedFrames(set(), set(), set())
+    for frame in frames:
+        final = headers[final_frame_paths[frame]]
+        cryptomatte = headers.get(cryptomatte_paths.get(frame))
+        if final is not None and (
+            frame not in cryptomatte_paths
+            or cryptomatte is not None and not get_transfer_channels(cryptomatte.channels, final.channels)
+        ):
+            continue
+
+        rendered = headers[frame_output_paths[frame]] is not None and (
+            frame not in cryptomatte_paths or cryptomatte is not None
+        )
+        if not rendered:
+            unfinished.render.add(frame)
+        if denoise and (not rendered or final is None):
+            unfinished.denoise.add(frame)
+        if frame in cryptomatte_paths:
+            unfinished.transfer.add(frame)
+    return unfinished
+
+
+def get_chunks(frames: range, frames_to_render: Set[int], frames_per_task: int) -> List[range]:
+    """Split the frames to render into runs of consecutive frames, at most frames_per_task long."""
+    chunks = []
+    chunk = []
+    for frame in frames:
+        if frame in frames_to_render:
+            chunk.append(frame)
+        if chunk and (frame not in frames_to_render or len(chunk) == frames_per_task):
+            chunks.append(range(chunk[0], chunk[-1] + frames.step, frames.step))
+            chunk = []
+    if chunk:
+        chunks.append(range(chunk[0], chunk[-1] + frames.step, frames.step))
+    return chunks
+
+
+def add_tasks(
+    job: author.Job,
+    render_files: Iterable[RenderFile],
+    options: JobOptions,
+    max_workers: int = 1,
+) -> int:
+    """Create all tasks for each USD file and add them to the job. Returns how many files need rendering.
+
+    When resuming, files whose frames are all finished are left out.
+
+    Keyword arguments:
+    job -- the job to add the tasks to
+    render_files -- the files to render
+    options -- the options for the job
+    max_workers -- how many files to prepare at once. With more than one,
+                   each file is opened, converted, and inspected on a pool
+                   of threads as soon as render_files yields it, so a
+                   generator can export the next file in the meantime.
+                   The tasks are added in the files' order either way.
+    """
+    if max_workers <= 1:
+        file_tasks = [
+            create_file_task(render_file, file_num, options)
+            for file_num, render_file in enumerate(render_files)
+        ]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='TractorSubmit') as executor:
+            futures = [
+                executor.submit(create_file_task, render_file, file_num, options)
+                for file_num, render_file in enumerate(render_files)
+            ]
+            file_tasks = [future.result() for future in futures]
+
+    file_tasks = [file_task for file_task in file_tasks if file_task is not None]
+    for file_task in file_tasks:
+        job.addChild(file_task)
+    return len(file_tasks)
+
+
+def create_file_task(render_file: RenderFile, file_num: int, options: JobOptions) -> Optional[author.Task]:
+    """Author a USD file's render outputs and create the tasks to render it.
+
+    Returns None if the job is resuming and every frame is finished.
+
+    Keyword arguments:
+    render_file -- the file to render
+    file_num -- the file's index in the job, used to keep task titles unique
+    options -- the options for the job
+    """
+    frame_start, frame_end, frame_increment = render_file.frame_range
+    denoise = options.denoise
+
+    usd_file_task = author.Task(
+        title=os.path.basename(render_file.path),
+        serialsubtasks=1,
+    )
+
+    # Create the cleanup commands if necessary
+    if render_file.delete_usd:
+        delete_usd_command = author.Command(argv=[
+            "/bin/bash",
+            "-c",
+            f"/usr/bin/rm '{render_file.path}'",
+        ])
+        usd_file_task.addCommand(delete_usd_command)
+
+    current_file_stage = open_stage(render_file.path)
+    output_path_attr = current_file_stage.GetAttributeAtPath(OUTPUT_PATH_ATTR)
+
+    # Get the output path of each frame
+    frames = range(frame_start, frame_end + 1, frame_increment)
+    if render_file.output_path_overrides is not None:
+        final_frame_paths = {
+            frame: render_file.output_path_overrides[frame - frame_start] for frame in frames
+        }
+        output_dir = os.path.dirname(render_file.output_path_overrides[0])
+    else:
+        final_frame_paths = {frame: output_path_attr.Get(frame) for frame in frames}
+        output_dir = os.path.dirname(output_path_attr.Get(0))
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Create denoise-specific directories if necessary
+    aux_dir = os.path.join(output_dir, 'aux')
+    if denoise:
+        # Create the denoised directory if necessary
+        denoised_exr_dir = os.path.join(aux_dir, 'denoised')
+        os.makedirs(denoised_exr_dir, exist_ok=True)
+
+        # Create the undenoised directory if necessary
+        undenoised_exr_dir = os.path.join(aux_dir, 'undenoised')
+        os.makedirs(undenoised_exr_dir, exist_ok=True)
+
+        # Frames are rendered undenoised, then denoised to the final path
+        frame_output_paths = {
+            frame: os.path.join(undenoised_exr_dir, os.path.basename(path))
+            for frame, path in final_frame_paths.items()
+        }
+    else:
+        frame_output_paths = final_frame_paths
+
+    # Create the cryptomatte directories if necessary
+    cryptomatte_path_attrs = [
+        attr for attr in
+        current_file_stage.GetPrimAtPath(RENDER_SETTINGS_PRIM).GetAttributes()
+        if attr.GetName().endswith('PxrCryptomatte:filename')
+    ]
+    for cryptomatte_attr in cryptomatte_path_attrs:
+        cryptomatte_dir = os.path.dirname(cryptomatte_attr.Get(0))
+        os.makedirs(cryptomatte_dir, exist_ok=True)
+
+    cryptomatte_paths = {}
+    if len(cryptomatte_path_attrs) == 1:
+        cryptomatte_paths = {frame: cryptomatte_path_attrs[0].Get(frame) for frame in frames}
+
+    # Set the output path for every frame, and save the file once
+    set_time_samples(output_path_attr, frame_output_paths)
+    current_file_stage.Save()
+
+    # Find what's left to do for each frame
+    if options.resume:
+        unfinished = find_unfinished_frames(
+            frames, frame_output_paths, final_frame_paths, cryptomatte_paths, denoise
+        )
+        if not any(unfinished):
+            print(f"Every frame of {render_file.path} is already finished")
+            if render_file.delete_usd:
+                os.remove(render_file.path)
+            return None
+    else:
+        unfinished = UnfinishedFrames(
+            render = set(frames),
+            denoise = set(frames) if denoise else set(),
+            transfer = set(cryptomatte_paths),
+        )
+
+    # Create any necessary base tasks
+    render_task = author.Task(title='render')
+    usd_file_task.addChild(render_task)
+
+    if unfinished.denoise:
+        denoise_task = author.Task(title='denoise')
+        render_task.addChild(denoise_task)
+
+    if options.playblast or unfinished.transfer:
+        post_task = author.Task(title='post')
+        usd_file_task.addChild(post_task)
+
+        if options.playblast:
+            playblast_task = create_playblast_task(
+                frame_dir = os.path.dirname(final_frame_paths[frame_start]),
+                playblast_location = options.playblast_location,
+            )
+            post_task.addChild(playblast_task)
+
+    # Create the render tasks, rendering a chunk of frames each, and
+    # note which task renders each frame
+    frames_per_task = get_frames_per_task(current_file_stage, render_file, options)
+    submit_time = int(time.time())
+    render_task_titles = {}
+    for chunk in get_chunks(frames, unfinished.render, frames_per_task):
+        if len(chunk) == 1:
+            render_frame_task = create_render_frame_task(
+                title = f"Frame {str(chunk[0])} f{file_num}",
+                usd_file = render_file.path,
+                frame = chunk[0],
+                frame_increment = frame_increment,
+                renderer = options.renderer,
+            )
+        else:
+            render_frame_task = create_render_chunk_task(
+                title = f"Frames {chunk[0]}-{chunk[-1]} f{file_num}",
+                usd_file = render_file.path,
+                frames = chunk,
+                renderer = options.renderer,
+                output_paths = [frame_output_paths[frame] for frame in chunk],
+                submit_time = submit_time,
+            )
+        render_task.addChild(render_frame_task)
+        for frame in chunk:
+            render_task_titles[frame] = render_frame_task.title
+
+    # Create the denoise tasks, denoising a window of frames each, and
+    # note which task denoises each frame
+    denoise_task_titles = {}
+    for window in get_chunks(frames, unfinished.denoise, max(1, options.denoise_frames_per_task)):
+        # Determine the crossframe-denoising frame range
+        crossframe_start = max(frame_start, window[0] - (DENOISE_CROSSFRAMES * frame_increment))
+        crossframe_end = min(window[-1] + (DENOISE_CROSSFRAMES * frame_increment), frame_end)
+        crossframes = range(crossframe_start, crossframe_end + 1, frame_increment)
+
+        # Get the dependencies for the denoising task, waiting on each
+        # chunk that renders one of the frames once
+        dependency_titles = dict.fromkeys(
+            render_task_titles[crossframe] for crossframe in crossframes if crossframe in render_task_titles
+        )
+        dependencies = [author.Instance(title=title) for title in dependency_titles]
+
+        # Create and add the denoise task
+        if len(window) == 1:
+            title = f"Denoise Frame {str(window[0])} f{file_num}"
+        else:
+            title = f"Denoise Frames {window[0]}-{window[-1]} f{file_num}"
+        denoise_window_task = create_denoise_task(
+            title = title,
+            frames = window,
+            crossframe_range = (crossframe_start, crossframe_end),
+            exr_paths = frame_output_paths,
+            final_exr_paths = final_frame_paths,
+            asymmetry = options.denoise_asymmetry,
+            dependencies = dependencies,
+        )
+        denoise_task.addChild(denoise_window_task)
+        for frame in window:
+            denoise_task_titles[frame] = title
+
+    # Create the post tasks for each frame
+    for frame in frames:
+        # Create post task to transfer the frame's cryptomattes
+        if frame in unfinished.transfer:
+            # Get the dependencies for the cryptomatte transfer task
+            dependencies = []
+            if frame in denoise_task_titles:
+                dependencies.append(author.Instance(title=denoise_task_titles[frame]))
+            elif frame in render_task_titles:
+                dependencies.append(author.Instance(title=render_task_titles[frame]))
+
+            transfer_cryptomatte_task = create_cryptomatte_transfer_task(
+                title = f"Cryptomatte Transfer Frame {str(frame)} f{file_num}",
+                exr_path = final_frame_paths[frame],
+                cryptomatte_path = cryptomatte_paths[frame],
+                dependencies = dependencies,
+            )
+            post_task.addChild(transfer_cryptomatte_task)
+
+    return usd_file_task
+
+
+class DenoiseConfig(JsonSerializable):
+    primary: Sequence[str] = None
+    aux: set[str, Sequence[Mapping[str, Sequence[str]]]] = None
+    config: Mapping[str, Any] = None
+
+    def __init__(
+            self,
+            files: Sequence[str],
+            asymmetry: float = 0.0,
+            flow: bool = False,
+            debug: bool = False,
+            output_dir: str = None,
+            frame_include: Union[int, str] = None,
+            passes: Sequence[str] = ['diffuse', 'specular', 'alpha', 'albedo', 'irradiance'],
+            parameters: str = '/opt/pixar/RenderManProServer-25.2/lib/denoise/20970-renderman.param',
+            topology: str = '/opt/pixar/RenderManProServer-25.2/lib/denoise/full_w7_4sv2_sym_gen2.topo',
+        ) -> None:
+        self.primary = files
+        self.aux = {}
+
+        for render_pass in passes:
+            if render_pass == 'diffuse' or render_pass == 'specular':
+                self.aux.update(
+                    {
+                        render_pass: [
+                            {
+                                'paths': files,
+                                'layers': ['directdiffuse', 'subsurface'] if render_pass == 'diffuse' else ['directspecular'],
+                            }
+                        ]
+                    }
+                )
+            else:
+                self.aux.update({render_pass: []})
+
+        self.config = {
+            'asymmetry': asymmetry,
+            'flow': flow,
+            'debug': debug,
+            'output-dir': output_dir,
+            'frame-include': str(frame_include),
+            'passes': passes,
+            'parameters': parameters,
+            'topology': topology,
+        }
+
+
+def create_playblast_task(frame_dir: str, playblast_location: str) -> author.Task:
+    playblast_command = [
+        "/bin/bash", "-c",  # Using bash to process the inline command
+        "export NUKE_PATH='/groups/accomplice/pipeline/pipe/accomplice/software/nuke/plugins' && " +
+        "/opt/Nuke14.0v5/Nuke14.0 --nukex -t " +
+        "/groups/accomplice/pipeline/pipe/accomplice/software/nuke/plugins/Auto_Beauty/run_autobeauty_headless.py " +
+        frame_dir + " " + playblast_location
+    ]
+
+    playblast_task = author.Task(title='playblast', argv=playblast_command)
+    playblast_task.addChild(author.Instance(title=f"render"))
+
+    return playblast_task
+
+
+def create_convert_frame_task(
+    title: str,
+    exr_path: str,
+    output_path: str,
+    dependencies: Iterable[author.Task],
+    channels: Sequence[str] = ['Ci.r', 'Ci.g', 'Ci.b', 'a'],
+):
+    convert_frame_command = [
+        "/bin/bash",
+        "-c",
+        "OCIO='/opt/pixar/RenderManProServer-25.2/lib/ocio/ACES-1.2/config.ocio' "
+        + "/opt/hfs19.5/bin/hoiiotool "
+        + f"'{exr_path}' "
+        + f"--ch {','.join(channels)} "
+        + "--colorconvert linear 'Output - Rec.709' "
+        + "-o "
+        + f"'{output_path}'",
+    ]
+
+    # Create the convert frame task
+    convert_frame_task = author.Task(
+        title=title,
+        argv=convert_frame_command,
+    )
+
+    # Add dependencies
+    for dependency in dependencies:
+        convert_frame_task.addChild(dependency)
+
+    return convert_frame_task
+
+
+# Tractor retries a render task when it exits with one of these
+RENDER_RETRY_CODES = [
+    -11,    # Segmentation fault
+    -9,     # Unknown
+    3,      # Can't get license
+    135,    # Bus error
+    139,    # Segmentation fault
+    222,    # Silent error
+    223,    # Silent error
+    255,    # Decompression failure
+    10111,  # Exceeded maximum time
+]
+
+
+def _husk_command(renderer: str) -> str:
+    return (
+        "PIXAR_LICENSE_FILE='9010@animlic.cs.byu.edu' "
+        + "RMAN_SHADERPATH=/groups/accomplice/shading/hGeoPatterns/shaders "
+        + "RMAN_RIXPLUGINPATH=/groups/accomplice/shading/hGeoPatterns/rixplugins "
+        + f"{HUSK} --renderer "
+        + str(renderer)
+    )
+
+
+def create_render_frame_task(
+        title: str,
+        usd_file: str,
+        frame: int,
+        frame_increment: int,
+        renderer: str,
+        output_path: str = None,
+    ) -> author.Task:
+    # Build render command from USD info
+    render_frame_command = [
+        "/bin/bash",
+        "-c",
+        _husk_command(renderer)
+        + " --frame "
+        + str(frame)
+        + " --frame-inc "
+        + str(frame_increment)
+        + " --make-output-path -Vaet2",
+    ]
+
+    # NOTE: Setting the output path this way will prevent checkpointing
+    if output_path != None:
+        render_frame_command[-1] += f" --output '{str(output_path)}'"
+
+    render_frame_command[-1] += f" '{usd_file}'"
+    # + " &> /tmp/test.log"
+    # renderCommand = ["/opt/hfs19.5/bin/husk", "--renderer", get_parm_str(self.node, "renderer"),
+    #                  "--frame", str(j), "--frame-count", "1", "--frame-inc", str(self.frame_ranges[i][2]), "--make-output-path"]
+
+    render_frame_task = author.Task(title=title)
+
+    # HACK: Make sure the blade is pointing to animlic
+    render_frame_command[2] = f"{HSERVER} -S animlic.cs.byu.edu && " + render_frame_command[2]
+
+    render_frame_task.newCommand(
+        argv = render_frame_command,
+        retryrc = RENDER_RETRY_CODES,
+        maxrunsecs = MAX_RUN_SECS_PER_FRAME,
+    )
+
+    return render_frame_task
+
+
+def create_render_chunk_task(
+        title: str,
+        usd_file: str,
+        frames: range,
+        renderer: str,
+        output_paths: Sequence[str],
+        submit_time: int,
+    ) -> author.Task:
+    """Create a task that renders a chunk of frames with one husk.
+
+    When Tractor retries the task, it resumes from the first frame that
+    hasn't been rendered since the job was submitted, rendering the last
+    one that has again in case it was cut off partway through. Frames
+    rendered before the job was submitted are always rendered again.
+
+    Keyword arguments:
+    title -- the task's title
+    usd_file -- the USD file to render
+    frames -- the frames to render, with their increment
+    renderer -- the Hydra delegate to render with
+    output_paths -- the path each frame renders to
+    submit_time -- when the job was submitted, in seconds since the epoch
+    """
+    outputs = ' '.join(shlex.quote(path) for path in output_paths)
+    render_chunk_command = [
+        "/bin/bash",
+        "-c",
+        # HACK: Make sure the blade is pointing to animlic
+        f"{HSERVER} -S animlic.cs.byu.edu || exit $?\n"
+        + f"outputs=({outputs})\n"
+        + "first=0\n"
+        + f"while [ $first -lt ${{#outputs[@]}} ] && [ -f \"${{outputs[$first]}}\" ] "
+        + f"&& [ $(/usr/bin/stat -c %Y \"${{outputs[$first]}}\") -ge {submit_time} ]; do\n"
+        + "    first=$((first + 1))\n"
+        + "done\n"
+        + "if [ $first -gt 0 ]; then\n"
+        + "    first=$((first - 1))\n"
+        + "fi\n"
+        + _husk_command(renderer)
+        + f" --frame $(({frames[0]} + first * {frames.step}))"
+        + " --frame-count $((${#outputs[@]} - first))"
+        + f" --frame-inc {frames.step}"
+        + " --make-output-path -Vaet2"
+        + f" {shlex.quote(usd_file)}",
+    ]
+
+    render_chunk_task = author.Task(title=title)
+    render_chunk_task.newCommand(
+        argv = render_chunk_command,
+        retryrc = RENDER_RETRY_CODES,
+        maxrunsecs = MAX_RUN_SECS_PER_FRAME * len(frames),
+    )
+
+    return render_chunk_task
+
+
+def create_aov_transfer_argv(src_exr_path: str, dest_exr_path: str) -> Sequence[str]:
+    return [AOV_TRANSFER_PYTHON, AOV_TRANSFER_SCRIPT, src_exr_path, dest_exr_path]
+
+
+def create_cryptomatte_transfer_task(
+        title: str,
+        exr_path: str,
+        cryptomatte_path: str,
+        dependencies: Iterable[author.Task]
+    ) -> author.Task:
+    cryptomatte_transfer_task = author.Task(
+        title = title,
+        argv = create_aov_transfer_argv(cryptomatte_path, exr_path)
+    )
+
+    # Add dependencies for cryptomatte transfer
+    for dependency in dependencies:
+        cryptomatte_transfer_task.addChild(dependency)
+
+    return cryptomatte_transfer_task
+
+
+def create_denoise_task(
+        title: str,
+        frames: range,
+        crossframe_range: Tuple[int, int],
+        exr_paths: Mapping[int, str],
+        final_exr_paths: Mapping[int, str],
+        asymmetry: float,
+        dependencies: Iterable[author.Task],
+    ) -> author.Task:
+    """Create a task that denoises a window of consecutive frames with one denoise_batch.
+
+    The frames either side of the window, out to the crossframe range,
+    are read for context but not denoised, so each frame is only read
+    once per window rather than once per frame it's near. The task's
+    config is written now, with the denoised frames.
+
+    Keyword arguments:
+    title -- the task's title
+    frames -- the frames to denoise, with their increment
+    crossframe_range -- the first and last frames to read
+    exr_paths -- the undenoised path of every frame in the crossframe range
+    final_exr_paths -- the path each denoised frame is moved to
+    asymmetry -- the denoiser's asymmetry
+    dependencies -- the tasks that render the frames in the crossframe range
+    """
+    crossframe_start, crossframe_end = crossframe_range
+    crossframes = range(crossframe_start, crossframe_end + 1, frames.step)
+
+    denoise_task = author.Task(title=title)
+
+    output_dir = os.path.normpath(os.path.join(os.path.dirname(exr_paths[frames[0]]), os.path.pardir, 'denoised'))
+
+    # The frames to denoise, as indices into the frames read
+    first_index = crossframes.index(frames[0])
+    last_index = crossframes.index(frames[-1])
+    if len(frames) == 1:
+        frame_include = first_index
+        config_path = os.path.join(output_dir, f"config.{frames[0]:>04}.json")
+    else:
+        frame_include = f"{first_index}-{last_index}"
+        config_path = os.path.join(output_dir, f"config.{frames[0]:>04}-{frames[-1]:>04}.json")
+
+    # Write the denoising config file
+    frame_conf = DenoiseConfig(
+        files = [exr_paths[frame] for frame in crossframes],
+        asymmetry = asymmetry,
+        output_dir = output_dir,
+        frame_include = frame_include,
+        passes = ['diffuse', 'specular', 'alpha', 'albedo'],
+    ).to_json()
+    with open(config_path, 'w') as config_file:
+        config_file.write(frame_conf)
+
+    # Denoise the frames
+    denoise_task.newCommand(argv=[
+        "/bin/bash",
+        "-c",
+        "PIXAR_LICENSE_FILE='9010@animlic.cs.byu.edu' "
+        + "/opt/pixar/RenderManProServer-25.2/bin/denoise_batch "
+        + "-j "
+        + f"'{config_path}'"
+    ])
+
+    for frame in frames:
+        exr_path = exr_paths[frame]
+        denoised_exr_path = os.path.join(output_dir, os.path.basename(exr_path))
+
+        # Transfer unique AOVs from the original frame to the denoised frame
+        denoise_task.newCommand(argv=create_aov_transfer_argv(exr_path, denoised_exr_path))
+
+        # Move the denoised frame file to the final location
+        denoise_task.newCommand(argv=[f"/usr/bin/mv", denoised_exr_path, final_exr_paths[frame]])
+
+    # Add dependencies for denoising
+    for dependency in dependencies:
+        denoise_task.addChild(dependency)
+
+    return denoise_task
@@ -70,7 +70,7 @@ class Character_Shaders(edit.EditShader):
         save_path = self.character.get_material_path()
         
         print(save_path)
-        version_path = vs.get_next_version(save_path)
+        version_path = vs.reserve_next_version(save_path)
         
         save_node.parm('lopoutput').set(version_path)
         save_node.parm('execute').pressButton()
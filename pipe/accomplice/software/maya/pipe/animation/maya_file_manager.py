@@ -26,14 +26,13 @@ class MayaFileManager:
         """
         Returns a list of the names of all Maya shots that have been created.
         """
-        import glob
         base_dir = "/groups/accomplice/pipeline/production/sequences" # TODO: Where's a better place to get this from?
 
         # Pattern to match all Maya files in the specified structure
         pattern = os.path.join(base_dir, "*", "shots", "*", "anim", "*_*.mb")
 
-        # Find all files that match the pattern
-        maya_files = list(glob.glob(pattern))
+        # Find all files that match the pattern, from the pipe's catalog
+        maya_files = pipe.server.glob(pattern)
 
         base_names = sorted([pathlib.Path(f).stem.replace('_anim', '') for f in maya_files])
         if ensure_shots_in_shotgrid:
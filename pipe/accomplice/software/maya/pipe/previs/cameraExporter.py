@@ -222,7 +222,7 @@ class CameraExporter:
         cmds.bakeResults(newCam, t=(self.startFrame, self.endFrame))
         cmds.delete(cn=1)
 
-        version_path = vs.get_next_version(self.usd_filepath)
+        version_path = vs.reserve_next_version(self.usd_filepath)
         try:
                 mel.eval('file -force -options ";exportUVs=0;exportSkels=none;exportSkin=none;'
                          + 'exportBlendShapes=0;exportDisplayColor=0;exportColorSets=0;'
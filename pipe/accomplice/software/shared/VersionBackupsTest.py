@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from . import version_backups
+from .version_backups import BackupStore, Codec, GzipCodec
+
+# Run test from the software directory with
+# python3 -m unittest shared.VersionBackupsTest
+# or in Studini with
+# from pipe.shared import VersionBackupsTest; VersionBackupsTest.run_tests()
+
+DAY = 24 * 60 * 60
+
+
+class BackupStoreTest(unittest.TestCase):
+    def setUp(self): # Runs before each test
+        self.root = tempfile.mkdtemp(prefix='accomplice_version_backups_')
+        self.addCleanup(shutil.rmtree, self.root)
+        self.main_path = os.path.join(self.root, 'shot.hipnc')
+        self.folder = os.path.join(self.root, '.backups', 'shot')
+
+    def make_store(self, **kwargs):
+        store = BackupStore(self.folder, 'shot.hipnc', **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def write(self, text):
+        with open(self.main_path, 'w') as f:
+            f.write(text)
+
+    def read(self):
+        with open(self.main_path) as f:
+            return f.read()
+
+    def back_up(self, store, text):
+        self.write(text)
+        return store.backup(self.main_path).result()
+
+    def age(self, backup, seconds):
+        timestamp = time.time() - seconds
+        os.utime(backup.path, (timestamp, timestamp))
+
+    def test_backup_and_restore(self):
+        store = self.make_store(codec=GzipCodec())
+        path = self.back_up(store, 'v0')
+        self.assertTrue(path.endswith('.gz'))
+        self.write('v1')
+
+        backups = store.list_backups()
+        self.assertEqual([backup.path for backup in backups], [path])
+        self.assertEqual(backups[0].codec, 'gzip')
+        store.restore(backups[0], self.main_path)
+        self.assertEqual(self.read(), 'v0')
+
+        # Nothing half-written is left behind
+        self.assertEqual(os.listdir(self.folder), [os.path.basename(path)])
+        self.assertEqual(sorted(os.listdir(self.root)), ['.backups', 'shot.hipnc'])
+
+    def test_restore_other_codec(self):
+        self.back_up(self.make_store(codec=Codec()), 'v0')
+        self.write('v1')
+        store = self.make_store(codec=GzipCodec())
+        store.restore(store.list_backups()[0], self.main_path)
+        self.assertEqual(self.read(), 'v0')
+
+    def test_backup_survives_source_changing(self):
+        store = self.make_store()
+        self.write('v0')
+        future = store.backup(self.main_path)
+        # Saving over the file, or removing it, right away doesn't change the backup
+        os.remove(self.main_path)
+        future.result()
+        store.restore(store.list_backups()[0], self.main_path)
+        self.assertEqual(self.read(), 'v0')
+
+    def test_keep_last(self):
+        store = self.make_store(keep_last=3)
+        paths = [self.back_up(store, f'v{save}') for save in range(5)]
+        store.wait()
+        self.assertEqual([backup.path for backup in store.list_backups()], paths[:1:-1])
+
+        # Backups are listed newest first
+        store.restore(store.list_backups()[0], self.main_path)
+        self.assertEqual(self.read(), 'v4')
+
+    def test_max_age(self):
+        store = self.make_store(max_age=DAY)
+        for save in range(3):
+            self.back_up(store, f'v{save}')
+        backups = store.list_backups()
+        self.age(backups[2], 2 * DAY)
+        self.assertEqual([backup.path for backup in store.prune()], [backups[2].path])
+        self.assertEqual([backup.path for backup in store.list_backups()], [backup.path for backup in backups[:2]])
+
+    def test_newest_is_always_kept(self):
+        store = self.make_store(max_age=DAY)
+        self.back_up(store, 'v0')
+        backup, = store.list_backups()
+        self.age(backup, 2 * DAY)
+        self.assertEqual(store.prune(), [])
+        self.assertEqual([b.path for b in store.list_backups()], [backup.path])
+
+    def test_abandoned_temporary_files(self):
+        store = self.make_store()
+        self.back_up(store, 'v0')
+        abandoned = os.path.join(self.folder, '.shot.hipnc.20240101T000000.000000000Z.gz.0123abcd.tmp')
+        in_progress = os.path.join(self.folder, '.shot.hipnc.20240101T000000.000000000Z.gz.4567cdef.tmp')
+        for path in (abandoned, in_progress):
+            with open(path, 'w') as f:
+                f.write('half')
+        timestamp = time.time() - version_backups._ABANDONED_AGE - 60
+        os.utime(abandoned, (timestamp, timestamp))
+
+        store.prune()
+        self.assertFalse(os.path.exists(abandoned))
+        self.assertTrue(os.path.exists(in_progress))
+        # Half-written backups are never listed
+        self.assertEqual(len(store.list_backups()), 1)
+
+
+def run_tests():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.TestLoader().loadTestsFromTestCase(BackupStoreTest))
+    runner = unittest.TextTestRunner(verbosity=3, failfast=True)
+    runner.run(tests)
+
+
+if __name__ == '__main__':
+    run_tests()
@@ -0,0 +1,145 @@
+import errno
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from . import version_storage
+from .version_storage import CopyStorage, VersionStorage
+
+# Run test from the software directory with
+# python3 -m unittest shared.VersionStorageTest
+# or in Studini with
+# from pipe.shared import VersionStorageTest; VersionStorageTest.run_tests()
+
+
+class StorageTestCase(unittest.TestCase):
+    def setUp(self): # Runs before each test
+        self.root = tempfile.mkdtemp(prefix='accomplice_version_storage_')
+        self.addCleanup(shutil.rmtree, self.root)
+        self.main_path = self.path('shot.hipnc')
+        self.write(self.main_path, 'v0')
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def assertNotShared(self, path, other):
+        self.assertFalse(os.path.samefile(path, other))
+        self.assertEqual(os.stat(path).st_nlink, 1)
+
+
+class CopyStorageTest(StorageTestCase):
+    def test_store_and_copy(self):
+        storage = CopyStorage()
+        self.assertEqual(storage.store(self.main_path, self.path('shot_v000.hipnc')), 'copy')
+        self.assertEqual(storage.copy(self.path('shot_v000.hipnc'), self.path('copy.hipnc')), 'copy')
+
+        self.write(self.main_path, 'v1')
+        self.assertEqual(self.read(self.path('shot_v000.hipnc')), 'v0')
+        self.assertEqual(self.read(self.path('copy.hipnc')), 'v0')
+        self.assertNotShared(self.path('shot_v000.hipnc'), self.main_path)
+        self.assertEqual(storage.collect_garbage(), 0)
+
+
+class VersionStorageTest(StorageTestCase):
+    def setUp(self): # Runs before each test
+        super().setUp()
+        self.blobs_folder = self.path('blobs')
+        self.storage = VersionStorage(self.blobs_folder)
+
+        # Use the hash store, whether or not this filesystem can clone
+        patcher = mock.patch.object(version_storage, '_clone', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def blobs(self):
+        return sorted(
+            os.path.join(prefix, blob)
+            for prefix in os.listdir(self.blobs_folder)
+            for blob in os.listdir(os.path.join(self.blobs_folder, prefix))
+        )
+
+    def test_identical_versions_share_a_blob(self):
+        self.assertEqual(self.storage.store(self.main_path, self.path('shot_v000.hipnc')), 'blob')
+        self.assertEqual(self.storage.store(self.main_path, self.path('shot_v001.hipnc')), 'link')
+        self.assertTrue(os.path.samefile(self.path('shot_v000.hipnc'), self.path('shot_v001.hipnc')))
+        self.assertEqual(len(self.blobs()), 1)
+
+        # The main file is never linked, so saving over it leaves the versions alone
+        self.assertNotShared(self.main_path, self.path('shot_v000.hipnc'))
+        self.write(self.main_path, 'v2')
+        self.assertEqual(self.storage.store(self.main_path, self.path('shot_v002.hipnc')), 'blob')
+        self.assertEqual(self.read(self.path('shot_v000.hipnc')), 'v0')
+        self.assertEqual(self.read(self.path('shot_v002.hipnc')), 'v2')
+        self.assertEqual(len(self.blobs()), 2)
+
+    def test_copy_is_not_shared(self):
+        self.storage.store(self.main_path, self.path('shot_v000.hipnc'))
+        self.assertIn(self.storage.copy(self.path('shot_v000.hipnc'), self.path('copy.hipnc')),
+                      ('copy_file_range', 'copy'))
+        self.assertNotShared(self.path('copy.hipnc'), self.path('shot_v000.hipnc'))
+        self.assertEqual(self.read(self.path('copy.hipnc')), 'v0')
+
+        with mock.patch.object(version_storage, '_copy_file_range', return_value=False):
+            self.assertEqual(self.storage.copy(self.main_path, self.path('copy.hipnc')), 'copy')
+        self.assertEqual(self.read(self.path('copy.hipnc')), 'v0')
+
+    def test_copies_where_it_cannot_link(self):
+        with mock.patch.object(os, 'link', side_effect=OSError(errno.EXDEV, 'Cross-device link')):
+            self.assertIn(self.storage.store(self.main_path, self.path('shot_v000.hipnc')),
+                          ('copy_file_range', 'copy'))
+        self.assertNotShared(self.path('shot_v000.hipnc'), self.main_path)
+        self.assertEqual(self.read(self.path('shot_v000.hipnc')), 'v0')
+
+    def test_restores_collected_blob(self):
+        self.storage.store(self.main_path, self.path('shot_v000.hipnc'))
+        blob = os.path.join(self.blobs_folder, self.blobs()[0])
+        # Another process collects the blob just before it's linked
+        link = os.link
+        links = []
+        def collect_then_link(src, dst):
+            if not links:
+                os.remove(blob)
+            links.append(dst)
+            return link(src, dst)
+        with mock.patch.object(os, 'link', side_effect=collect_then_link):
+            self.assertEqual(self.storage.store(self.main_path, self.path('shot_v001.hipnc')), 'blob')
+        self.assertEqual(len(links), 2)
+        self.assertEqual(self.read(self.path('shot_v001.hipnc')), 'v0')
+
+    def test_collect_garbage(self):
+        self.storage.store(self.main_path, self.path('shot_v000.hipnc'))
+        self.storage.store(self.main_path, self.path('shot_v001.hipnc'))
+        self.assertEqual(self.storage.collect_garbage(), 0)
+
+        os.remove(self.path('shot_v000.hipnc'))
+        self.assertEqual(self.storage.collect_garbage(), 0)
+        os.remove(self.path('shot_v001.hipnc'))
+        self.assertEqual(self.storage.collect_garbage(), 1)
+        self.assertEqual(self.blobs(), [])
+
+    def test_no_temporary_files_left(self):
+        self.storage.store(self.main_path, self.path('shot_v000.hipnc'))
+        self.storage.copy(self.main_path, self.path('copy.hipnc'))
+        self.assertEqual(sorted(os.listdir(self.root)), ['blobs', 'copy.hipnc', 'shot.hipnc', 'shot_v000.hipnc'])
+
+
+def run_tests():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.TestLoader().loadTestsFromTestCase(CopyStorageTest))
+    tests.addTest(unittest.TestLoader().loadTestsFromTestCase(VersionStorageTest))
+    runner = unittest.TextTestRunner(verbosity=3, failfast=True)
+    runner.run(tests)
+
+
+if __name__ == '__main__':
+    run_tests()
@@ -0,0 +1,223 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from . import versions
+from .version_backups import BackupStore
+from .versions import VersionCounter, VersionManager, VersionManifest
+
+# Run test from the software directory with
+# python3 -m unittest shared.VersionsTest
+# or in Studini with
+# from pipe.shared import VersionsTest; VersionsTest.run_tests()
+
+
+class VersionManifestTest(unittest.TestCase):
+    def setUp(self): # Runs before each test
+        self.root = tempfile.mkdtemp(prefix='accomplice_version_manifest_')
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, 'shot_version_notes.json')
+
+    def test_round_trip(self):
+        manifest = VersionManifest(self.path)
+        self.assertFalse(manifest.exists())
+        self.assertEqual(manifest.data, {})
+        with manifest.update() as notes:
+            notes['0'] = 'First version.'
+            notes['current_version'] = 0
+
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), {'0': 'First version.', 'current_version': 0})
+        self.assertEqual(VersionManifest(self.path).data['0'], 'First version.')
+
+    def test_sees_other_writers(self):
+        manifest = VersionManifest(self.path)
+        other = VersionManifest(self.path)
+        with manifest.update() as notes:
+            notes['current_version'] = 0
+        self.assertEqual(other.data['current_version'], 0)
+        with other.update() as notes:
+            notes['current_version'] = 1
+        self.assertEqual(manifest.data['current_version'], 1)
+
+    def test_no_lost_updates(self):
+        with VersionManifest(self.path).update() as notes:
+            notes['saves'] = 0
+
+        def save():
+            # Each thread has its own manifest, like separate artists do
+            manifest = VersionManifest(self.path)
+            for _ in range(20):
+                with manifest.update() as notes:
+                    notes['saves'] += 1
+
+        threads = [threading.Thread(target=save) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(VersionManifest(self.path).data['saves'], 80)
+
+    def test_lock_is_reentrant(self):
+        manifest = VersionManifest(self.path)
+        with manifest.locked():
+            with manifest.update() as notes:
+                notes['current_version'] = 0
+        self.assertEqual(manifest.data['current_version'], 0)
+
+    def test_corrupt(self):
+        for text in ('{"0": "First version.", "current_ver', '', '["Not", "an", "object"]'):
+            with open(self.path, 'w') as f:
+                f.write(text)
+            manifest = VersionManifest(self.path)
+            with self.assertLogs(versions.log, 'ERROR'):
+                self.assertEqual(manifest.data, {})
+            self.assertTrue(manifest.is_corrupt())
+
+            # Writing it again repairs it
+            with manifest.update() as notes:
+                notes['current_version'] = 0
+            self.assertFalse(manifest.is_corrupt())
+            self.assertEqual(VersionManifest(self.path).data, {'current_version': 0})
+
+
+class VersionCounterTest(unittest.TestCase):
+    def setUp(self): # Runs before each test
+        self.root = tempfile.mkdtemp(prefix='accomplice_version_counter_')
+        self.addCleanup(shutil.rmtree, self.root)
+        self.sym_path = os.path.join(self.root, 'camera.usd')
+        open(self.sym_path, 'w').close()
+        self.versions_folder = os.path.join(self.root, '.versions', 'camera')
+        os.makedirs(self.versions_folder)
+        self.counter = VersionCounter(self.versions_folder)
+
+    def get_path_for_version(self, version_number):
+        return os.path.join(self.versions_folder, 'camera_v{:03}.usd'.format(version_number))
+
+    def save(self, version_number):
+        open(self.get_path_for_version(version_number), 'w').close()
+
+    def test_peek_does_not_reserve(self):
+        self.assertEqual(self.counter.peek(self.get_path_for_version), 1)
+        self.assertEqual(self.counter.peek(self.get_path_for_version), 1)
+        self.assertIsNone(self.counter.latest())
+        self.assertEqual(versions.get_next_version(self.sym_path), versions.get_next_version(self.sym_path))
+
+    def test_peek_starts_counter(self):
+        # Versions saved before there was a counter
+        for version_number in (1, 2, 3):
+            self.save(version_number)
+        self.assertEqual(self.counter.peek(self.get_path_for_version), 4)
+        self.assertEqual(self.counter.latest(), 3)
+
+        # Later peeks go by the counter, not what's in the folder
+        os.remove(self.get_path_for_version(3))
+        self.assertEqual(self.counter.peek(self.get_path_for_version), 4)
+
+    def test_reserve(self):
+        self.assertEqual(self.counter.allocate(self.get_path_for_version), 1)
+        self.assertEqual(self.counter.allocate(self.get_path_for_version), 2)
+        self.assertEqual(self.counter.latest(), 2)
+        self.assertEqual(self.counter.peek(self.get_path_for_version), 3)
+
+    def test_skips_saved_versions(self):
+        self.counter.allocate(self.get_path_for_version)
+        # Saved by something that doesn't reserve its numbers
+        self.save(2)
+        self.save(3)
+        self.assertEqual(self.counter.peek(self.get_path_for_version), 4)
+        self.assertEqual(self.counter.allocate(self.get_path_for_version), 4)
+
+    def test_current_version(self):
+        self.save(versions.extract_version(versions.reserve_next_version(self.sym_path))[0])
+        self.assertEqual(versions.get_current_version(self.sym_path), 'camera_v001.usd')
+
+        # Past the counter, a save that didn't reserve its number
+        self.save(2)
+        self.assertEqual(versions.get_current_version(self.sym_path), 'camera_v002.usd')
+
+        # A reserved number that was never saved
+        versions.reserve_next_version(self.sym_path)
+        self.assertEqual(versions.get_current_version(self.sym_path), 'camera_v002.usd')
+
+    def test_concurrent_reserves(self):
+        reserved = []
+
+        def reserve():
+            paths = [versions.reserve_next_version(self.sym_path) for _ in range(25)]
+            reserved.extend(paths)
+
+        threads = [threading.Thread(target=reserve) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(reserved), 100)
+        self.assertEqual(len(set(reserved)), 100)
+        self.assertEqual(self.counter.latest(), 100)
+
+
+class VersionManagerTest(unittest.TestCase):
+    def setUp(self): # Runs before each test
+        self.root = tempfile.mkdtemp(prefix='accomplice_version_manager_')
+        self.addCleanup(shutil.rmtree, self.root)
+        self.main_path = os.path.join(self.root, 'shot.hipnc')
+        self.write('v0')
+
+    def write(self, text):
+        with open(self.main_path, 'w') as f:
+            f.write(text)
+
+    def read(self):
+        with open(self.main_path) as f:
+            return f.read()
+
+    def make_manager(self):
+        backups = BackupStore(os.path.join(self.root, '.backups', 'shot'), 'shot.hipnc')
+        self.addCleanup(backups.close)
+        return VersionManager(self.main_path, backups=backups)
+
+    def test_save_and_switch(self):
+        manager = self.make_manager()
+        manager.save_new_version('Blocking')
+        self.write('v1')
+        self.assertEqual(manager.get_current_version_number(), 1)
+
+        manager.switch_to_version(0)
+        self.assertEqual(self.read(), 'v0')
+        manager.switch_to_version(1)
+        self.assertEqual(self.read(), 'v1')
+        self.assertEqual(manager.get_note_for_version(1), 'Blocking')
+
+    def test_recovers_corrupt_manifest(self):
+        manager = self.make_manager()
+        manager.save_new_version('Blocking')
+        self.write('v1')
+        manager.switch_to_version(0)
+        with open(manager.version_note_file, 'w') as f:
+            f.write('{"current_version": 0, "1": "Bloc')
+
+        with self.assertLogs(versions.log, 'ERROR'):
+            manager = self.make_manager()
+        self.assertEqual(manager.get_current_version_number(), 0)
+        self.assertEqual(manager.get_note_for_version(1), '')
+        self.assertTrue(os.path.exists(os.path.join(manager.versions_folder, '.shot_version_notes.json.corrupt')))
+
+        manager.switch_to_version(1)
+        self.assertEqual(self.read(), 'v1')
+
+
+def run_tests():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.TestLoader().loadTestsFromTestCase(VersionManifestTest))
+    tests.addTest(unittest.TestLoader().loadTestsFromTestCase(VersionCounterTest))
+    tests.addTest(unittest.TestLoader().loadTestsFromTestCase(VersionManagerTest))
+    runner = unittest.TextTestRunner(verbosity=3, failfast=True)
+    runner.run(tests)
+
+
+if __name__ == '__main__':
+    run_tests()
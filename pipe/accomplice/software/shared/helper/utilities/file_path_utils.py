@@ -79,13 +79,9 @@ class FilePathUtils():
         - If enforce_only_one is True, returns the path of the file that matches all the substrings.
         - If enforce_only_one is False, returns a list of paths of all the files that match all the substrings.
         """
-        # Walk through all files in the subdirectories of the folder directory
-        found_files = []
-        for root, dirs, files in os.walk(folder_directory):
-            for file in files:
-                # Check if the file contains all the substrings
-                if all(substring.lower() in file.lower() for substring in substrings):
-                    found_files.append(os.path.join(root, file))
+        # The pipe's catalog searches its listings of the folder's subdirectories in memory
+        import pipe
+        found_files = pipe.server.find_files(folder_directory, substrings)
         
         if enforce_only_one:
             assert len(found_files) == 1, "Found more than one file matching the given substrings: " + str(found_files)
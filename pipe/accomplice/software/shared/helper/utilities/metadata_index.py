@@ -0,0 +1,152 @@
+"""An incremental index of asset geo variants, material variants and texture sets.
+
+Asset metadata is derived from three levels of directories:
+
+    <asset>/geo/<geo variant>.<ext>
+    <asset>/textures/<geo variant>/<material variant>/
+    <asset>/textures/<geo variant>/<material variant>/<name>_<geo>_<mat>_<set>_<map>.1001.<ext>
+
+Scanning them on the NFS-mounted /groups tree is slow, so every directory
+listing is remembered along with the directory's mtime. A later scan
+only stats each directory, and only lists it again if its mtime changed,
+i.e. if entries were added, removed or renamed in it.
+"""
+
+import os
+import re
+import time
+from threading import Lock
+from typing import Dict, List, NamedTuple, Tuple
+
+# Matches the texture set in a texture's file name: everything after the
+# third underscore, up to the last underscore
+TEXTURE_SET_PATTERN = re.compile(r'(?:[^_]*_){3}(.*)_')
+
+# The first UDIM tile of each texture identifies its texture set
+_FIRST_UDIM = '.1001.'
+
+# NFS mtimes can be coarse, so a directory changed again within this long
+# of a listing might keep the same mtime. Don't trust listings that new.
+MTIME_SLACK_NS = 2 * 10**9
+
+
+class Listing(NamedTuple):
+    """A directory's mtime and its sorted, non-hidden entries."""
+
+    mtime_ns: int
+    files: Tuple[str, ...]
+    dirs: Tuple[str, ...]
+
+
+_EMPTY = Listing(0, (), ())
+
+
+class DirectoryIndex:
+    """Remembers directory listings until the directory's mtime changes."""
+
+    def __init__(self) -> None:
+        self._listings: Dict[str, Listing] = {}
+        self._lock = Lock()
+        self.scans = 0
+        """How many directories have actually been listed."""
+
+    def listdir(self, path: str) -> Listing:
+        """List a directory's files and subdirectories, or nothing if it doesn't exist."""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            with self._lock:
+                self._listings.pop(path, None)
+            return _EMPTY
+
+        listing = self._listings.get(path)
+        if listing is not None and listing.mtime_ns == mtime_ns:
+            return listing
+
+        files = []
+        dirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    # Like glob, skip hidden files such as .DS_Store
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir():
+                        dirs.append(entry.name)
+                    else:
+                        files.append(entry.name)
+        except NotADirectoryError:
+            return _EMPTY
+
+        listing = Listing(mtime_ns, tuple(sorted(files)), tuple(sorted(dirs)))
+        with self._lock:
+            self.scans += 1
+            if time.time_ns() - mtime_ns > MTIME_SLACK_NS:
+                self._listings[path] = listing
+        return listing
+
+    def clear(self) -> None:
+        with self._lock:
+            self._listings.clear()
+
+
+class AssetMetadataIndex:
+    """Scans an asset's variants and texture sets, reusing unchanged listings."""
+
+    def __init__(self, directories: DirectoryIndex = None) -> None:
+        if directories is None:
+            directories = DirectoryIndex()
+        self.directories = directories
+        self._texture_sets: Dict[Tuple[str, str], Tuple[Listing, List[str]]] = {}
+
+    def get_geo_variants(self, asset_path: str) -> List[str]:
+        listing = self.directories.listdir(os.path.join(asset_path, 'geo'))
+        return [file.split('.')[0] for file in listing.files]
+
+    def get_mat_variants(self, asset_path: str, geo_variant: str) -> List[str]:
+        listing = self.directories.listdir(os.path.join(asset_path, 'textures', geo_variant))
+        return list(listing.dirs)
+
+    def get_texture_sets(
+        self,
+        asset_path: str,
+        name: str,
+        geo_variant: str,
+        material_variant: str,
+    ) -> List[str]:
+        path = os.path.join(asset_path, 'textures', geo_variant, material_variant)
+        listing = self.directories.listdir(path)
+
+        prefix = f'{name}_{geo_variant}_{material_variant}_'
+        cached_listing, texture_sets = self._texture_sets.get((path, prefix), (None, None))
+        if cached_listing is not listing:
+            texture_sets = []
+            for file in listing.files:
+                if not file.startswith(prefix) or _FIRST_UDIM not in file[len(prefix):]:
+                    continue
+                match = TEXTURE_SET_PATTERN.match(file)
+                if match is not None and match.group(1) not in texture_sets:
+                    texture_sets.append(match.group(1))
+            self._texture_sets[(path, prefix)] = (listing, texture_sets)
+        return texture_sets
+
+    def scan(self, asset_path: str, name: str) -> Dict[str, Dict[str, List[str]]]:
+        """Map every geo variant to its material variants' texture sets in one pass."""
+        hierarchy = {}
+        for geo_variant in self.get_geo_variants(asset_path):
+            hierarchy[geo_variant] = {
+                material_variant: self.get_texture_sets(asset_path, name, geo_variant, material_variant)
+                for material_variant in self.get_mat_variants(asset_path, geo_variant)
+            }
+        return hierarchy
+
+
+_index = None
+
+
+def get_metadata_index() -> AssetMetadataIndex:
+    """Get the index shared by everything in this process."""
+    global _index
+    if _index is None:
+        _index = AssetMetadataIndex()
+    return _index
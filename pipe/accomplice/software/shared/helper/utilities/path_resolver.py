@@ -0,0 +1,94 @@
+"""Find directories by name without globbing the whole tree.
+
+A recursive glob for *<name>* lists every directory under the search
+root, even though the directory being looked for is usually only a few
+levels down. The resolver searches breadth first instead, and stops at
+the shallowest level with a match.
+
+Each answer is remembered along with the listings it was found from.
+It is reused for as long as none of those directories' mtimes change,
+i.e. until entries are added, removed or renamed in one of them.
+"""
+
+import os
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from .metadata_index import DirectoryIndex, Listing, get_metadata_index
+
+
+class PathResolver:
+    """Finds the shallowest directory whose name contains a string."""
+
+    max_depth = 8
+    """How many levels below the search root to look, in case symlinks loop."""
+
+    def __init__(self, directories: DirectoryIndex = None) -> None:
+        """Keyword arguments:
+        directories -- where to get listings from: anything with a
+                       DirectoryIndex-like listdir(), e.g. the pipe's catalog
+        """
+        if directories is None:
+            directories = DirectoryIndex()
+        self.directories = directories
+        self._found: Dict[Tuple[str, str], Tuple[Optional[str], List[Tuple[str, Listing]]]] = {}
+        self._lock = Lock()
+
+    def _is_current(self, visited: List[Tuple[str, Listing]]) -> bool:
+        # Unchanged directories give back the very same listing
+        return all(self.directories.listdir(path) is listing for path, listing in visited)
+
+    def _search(self, top: str, name: str) -> Tuple[Optional[str], List[Tuple[str, Listing]]]:
+        visited = []
+        level = [top]
+        for _ in range(self.max_depth):
+            matches = []
+            next_level = []
+            for path in level:
+                listing = self.directories.listdir(path)
+                visited.append((path, listing))
+                for child in listing.dirs:
+                    child_path = os.path.join(path, child)
+                    if name in child:
+                        matches.append(child_path)
+                    next_level.append(child_path)
+            if matches:
+                # Prefer the shortest path, like sorting every match by length did
+                return min(matches, key=len), visited
+            if not next_level:
+                break
+            level = next_level
+        return None, visited
+
+    def find_dir(self, top: str, name: str) -> Optional[str]:
+        """Find the shallowest directory under top whose name contains name.
+
+        Of several matches at the same depth, the one with the shortest
+        path wins. Returns None if there are no matches.
+        """
+        top = os.path.normpath(top)
+        key = (top, name)
+        found = self._found.get(key)
+        if found is not None and self._is_current(found[1]):
+            return found[0]
+
+        found = self._search(top, name)
+        with self._lock:
+            self._found[key] = found
+        return found[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._found.clear()
+
+
+_resolver = None
+
+
+def get_path_resolver() -> PathResolver:
+    """Get the resolver shared by everything in this process."""
+    global _resolver
+    if _resolver is None:
+        # Share listings with the metadata index
+        _resolver = PathResolver(get_metadata_index().directories)
+    return _resolver
@@ -1,10 +1,11 @@
 import json
 import os
-import re
 from pathlib import *
 from typing import Type, Union, Iterable, Optional
 from enum import Enum
 
+from .helper.utilities.metadata_index import get_metadata_index
+
 
 class JsonSerializable():
 
@@ -23,8 +24,15 @@ class JsonSerializable():
 
     @classmethod
     def from_json(cls: "Type[JsonSerializable]", json_data: Union[str, bytes, bytearray]):
+        """Create an object from the output of to_json().
+
+        The constructor is skipped, since subclasses' constructors take
+        their own arguments rather than the serialized attributes.
+        """
         data = json.loads(json_data)
-        return cls(data)
+        obj = cls.__new__(cls)
+        obj.__dict__.update(data)
+        return obj
 
     def to_json(self):
         return json.dumps(vars(self), default=lambda o: o.__dict__, indent=4)
@@ -111,23 +119,31 @@ class Asset(JsonSerializable):
         self._path = self._get_first_path(value)
         #self.create_metadata() # Recreate the path metadata if needed
     
+    def _get_local_path(self):
+        if os.name == "nt":
+            return self._path.replace('/groups/', 'G:\\')
+        return self._path
+
+    def _scan_metadata(self):
+        """Get every geo variant's material variants, with their texture sets."""
+        hierarchy = get_metadata_index().scan(self._get_local_path(), self.name)
+        return {
+            geovar: {
+                matvar: MaterialVariant(matvar, self._make_texture_sets(texture_sets))
+                for matvar, texture_sets in matvars.items()
+            }
+            for geovar, matvars in hierarchy.items()
+        }
+
+    @staticmethod
+    def _make_texture_sets(names):
+        return {name: Material(name, True) for name in names}
+
     def create_metadata(self):
         meta_path = self.get_metadata_path()
         path = meta_path.replace('meta.json', '')
         data = AssetMaterials(self.name)
-        geovars = self.get_geo_variants()
-
-        hierarchy = {}
-            
-        for geovar in geovars:
-            hierarchy[geovar] = {}
-            matvars = self.get_mat_variants(geovar)
-            for matvar in matvars:
-                texture_sets = self.get_texture_sets(geovar, matvar)
-                material = MaterialVariant(matvar, texture_sets)
-                hierarchy[geovar][matvar] = material
-            
-        data.hierarchy = hierarchy
+        data.hierarchy = self._scan_metadata()
 
         if not os.path.exists(path):
             os.makedirs(path)
@@ -144,17 +160,11 @@ class Asset(JsonSerializable):
             self.create_metadata()
             meta = self.get_metadata()
             
-        geovars = self.get_geo_variants()
-        
-        for geovar in geovars:
+        for geovar, matvars in self._scan_metadata().items():
             if geovar not in meta.hierarchy.keys():
                 meta.hierarchy[geovar] = {}
-            matvars = self.get_mat_variants(geovar)
-            for matvar in matvars:
+            for matvar, material in matvars.items():
                 if matvar not in meta.hierarchy[geovar].keys():
-                    texture_sets = self.get_texture_sets(geovar, matvar)
-                    material = MaterialVariant(matvar, texture_sets)
-                    meta.hierarchy[geovar][matvar]
                     meta.hierarchy[geovar][matvar] = material
     
         #print(meta.hierarchy)
@@ -166,47 +176,15 @@ class Asset(JsonSerializable):
             outfile.write(toFile)
 
     def get_geo_variants(self):
-        if str(os.name) == "nt":
-            path = Path(self.get_geo_path().replace('/groups/', 'G:\\'))
-        else:
-            path = Path(self.get_geo_path())
-
-        geo_variants = []
-        if os.path.isdir(path):
-             
-            path, _, files = next(os.walk(path))
-
-            if files:
-                for file in files:
-                    geo_variants.append(file.split('.')[0])
-
-        return geo_variants
+        return get_metadata_index().get_geo_variants(self._get_local_path())
 
     def get_mat_variants(self, geo_variant):
-
-        path = Path(self.get_geo_path().replace('geo', 'textures'))
-        
-        path = path / geo_variant
-        print(path)
-        mat_variants = []
-
-        if path.exists():
-            files = path.glob('*/')
-
-            for file in files:
-                mat_variants.append(str(file.name))
-        return mat_variants
+        return get_metadata_index().get_mat_variants(self._get_local_path(), geo_variant)
     
     def get_texture_sets(self, geo_variant, material_variant):
-        path = Path(self.get_textures_path(geo_variant, material_variant))
-        
-        files = path.glob(self.name + '_' + geo_variant + '_' + material_variant + '_*.1001.*')
-        materials = {}
-        for file in files:
-            texture_set = re.match('(?:[^_]*_){3}(.*)_', os.path.basename(file)).group(1)
-            materials[texture_set] = Material(texture_set, True)
-                
-        return materials
+        texture_sets = get_metadata_index().get_texture_sets(
+            self._get_local_path(), self.name, geo_variant, material_variant)
+        return self._make_texture_sets(texture_sets)
 
     def get_textures_path(self, geo_variant, material_variant):
         if os.name == "nt":
@@ -0,0 +1,74 @@
+"""Cache the pipe's responses in the software that requested them."""
+
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, NamedTuple, Optional
+
+
+class CachedResponse(NamedTuple):
+    content: bytes
+    content_type: Optional[str]
+    etag: Optional[str]
+    expires: float
+
+
+class ResponseCache:
+    """A bounded, TTL-aware cache of GET responses, keyed by URL.
+
+    Expired entries are kept (until they're evicted) so that they can be
+    revalidated with their ETag instead of downloaded again.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: float = 300,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize a ResponseCache object.
+
+        Keyword arguments:
+        - max_entries -- the most responses kept before the least
+          recently used are evicted
+        - ttl -- seconds a response is used before it's revalidated
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """Get the cached response for a URL, even if it has expired."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return self._clock() < entry.expires
+
+    def put(
+        self,
+        url: str,
+        content: bytes,
+        content_type: Optional[str] = None,
+        etag: Optional[str] = None,
+    ) -> CachedResponse:
+        entry = CachedResponse(content, content_type, etag, self._clock() + self.ttl)
+        with self._lock:
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def renew(self, url: str, entry: CachedResponse) -> CachedResponse:
+        """Mark an entry fresh again, e.g. after the server said it's unchanged."""
+        return self.put(url, entry.content, entry.content_type, entry.etag)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,136 @@
+"""Persistent, pooled HTTP connections to the pipe server."""
+
+import logging
+import time
+from contextlib import contextmanager
+from http.client import HTTPConnection, HTTPException
+from queue import Empty, LifoQueue
+from threading import BoundedSemaphore
+from typing import Iterator, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# Errors that mean a connection is broken and should be thrown away
+CONNECTION_ERRORS = (HTTPException, OSError)
+
+# Errors that mean the server closed an idle keep-alive connection
+# before reading the request, so it's safe to resend even a POST
+_STALE_CONNECTION_ERRORS = (ConnectionResetError, BrokenPipeError)
+
+
+class ConnectionPool:
+    """A small pool of keep-alive HTTPConnections to one server.
+
+    At most `size` requests are in flight at once; further callers block
+    until a connection is returned. Idle connections are reused, most
+    recently used first, so the ones the server may have timed out sink
+    to the bottom.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        size: int = 4,
+        timeout: Optional[float] = 60,
+        retries: int = 3,
+        backoff: float = 0.1,
+        max_backoff: float = 2,
+    ) -> None:
+        """Initialize a ConnectionPool object.
+
+        Keyword arguments:
+        - size -- the most connections open at once
+        - timeout -- seconds a request may stall before it fails
+        - retries -- how many times a failed request is retried
+        - backoff -- seconds to wait before the first retry. The wait
+          doubles with each retry, up to max_backoff.
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._idle = LifoQueue()
+        self._slots = BoundedSemaphore(size)
+
+    def _new_connection(self) -> HTTPConnection:
+        return HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    @contextmanager
+    def connection(self) -> Iterator[Tuple[HTTPConnection, bool]]:
+        """Borrow a connection, and whether it has been used before.
+
+        The connection goes back to the pool when the block exits
+        normally, and is closed if it raises.
+        """
+        with self._slots:
+            try:
+                conn, reused = self._idle.get_nowait(), True
+            except Empty:
+                conn, reused = self._new_connection(), False
+
+            try:
+                yield conn, reused
+            except BaseException:
+                conn.close()
+                raise
+            self._idle.put(conn)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        body=None,
+        headers: Optional[dict] = None,
+        retries: Optional[int] = None,
+    ):
+        """Send a request and read its response.
+
+        Returns the response along with its content, which has already
+        been read so the connection can be reused. Requests that fail to
+        connect are retried with exponential backoff. Requests that fail
+        once sent are only retried if they are GETs, or if the server had
+        already closed the idle connection they were sent on.
+        """
+        if retries is None:
+            retries = self.retries
+        if headers is None:
+            headers = {}
+
+        attempt = 0
+        while True:
+            reused = False
+            try:
+                with self.connection() as (conn, reused):
+                    conn.request(method, url, body, headers)
+                    response = conn.getresponse()
+                    content = response.read()
+                    if response.will_close:
+                        conn.close()
+                    return response, content
+            except CONNECTION_ERRORS as ex:
+                # A stale keep-alive connection is expected, so retry it
+                # right away without counting it against the retries
+                if reused and isinstance(ex, _STALE_CONNECTION_ERRORS):
+                    log.debug(f"Reconnecting to {self.host}:{self.port}")
+                    continue
+
+                sent = not isinstance(ex, ConnectionRefusedError)
+                if attempt >= retries or (sent and method != 'GET'):
+                    raise
+
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                log.warning(f"Request to {self.host}:{self.port}{url} failed "
+                            f"({ex!r}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                break
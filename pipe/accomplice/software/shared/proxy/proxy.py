@@ -1,15 +1,19 @@
-import json
 import logging
 import os
+import time
 import atexit
 from http import HTTPStatus
-from http.client import HTTPConnection, HTTPResponse
+from http.client import HTTPResponse
 from types import SimpleNamespace
-from typing import Any, Iterable, Type, Union
+from typing import Any, Dict, Iterable, List, Optional, Type, Union
+from urllib.parse import urlencode
 
 from .. import env
 from ..exception import ServerError
 from ..object import Asset, JsonSerializable, Shot, Character
+from .cache import CachedResponse, ResponseCache
+from . import schema
+from .connection import ConnectionPool
 from .interface import PipeProxyInterface
 
 log = logging.getLogger(__name__)
@@ -52,7 +56,16 @@ class HTTPMethod:
 
 
 class _PipeProxy(PipeProxyInterface):
-    _conn = None
+    _pool = None
+
+    _pool_size = 4
+    """How many requests may be sent to the pipe at once."""
+
+    _generation_check_interval = 5
+    """Seconds between asking the pipe whether its data has changed."""
+
+    _bulk_request_size = 200
+    """The most names sent in one bulk request, to keep URLs short."""
 
     def __init__(
         self,
@@ -79,8 +92,13 @@ class _PipeProxy(PipeProxyInterface):
 
         log.error(f"Creating connection to {host}:{port}")
 
-        # Create the server connection
-        self._conn = HTTPConnection(host, port)
+        # Keep connections to the server open between requests
+        self._pool = ConnectionPool(host, port, size=self._pool_size)
+
+        # Share responses between every tool in the software
+        self._cache = ResponseCache()
+        self._generation = None
+        self._generation_checked = 0.0
 
         # Register a command to notify the pipe on exit
         atexit.register(self.exit)
@@ -97,14 +115,15 @@ class _PipeProxy(PipeProxyInterface):
 
     def _parse_response_content(
             self,
-            response: HTTPResponse,
+            content_type: str,
+            content: bytes,
             content_class: type = None,
+            kind: str = None,
     ) -> Any:
         # Handle content data types appropriately
-        content_type = response.getheader('Content-Type')
-        content = response.read()
-
-        if content_type == 'application/json':
+        if content_type == schema.MEDIA_TYPE:
+            return schema.decode(content, kind)
+        elif content_type == 'application/json':
             # Make sure the requested class is deserializable
             if not issubclass(content_class, JsonSerializable):
                 raise ValueError("Response was of type application/json, but "
@@ -116,93 +135,138 @@ class _PipeProxy(PipeProxyInterface):
         elif content_type == 'text/plain':
             return content.decode('utf-8')
 
-    def _do_exchange(self, method: str, url: str, body=None):
-        # Send the request to the pipe
-        self._conn.request(method, url, body)
-
-        # Receive the response and check it for errors
-        response = self._conn.getresponse()
-
-        return response
+    def _do_exchange(self, method: str, url: str, body=None, retries: int = None, headers: dict = None):
+        # Send the request to the pipe and read the response, reconnecting
+        # if need be. Returns the response and its content.
+        headers = dict(headers or {})
+        headers.setdefault('Accept', schema.MEDIA_TYPE)
+        return self._pool.request(method, url, body, headers, retries=retries)
+
+    def _check_generation(self) -> None:
+        """Drop the cache if the pipe's data has changed since the last check."""
+        now = time.monotonic()
+        if now - self._generation_checked < self._generation_check_interval:
+            return
+        self._generation_checked = now
+
+        response, content = self._do_exchange(HTTPMethod.GET, '/generation')
+        self._check_response_status(response)
+        if content != self._generation:
+            if self._generation is not None:
+                log.debug("Pipe data changed, clearing the response cache")
+            self._cache.clear()
+            self._generation = content
+
+    def _get_cached(self, url: str, revalidate: bool = False) -> CachedResponse:
+        """Get a response from the cache, revalidating it if it's expired.
+
+        With revalidate, a cached response is always checked with the pipe
+        first, which only costs a Not Modified response if it's unchanged.
+        """
+        self._check_generation()
+        entry = self._cache.get(url)
+        if entry is not None and not revalidate and self._cache.is_fresh(entry):
+            return entry
+
+        headers = {}
+        if entry is not None and entry.etag is not None:
+            headers['If-None-Match'] = entry.etag
+        response, content = self._do_exchange(HTTPMethod.GET, url, headers=headers)
+
+        if entry is not None and response.getcode() == HTTPStatus.NOT_MODIFIED:
+            return self._cache.renew(url, entry)
+        self._check_response_status(response)
+        return self._cache.put(url, content,
+                               response.getheader('Content-Type'),
+                               response.getheader('ETag'))
 
     def _do_handshake(self) -> bool:
         """Handshake with the pipe."""
-        response = self._do_exchange(
+        response, _ = self._do_exchange(
             HTTPMethod.POST, '/register', bytes(os.getpid()))
         return self._check_response_status(response)
 
-    def _post_data(self, url: str, data_payload: JsonSerializable=None, return_type: type=None):
+    def _post_data(self, url: str, data_payload: JsonSerializable=None, kind: str=None, retries: int=None):
         """Post data to the pipe."""
         # TODO: you could also add support for a data payload:
         if data_payload is None:
-            response = self._do_exchange(HTTPMethod.POST, url)
+            response, content = self._do_exchange(HTTPMethod.POST, url, retries=retries)
         else:
-            response = self._do_exchange(HTTPMethod.POST, url, data_payload.to_json())
+            response, content = self._do_exchange(HTTPMethod.POST, url, data_payload.to_json(), retries=retries)
+
+        # Posts can change the pipe's data, so don't trust cached responses
+        self._cache.clear()
+
         self._check_response_status(response)
-        return self._parse_response_content(response, content_class=return_type)
+        return self._parse_response_content(response.getheader('Content-Type'), content, kind=kind)
     
-    def _get_data(self, url: str, item_type: type):
-        # Request the item from the pipe
-        response = self._do_exchange(HTTPMethod.GET, url)
+    def _get_data(self, url: str, kind: str, revalidate: bool = False):
+        # Request the item from the pipe, or reuse a cached response
+        response = self._get_cached(url, revalidate)
 
         # Parse and return the item
-        self._check_response_status(response)
-        return self._parse_response_content(response, item_type)
+        return self._parse_response_content(response.content_type, response.content, kind=kind)
     
     def _generate_query_string(self, endpoint_name:str, params_dict:dict): # TODO: you can update functions to use this
         query_string = '/' + endpoint_name + '?'
         query_string += '&'.join([f'{key}={value}' for key, value in params_dict.items()])
         return query_string
 
+    def _get_bulk(self, endpoint_name: str, names: Iterable[str], decode) -> dict:
+        """Get objects for many names, a batch of names per request."""
+        names = list(dict.fromkeys(names))
+        objects = {}
+        for start in range(0, len(names), self._bulk_request_size):
+            batch = names[start:start + self._bulk_request_size]
+            url = f'/{endpoint_name}/bulk?' + urlencode({'names': ','.join(batch)})
+            objects.update(decode(self._get_cached(url).content))
+        return objects
+
     def get_asset(self, name: str) -> Asset:
         """Get an asset's data from the pipe."""
-        sg_path = self._get_data(f'/assets?name={name}'.replace(" ", "+"), Asset).strip()
-        split_path = sg_path.split("/")
-        file_name = split_path[len(split_path) - 1]
-        asset = Asset(file_name)
-        asset.path = '/groups/accomplice/pipeline/production/assets' + sg_path
-        return asset
+        sg_paths = self._get_data('/assets?' + urlencode({'name': name}), 'strings')
+        return schema.asset_from_sg_path(sg_paths[0] if sg_paths else '')
+
+    def get_assets_bulk(self, names: Iterable[str]) -> Dict[str, Asset]:
+        """Get many assets from the pipe in as few requests as possible.
+
+        Names that the pipe doesn't know are left out.
+        """
+        return self._get_bulk('assets', names, schema.decode_assets)
 
     def create_asset(self, asset_name, parent_name='') -> Asset:
         """Create an asset in the pipe."""
         params = {'asset_name': asset_name, 'parent_name': parent_name}
         query_string = self._generate_query_string('create_asset', params)
-        result_string = self._post_data(query_string)
-        return Asset(result_string['code'], result_string['sg_path'], result_string['id'])
+        result = self._post_data(query_string, kind='asset')
+        return Asset(result['code'], result['sg_path'], result['id'])
         
     
     def get_character(self, name: str) -> Character:
         """Get a character's data from the pipe"""
-        pipe_path = self._get_data(f'/characters?name={name}', Character).strip()
+        pipe_paths = self._get_data('/characters?' + urlencode({'name': name}), 'strings')
         character = Character(name)
-        character._path = '/groups/accomplice/pipeline/production' + pipe_path
+        character._path = '/groups/accomplice/pipeline/production' + (pipe_paths[0] if pipe_paths else '')
         return character
 
     def get_character_list(self) -> Iterable[str]:
         """Get a list of all characters from the pipe."""
-        return self._get_data('/characters?list=name', str).split(',')
+        return self._get_data('/characters?list=name', 'strings')
 
     def get_asset_list(self) -> Iterable[str]:
         """Get a list of all assets from the pipe."""
-        return self._get_data('/assets?list=name', str).split(',')
+        return self._get_data('/assets?list=name', 'strings')
 
     def get_assets(self, *names) -> Iterable[Asset]:
-        """Get asset data from the pipe. NOT FULLY IMPLEMENTED."""
-        # Construct the URL
-        url = '/assets'
-        if names:
-            url += '?' + ','.join(names)
-        else:
-            print("WARNING: NOT FULLY IMPLEMENTED")
-
-        return self._get_data(url, Iterable[Asset])
+        """Get asset data from the pipe."""
+        return list(self.get_assets_bulk(names).values())
 
     def get_shot(self, name: str, retrieve_from_shotgrid=False) -> Shot:
         """Get a shot's data from the pipe."""
         assert name is not None and name != ''
         
         if retrieve_from_shotgrid:
-            shot_dictionary = json.loads(self._get_data('/shot?name=' + name, str))
+            shot_dictionary = self._get_data('/shot?' + urlencode({'name': name}), 'shot')
             assert name == shot_dictionary['code']
 
             return Shot(
@@ -216,12 +280,56 @@ class _PipeProxy(PipeProxyInterface):
             name
         )
 
+    def get_shots_bulk(self, names: Iterable[str]) -> Dict[str, Shot]:
+        """Get many shots from ShotGrid in as few requests as possible.
+
+        Names that the pipe doesn't know are left out.
+        """
+        return self._get_bulk('shots', names, schema.decode_shots)
+
     def get_shot_list(self) -> Iterable[str]:
         """Get a list of all shots from the pipe."""
-        return self._get_data('/shots?list=name', str).split(',')
+        return self._get_data('/shots?list=name', 'strings')
     
+    # The catalog's answers change as files are saved, so they're always
+    # revalidated rather than trusted for the cache's TTL
+
+    def get_asset_dir(self, name: str, category: str = None) -> Optional[str]:
+        """Find an asset's directory from the pipe's catalog, or None if there isn't one."""
+        params = {'name': name}
+        if category is not None:
+            params['category'] = category
+        asset_dirs = self._get_data('/catalog/asset_dir?' + urlencode(params), 'strings', revalidate=True)
+        return asset_dirs[0] if asset_dirs else None
+
+    def get_asset_metadata(self, asset: Asset) -> Dict[str, Dict[str, List[str]]]:
+        """Map an asset's geo variants to its material variants' texture sets."""
+        params = {'path': asset.path, 'name': asset.name}
+        return self._get_data('/catalog/asset_metadata?' + urlencode(params), 'metadata', revalidate=True)
+
+    def find_files(self, folder: str, substrings: Iterable[str]) -> List[str]:
+        """Find the files under a folder whose names contain every substring, ignoring case.
+
+        As up to date as AccomplicePipe.find_files() on the server.
+        """
+        params = {'folder': folder, 'substrings': ','.join(substrings)}
+        return self._get_data('/catalog/files?' + urlencode(params), 'strings', revalidate=True)
+
+    def glob(self, pattern: str) -> List[str]:
+        """Find the paths matching a glob pattern, without '**', from the pipe's catalog.
+
+        As up to date as AccomplicePipe.glob_files() on the server.
+        """
+        return self._get_data('/catalog/glob?' + urlencode({'pattern': pattern}), 'strings', revalidate=True)
+
+    def refresh_database(self, full: bool = False) -> None:
+        """Have the pipe sync its database with ShotGrid right away."""
+        self._post_data('/refresh?full=' + ('1' if full else '0'))
+
     def exit(self) -> None:
-        self._post_data('/client/exit')
+        # Don't hold up closing the software if the pipe is already gone
+        self._post_data('/client/exit', retries=0)
+        self._pool.close()
     
     def shot_update(self, name: str):
         pass
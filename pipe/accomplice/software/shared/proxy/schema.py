@@ -0,0 +1,109 @@
+"""The versioned JSON format the pipe server and proxies exchange.
+
+Every response is an envelope:
+
+    {"v": 1, "kind": "<kind>", "data": <data>}
+
+Lists of records are sent as tables, so field names aren't repeated for
+every record:
+
+    {"fields": ["key", "name", ...], "rows": [["tree", "tree", ...], ...]}
+
+Clients ask for this format with an Accept header of MEDIA_TYPE. Clients
+that don't still get the original comma-joined text.
+"""
+
+import json
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from ..object import Asset, Shot
+
+MEDIA_TYPE = 'application/vnd.accomplice+json'
+
+VERSION = 1
+"""Bump this whenever the layout of a kind's data changes."""
+
+ASSET_FIELDS = ('key', 'name', 'sg_path', 'id')
+SHOT_FIELDS = ('key', 'code', 'id', 'sg_cut_in', 'sg_cut_out')
+
+# Where assets live on disk, relative to the paths stored in ShotGrid
+ASSET_ROOT = '/groups/accomplice/pipeline/production/assets'
+
+
+class SchemaError(ValueError):
+    """Raised for responses that don't follow the schema."""
+
+
+def accepts(accept: Optional[str]) -> bool:
+    """Whether an Accept header asks for this format."""
+    return accept is not None and MEDIA_TYPE in accept
+
+
+def _table(fields: Sequence[str], records: Mapping[str, Mapping[str, Any]]) -> dict:
+    return {
+        'fields': list(fields),
+        'rows': [
+            [key] + [record.get(field) for field in fields[1:]]
+            for key, record in records.items()
+        ],
+    }
+
+
+def _columns(table: Mapping[str, Any], fields: Sequence[str]) -> Tuple[list, List[int]]:
+    """Get a table's rows and the index of each of the given fields."""
+    # Find the columns by name so fields can be added without a new version
+    try:
+        return table['rows'], [table['fields'].index(field) for field in fields]
+    except (KeyError, TypeError, ValueError) as ex:
+        raise SchemaError(f"Malformed table: {ex}") from ex
+
+
+_ENCODERS = {
+    'strings': list,
+    'asset': dict,
+    'shot': dict,
+    'generation': str,
+    'metadata': dict,
+    'assets': lambda records: _table(ASSET_FIELDS, records),
+    'shots': lambda records: _table(SHOT_FIELDS, records),
+}
+
+
+def encode(kind: str, result: Any) -> bytes:
+    """Encode a pipe method's result as a response body."""
+    envelope = {'v': VERSION, 'kind': kind, 'data': _ENCODERS[kind](result)}
+    return json.dumps(envelope, separators=(',', ':')).encode('utf-8')
+
+
+def decode(content: bytes, kind: str) -> Any:
+    """Decode a response body, checking that it holds the expected kind."""
+    try:
+        envelope = json.loads(content)
+        version, actual_kind, data = envelope['v'], envelope['kind'], envelope['data']
+    except (ValueError, KeyError, TypeError) as ex:
+        raise SchemaError(f"Malformed response: {ex}") from ex
+    if version != VERSION:
+        raise SchemaError(f"Unsupported schema version {version} (expected {VERSION})")
+    if actual_kind != kind:
+        raise SchemaError(f"Expected a response of kind '{kind}', got '{actual_kind}'")
+    return data
+
+
+def asset_from_sg_path(sg_path: str, asset_id: Optional[int] = None) -> Asset:
+    """Build an Asset from the path ShotGrid stores for it."""
+    # ShotGrid may store several paths, and the asset is named after the first
+    sg_path = sg_path.partition(',')[0]
+    return Asset(sg_path.rpartition('/')[2], ASSET_ROOT + sg_path, asset_id)
+
+
+def decode_assets(content: bytes) -> Dict[str, Asset]:
+    """Decode an 'assets' response into Assets keyed by the requested name."""
+    rows, (key, sg_path, asset_id) = _columns(decode(content, 'assets'), ('key', 'sg_path', 'id'))
+    return {row[key]: asset_from_sg_path(row[sg_path], row[asset_id]) for row in rows}
+
+
+def decode_shots(content: bytes) -> Dict[str, Shot]:
+    """Decode a 'shots' response into Shots keyed by the requested name."""
+    rows, (key, code, cut_in, cut_out) = _columns(
+        decode(content, 'shots'), ('key', 'code', 'sg_cut_in', 'sg_cut_out'))
+    return {row[key]: Shot(row[code], row[cut_in], row[cut_out]) for row in rows}
@@ -0,0 +1,232 @@
+"""Compressed, timestamped backups of a file, written in the background.
+
+Each backup is a separate compressed file in the backups folder:
+
+    .backups/<name>/<file name>.<UTC time>.<codec extension>
+
+Backups are compressed on a background thread, so switching versions
+doesn't wait on them. Old backups are removed by a retention policy:
+only the newest keep_last are kept, and of those, only the ones younger
+than max_age (except the newest, which is always kept).
+"""
+
+import gzip
+import logging
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, NamedTuple, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+log = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1024 * 1024
+
+# Backups left half-written this long ago were abandoned, e.g. by a crash
+_ABANDONED_AGE = 24 * 60 * 60
+
+
+class Codec:
+    """Compresses backups. Subclass this to add other compression formats."""
+
+    name = 'none'
+    extension = 'bak'
+
+    def compress(self, src: BinaryIO, dst: BinaryIO) -> None:
+        shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+
+    def decompress(self, src: BinaryIO, dst: BinaryIO) -> None:
+        shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+
+
+class GzipCodec(Codec):
+    name = 'gzip'
+    extension = 'gz'
+
+    def __init__(self, level: int = 1) -> None:
+        # Scene files compress almost as well at the fastest level
+        self.level = level
+
+    def compress(self, src: BinaryIO, dst: BinaryIO) -> None:
+        with gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=self.level, mtime=0) as f:
+            shutil.copyfileobj(src, f, _CHUNK_SIZE)
+
+    def decompress(self, src: BinaryIO, dst: BinaryIO) -> None:
+        with gzip.GzipFile(fileobj=src, mode='rb') as f:
+            shutil.copyfileobj(f, dst, _CHUNK_SIZE)
+
+
+class ZstdCodec(Codec):
+    """Needs the zstandard package."""
+
+    name = 'zstd'
+    extension = 'zst'
+
+    def __init__(self, level: int = 3, threads: int = 0) -> None:
+        if zstandard is None:
+            raise ImportError("The zstd backup codec needs the zstandard package")
+        self.level = level
+        self.threads = threads
+
+    def compress(self, src: BinaryIO, dst: BinaryIO) -> None:
+        compressor = zstandard.ZstdCompressor(level=self.level, threads=self.threads)
+        compressor.copy_stream(src, dst, read_size=_CHUNK_SIZE, write_size=_CHUNK_SIZE)
+
+    def decompress(self, src: BinaryIO, dst: BinaryIO) -> None:
+        zstandard.ZstdDecompressor().copy_stream(src, dst, read_size=_CHUNK_SIZE, write_size=_CHUNK_SIZE)
+
+
+CODECS: Dict[str, type] = {codec.name: codec for codec in (Codec, GzipCodec, ZstdCodec)}
+
+
+def default_codec() -> Codec:
+    """zstd if the zstandard package is installed, otherwise gzip."""
+    return ZstdCodec() if zstandard is not None else GzipCodec()
+
+
+class Backup(NamedTuple):
+    path: str
+    codec: str
+    timestamp: float
+    size: int
+
+
+class BackupStore:
+    """Keeps compressed backups of a file, subject to a retention policy."""
+
+    def __init__(
+        self,
+        folder: str,
+        file_name: str,
+        codec: Codec = None,
+        keep_last: int = 10,
+        max_age: Optional[float] = 30 * 24 * 60 * 60,
+    ) -> None:
+        """Keyword arguments:
+        folder -- where to keep the backups
+        file_name -- the name of the file being backed up
+        codec -- how to compress backups (default: default_codec())
+        keep_last -- how many backups to keep at most
+        max_age -- how old (in seconds) backups other than the newest
+                   can get before they are removed, or None to keep them
+        """
+        self.folder = folder
+        self.file_name = file_name
+        self.codec = codec if codec is not None else default_codec()
+        self.keep_last = keep_last
+        self.max_age = max_age
+
+        # One thread, so backups are written and pruned in order. Its
+        # thread is joined at exit, so backups in progress are finished.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='Backup')
+        self._pending: List[Future] = []
+
+    def _backup_path(self, timestamp_ns: int) -> str:
+        seconds, nanoseconds = divmod(timestamp_ns, 10**9)
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(seconds)) + f'.{nanoseconds:09d}Z'
+        return os.path.join(self.folder, f'{self.file_name}.{stamp}.{self.codec.extension}')
+
+    def backup(self, source: str) -> Future:
+        """Back up a file in the background. Returns a future for the backup's path.
+
+        The file is opened right away, so it can be replaced or removed
+        while it's being compressed without affecting the backup.
+        """
+        src = open(source, 'rb')
+        path = self._backup_path(time.time_ns())
+        future = self._executor.submit(self._write, src, path)
+        self._pending = [f for f in self._pending if not f.done()] + [future]
+        return future
+
+    def _write(self, src: BinaryIO, path: str) -> str:
+        start = time.perf_counter()
+        os.makedirs(self.folder, exist_ok=True)
+        # Hidden until it's complete, so it's never restored half-written
+        tmp_path = os.path.join(self.folder, f'.{os.path.basename(path)}.{uuid.uuid4().hex[:8]}.tmp')
+        try:
+            with src, open(tmp_path, 'wb') as dst:
+                self.codec.compress(src, dst)
+            os.replace(tmp_path, path)
+        except BaseException:
+            log.exception(f"Failed to back up to {path}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        log.info(f"Backed up to {path} in {time.perf_counter() - start:.2f}s")
+        self.prune()
+        return path
+
+    def wait(self) -> None:
+        """Wait for the backups in progress to finish."""
+        for future in self._pending:
+            future.exception()
+        self._pending = []
+
+    def close(self) -> None:
+        """Wait for the backups in progress to finish, and stop taking new ones."""
+        self.wait()
+        self._executor.shutdown()
+
+    def list_backups(self) -> List[Backup]:
+        """List the finished backups, newest first."""
+        extensions = {codec.extension: name for name, codec in CODECS.items()}
+        backups = []
+        try:
+            entries = list(os.scandir(self.folder))
+        except FileNotFoundError:
+            return backups
+        prefix = self.file_name + '.'
+        for entry in entries:
+            if not entry.name.startswith(prefix) or not entry.is_file():
+                continue
+            codec = extensions.get(entry.name.rpartition('.')[2])
+            if codec is None:
+                continue
+            stat = entry.stat()
+            backups.append(Backup(entry.path, codec, stat.st_mtime, stat.st_size))
+        # The names sort by the time the backups were started
+        backups.sort(key=lambda backup: backup.path, reverse=True)
+        return backups
+
+    def prune(self) -> List[Backup]:
+        """Remove the backups the retention policy doesn't keep. Returns them."""
+        backups = self.list_backups()
+        now = time.time()
+        removed = []
+        for entry in os.scandir(self.folder):
+            if entry.name.startswith('.') and entry.name.endswith('.tmp'):
+                if now - entry.stat().st_mtime > _ABANDONED_AGE:
+                    os.remove(entry.path)
+        for index, backup in enumerate(backups):
+            too_many = index >= self.keep_last
+            too_old = index > 0 and self.max_age is not None and now - backup.timestamp > self.max_age
+            if too_many or too_old:
+                try:
+                    os.remove(backup.path)
+                except FileNotFoundError:
+                    continue
+                removed.append(backup)
+        return removed
+
+    def restore(self, backup: Backup, destination: str) -> None:
+        """Decompress a backup over a file, replacing it atomically."""
+        codec = self.codec if backup.codec == self.codec.name else CODECS[backup.codec]()
+        tmp_path = os.path.join(os.path.dirname(destination),
+                                f'.{os.path.basename(destination)}.{uuid.uuid4().hex[:8]}.tmp')
+        try:
+            with open(backup.path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                codec.decompress(src, dst)
+            if os.path.exists(destination):
+                shutil.copymode(destination, tmp_path)
+            os.replace(tmp_path, destination)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        log.info(f"Restored {destination} from {backup.path}")
@@ -0,0 +1,195 @@
+"""Store versions of a file without copying its data where possible.
+
+Versions and backups are never changed once they're written, so files
+with the same content can share their data:
+
+    - on filesystems with reflinks (btrfs, XFS), copies are clones that
+      share extents until one of them is written to;
+    - elsewhere, content goes into a blob store keyed by its SHA-256, and
+      each version or backup is a hard link to its blob. A file is only
+      stored once, however many versions and backups have it.
+
+The main file is the exception: DCCs may save over it in place, so it's
+never linked to a blob. It gets a clone, a copy_file_range() copy (done
+on the server on NFS 4.2), or an ordinary copy, in that order.
+"""
+
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from typing import Dict, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# From <linux/fs.h>: _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+
+# Errors meaning a filesystem can't clone, copy_file_range() or hard link
+_UNSUPPORTED = {
+    errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL,
+    errno.ENOSYS, errno.EPERM, errno.EMLINK, errno.EBADF,
+}
+
+_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def _temp_path(path: str) -> str:
+    # Hidden, so it's never mistaken for a version
+    return os.path.join(os.path.dirname(path), '.{}.{}.tmp'.format(os.path.basename(path), uuid.uuid4().hex[:8]))
+
+
+def _clone(src_fd: int, dst_fd: int) -> bool:
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+    except OSError as ex:
+        if ex.errno in _UNSUPPORTED:
+            return False
+        raise
+    return True
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, size: int) -> bool:
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    copied = 0
+    try:
+        while copied < size:
+            count = os.copy_file_range(src_fd, dst_fd, min(size - copied, 1 << 30))
+            if count == 0:
+                break
+            copied += count
+    except OSError as ex:
+        if ex.errno in _UNSUPPORTED and copied == 0:
+            return False
+        raise
+    return True
+
+
+class CopyStorage:
+    """Stores versions as plain copies. Works anywhere."""
+
+    def copy(self, src: str, dst: str) -> str:
+        """Copy a file to a path nothing else shares data with. Returns how it was copied."""
+        shutil.copy(src, dst)
+        return 'copy'
+
+    def store(self, src: str, dst: str) -> str:
+        """Store a copy of a file that will never be written to. Returns how it was stored."""
+        return self.copy(src, dst)
+
+    def collect_garbage(self) -> int:
+        return 0
+
+
+class VersionStorage(CopyStorage):
+    """Stores versions as clones, or as hard links into a content-addressed blob store."""
+
+    def __init__(self, blobs_folder: str) -> None:
+        self.blobs_folder = blobs_folder
+        self._hashes: Dict[Tuple[int, int, int, int], str] = {}
+
+    def _copy_data(self, src: str, dst: str) -> str:
+        """Write a file's data to a new file, as cheaply as the filesystem allows."""
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            if _clone(fsrc.fileno(), fdst.fileno()):
+                return 'clone'
+            if _copy_file_range(fsrc.fileno(), fdst.fileno(), os.fstat(fsrc.fileno()).st_size):
+                return 'copy_file_range'
+            shutil.copyfileobj(fsrc, fdst, _CHUNK_SIZE)
+            return 'copy'
+
+    def copy(self, src: str, dst: str) -> str:
+        # Copy to a temporary file first, so dst is never left half-written
+        tmp_path = _temp_path(dst)
+        try:
+            method = self._copy_data(src, tmp_path)
+            shutil.copymode(src, tmp_path)
+            os.replace(tmp_path, dst)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return method
+
+    def _hash(self, path: str) -> str:
+        # Saving a version stores the same main file more than once, so
+        # remember the hash until the file changes
+        stat = os.stat(path)
+        key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        digest = self._hashes.get(key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+            self._hashes = {key: digest}
+        return digest
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_folder, digest[:2], digest)
+
+    def store(self, src: str, dst: str) -> str:
+        # Clones already share data, without having to read the file to hash it
+        tmp_path = _temp_path(dst)
+        try:
+            with open(src, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+                cloned = _clone(fsrc.fileno(), fdst.fileno())
+            if cloned:
+                shutil.copymode(src, tmp_path)
+                os.replace(tmp_path, dst)
+                return 'clone'
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        blob_path = self._blob_path(self._hash(src))
+        for attempt in range(2):
+            method = 'link'
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                self.copy(src, blob_path)
+                method = 'blob'
+
+            tmp_path = _temp_path(dst)
+            try:
+                os.link(blob_path, tmp_path)
+            except FileNotFoundError:
+                # Another process collected the blob in the meantime, so store it again
+                if attempt > 0:
+                    raise
+                continue
+            except OSError as ex:
+                if ex.errno not in _UNSUPPORTED:
+                    raise
+                log.debug(f"Can't hard link {blob_path}, copying it instead: {ex}")
+                return self.copy(src, dst)
+            os.replace(tmp_path, dst)
+            return method
+
+    def collect_garbage(self) -> int:
+        """Remove blobs no version or backup links to anymore. Returns how many were removed."""
+        removed = 0
+        if not os.path.isdir(self.blobs_folder):
+            return removed
+        for prefix in os.scandir(self.blobs_folder):
+            if not prefix.is_dir():
+                continue
+            for blob in os.scandir(prefix.path):
+                # Skip blobs still being written, which are hidden
+                if blob.name.startswith('.') or not blob.is_file():
+                    continue
+                if blob.stat().st_nlink == 1:
+                    os.remove(blob.path)
+                    removed += 1
+        return removed
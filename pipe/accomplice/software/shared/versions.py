@@ -1,25 +1,167 @@
 import os
-import shutil
 import re
 import logging
 log = logging.getLogger(__name__)
 import pathlib
 import json
 import threading
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl, so files can't be locked there
+    fcntl = None
+
+from .helper.utilities.metadata_index import DirectoryIndex
+from .version_backups import BackupStore
+from .version_storage import VersionStorage
+
+@contextmanager
+def _file_lock(lock_path):
+    """
+    Holds an exclusive lock on a file, which is created if need be. Does nothing where there's no fcntl.
+    """
+    if fcntl is None:
+        yield
+        return
+    # Only read access is needed to lock, so artists can share a lock file someone else created
+    lock_fd = os.open(lock_path, os.O_RDONLY | os.O_CREAT, 0o666)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+    finally:
+        os.close(lock_fd)
+
+def _write_atomically(path, text):
+    """
+    Writes a file through a temporary file renamed over it, so nobody ever reads it half-written.
+    """
+    # Unlike mkstemp(), let the umask decide the permissions, so other artists can still write it
+    tmp_path = os.path.join(os.path.dirname(path), '.{}.{}.{}'.format(
+        os.path.basename(path), os.getpid(), uuid.uuid4().hex[:8]))
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _get_versions_folder(sym_path):
+    file_name = os.path.basename(sym_path)
+    folder = sym_path.replace(file_name, '')
+    return os.path.join(folder, '.versions', file_name.split('.')[0])
+
+def _get_version_file_name(sym_path, version_number):
+    file_name = os.path.basename(sym_path)
+    return file_name.split('.')[0] + '_v' + str(version_number).zfill(3) + '.' + file_name.split('.')[1]
+
+class VersionCounter:
+    """
+    The latest version number given out in a versions folder, kept in a hidden sidecar file.
+
+    Reading the counter replaces listing the folder and parsing every file name in it. Numbers are
+    reserved under a lock, so two artists publishing at the same moment never get the same one.
+    """
+    def __init__(self, versions_folder):
+        self.versions_folder = versions_folder
+        self.path = os.path.join(versions_folder, '.latest_version')
+        self.lock_path = self.path + '.lock'
+
+    def latest(self):
+        """
+        Returns the latest version number given out, or None if the counter hasn't been started.
+        """
+        try:
+            with open(self.path, 'r') as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _scan(self):
+        # Like get_current_version() always did, other files such as the version notes count as version -1.
+        # Returns None if the folder is empty, so nothing is recorded for it yet.
+        files = [f for f in os.listdir(self.versions_folder) if not f.startswith('.')]
+        if not files:
+            return None
+        return max(extract_version(f)[0] for f in files)
+
+    def _start(self):
+        """
+        Returns the latest version number, starting the counter from the versions made before it existed
+        if need be, so the folder is only ever scanned once. Call it with the lock held.
+        """
+        latest = self.latest()
+        if latest is None:
+            latest = self._scan()
+            if latest is None:
+                return 0
+            _write_atomically(self.path, str(latest))
+        return latest
+
+    def _next(self, latest, get_path_for_version):
+        version_number = latest + 1
+        while os.path.lexists(get_path_for_version(version_number)):
+            version_number += 1
+        return version_number
+
+    def peek(self, get_path_for_version):
+        """
+        Returns the next version number, without giving it out.
+
+        Args:
+            get_path_for_version: Returns the path a version number's file would have. Numbers whose files
+                already exist, e.g. because something that doesn't reserve them saved them, are skipped.
+        """
+        latest = self.latest()
+        if latest is None:
+            with _file_lock(self.lock_path):
+                latest = self._start()
+        return self._next(latest, get_path_for_version)
+
+    def allocate(self, get_path_for_version):
+        """
+        Gives out the next version number. Nobody else will be given it, even if its file is never saved.
+
+        Args:
+            get_path_for_version: As for peek().
+        Returns:
+            The version number.
+        """
+        with _file_lock(self.lock_path):
+            version_number = self._next(self._start(), get_path_for_version)
+            _write_atomically(self.path, str(version_number))
+        return version_number
 
 #Returns the file name of the latest version in the .versions folder
 def get_current_version(sym_path):
     if os.path.exists(sym_path):
 
-        file_name = os.path.basename(sym_path)
-        folder = sym_path.replace(file_name, '')
-        versions_folder = os.path.join(folder, '.versions', file_name.split('.')[0])
+        versions_folder = _get_versions_folder(sym_path)
 
         if not os.path.exists(versions_folder):
             log.error("No versions exist for this sym_link path.")
             return
 
-        files = os.listdir(versions_folder)
+        # The counter usually names the latest version, unless it hasn't been saved yet
+        get_path_for_version = lambda version_number: os.path.join(versions_folder, _get_version_file_name(sym_path, version_number))
+        latest_int = VersionCounter(versions_folder).latest()
+        if latest_int is not None and os.path.lexists(get_path_for_version(latest_int)):
+            # Versions saved without reserving their numbers come after it
+            while os.path.lexists(get_path_for_version(latest_int + 1)):
+                latest_int += 1
+            return _get_version_file_name(sym_path, latest_int)
+
+        files = [f for f in os.listdir(versions_folder) if not f.startswith('.')]
         if files:
             latest_version = max(files,key=extract_version)
             
@@ -40,24 +182,24 @@ def extract_version(f):
 #Returns the file path of the next highest version based on the path to a given symlink.
 #   - If the versions folder doesn't exist, one is created
 def get_next_version(sym_path):
-    file_name = os.path.basename(sym_path)
-    folder = sym_path.replace(file_name, '')
-    versions_folder = os.path.join(folder, '.versions', file_name.split('.')[0])
+    versions_folder = _get_versions_folder(sym_path)
 
     if not os.path.exists(versions_folder):
-        os.makedirs(versions_folder)
+        os.makedirs(versions_folder, exist_ok=True)
 
-    current_version = get_current_version(sym_path)
+    get_path_for_version = lambda version_number: os.path.join(versions_folder, _get_version_file_name(sym_path, version_number))
+    return get_path_for_version(VersionCounter(versions_folder).peek(get_path_for_version))
 
-    if not current_version:
-        latest_int = 0
-    
-    else:
-        latest_int = extract_version(current_version)[0]
+#Like get_next_version, but reserves the version's number, so nobody else saving at the same time gets it.
+#   - The number is used up even if nothing is saved there, so reserve it just before the file is written
+def reserve_next_version(sym_path):
+    versions_folder = _get_versions_folder(sym_path)
 
-    new_file_name = file_name.split('.')[0] + '_v' + str(latest_int + 1).zfill(3) + '.' + file_name.split('.')[1]
+    if not os.path.exists(versions_folder):
+        os.makedirs(versions_folder, exist_ok=True)
 
-    return os.path.join(versions_folder, new_file_name)
+    get_path_for_version = lambda version_number: os.path.join(versions_folder, _get_version_file_name(sym_path, version_number))
+    return get_path_for_version(VersionCounter(versions_folder).allocate(get_path_for_version))
 
 #Deletes current symlink and creates a new one linked to the given file. 
 def update_symlink(sym_path, new_version_path):
@@ -70,16 +212,122 @@ def update_symlink(sym_path, new_version_path):
 
 
 
+class VersionManifest:
+    """
+    The notes, save times and current version number of a file's versions, cached in memory.
+
+    The manifest is only read again when another process has replaced it. Changes
+    are made under an exclusive lock and written to a temporary file that is then
+    renamed over the manifest, so other artists never see a half-written one.
+    A manifest that can't be read, e.g. one written before that, reads as empty.
+    """
+    def __init__(self, path):
+        self.path = path
+        # Lock a separate file, since the manifest itself is replaced on every write.
+        # It's hidden so it isn't mistaken for a version.
+        self.lock_path = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.lock')
+        self._data = None
+        self._stat = None
+        self._corrupt = False
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+
+    def _get_stat(self):
+        # Renaming a new manifest into place changes the inode, even where mtimes are too coarse to tell
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def exists(self):
+        return self._get_stat() is not None
+
+    def is_corrupt(self):
+        """
+        Returns whether the manifest exists but couldn't be read.
+        """
+        self.data
+        return self._corrupt
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except ValueError as ex:
+            log.error('The version manifest ' + self.path + ' is corrupt: ' + str(ex))
+            return None
+        if not isinstance(data, dict):
+            log.error('The version manifest ' + self.path + ' is corrupt: it is not an object')
+            return None
+        return data
+
+    @property
+    def data(self):
+        """
+        The manifest's contents, read again only if the file changed since the last read.
+        """
+        with self._lock:
+            stat = self._get_stat()
+            if self._data is None or stat != self._stat:
+                data = self._read() if stat is not None else {}
+                self._corrupt = data is None
+                self._data = data if data is not None else {}
+                self._stat = stat
+            return self._data
+
+    @contextmanager
+    def locked(self):
+        """
+        Holds the manifest's lock, so other processes can't change the manifest or its versions.
+        """
+        with self._lock:
+            # flock() locks aren't reentrant across file descriptors, so only take it once
+            if self._lock_depth > 0:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+
+            with _file_lock(self.lock_path):
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+
+    @contextmanager
+    def update(self):
+        """
+        Changes the manifest. Yields a copy of its contents to change, which is written when the block exits.
+        """
+        with self.locked():
+            data = dict(self.data)
+            yield data
+            self._write(data)
+
+    def _write(self, data):
+        _write_atomically(self.path, json.dumps(data))
+        self._data = data
+        self._corrupt = False
+        self._stat = self._get_stat()
+
+
 class VersionManager:
     """
     This class is responsible for managing versions of a file. Note that is uses symlinks only to make it clear what the current version is (the file representing the current version points to the main_file), but it could operate just the same without the symlink.
     """
-    def __init__(self, current_file_location):
+    def __init__(self, current_file_location, storage=None, backups=None):
         """
         Initializes an instance of the class.
 
         Args:
             current_file_location (str): The location of the file that we are encapsulating in this version manager.
+            storage: How versions are stored. Defaults to a VersionStorage that shares data between
+                identical versions, in a blob store next to the versions folders.
+            backups: Where the file is backed up to. Defaults to compressed backups in the .backups folder.
         Returns:
             None
         """
@@ -96,26 +344,41 @@ class VersionManager:
         if not pathlib.Path(self.versions_folder).exists():
             pathlib.Path(self.versions_folder).mkdir(parents=True, exist_ok=True)
 
+        if storage is None:
+            storage = VersionStorage(os.path.join(os.path.dirname(self.main_path), '.versions', '.blobs'))
+        self.storage = storage
+
+        if backups is None:
+            backups = BackupStore(
+                os.path.join(os.path.dirname(self.main_path), '.backups', self.file_name_without_extension),
+                os.path.basename(self.main_path))
+        self.backups = backups
+
         # If the version note file doesn't exist, create it.
         self.version_note_file = os.path.join(self.versions_folder, self.file_name_without_extension + '_version_notes.json')
-        if not os.path.exists(self.version_note_file):
-            self.initialize_version_manager_file_system()
+        self.manifest = VersionManifest(self.version_note_file)
+
+        # Listings of the versions folder, and what was derived from them, are reused until it changes
+        self._directories = DirectoryIndex()
+        self._versions_listing = None
+        self._versions = {}
+        self._timestamps = {}
+
+        with self.manifest.locked():
+            # Check again under the lock, in case another artist just created it
+            if not self.manifest.exists():
+                self.initialize_version_manager_file_system()
+            elif self.manifest.is_corrupt():
+                self._recover_manifest()
     
     def initialize_version_manager_file_system(self):
         # If this file doesn't exist, we can assume that this is the first version.
-        with open(self.version_note_file, 'w') as f:
-            json.dump(
-                {
-                    0: 'First version.', # The key is the version number, the value is the note.
-                    'current_version': 0 # This is the current version number, which changes if users change the file version
-                        
-                }
-                ,
-                f
-            )
+        with self.manifest.update() as notes:
+            notes['0'] = 'First version.' # The key is the version number, the value is the note.
+            notes['current_version'] = 0 # This is the current version number, which changes if users change the file version
 
         # This will give us the path to a first version
-        new_version_path = self.get_next_version_path()
+        new_version_path = reserve_next_version(self.main_path)
         assert not os.path.exists(new_version_path), "The file already exists in the versions folder."
         # shutil.copy(self.main_path, new_version_path)
         # The current version in the versions folder is just a symlink to the actual file
@@ -127,13 +390,51 @@ class VersionManager:
         assert self.get_version_number_for_file_path(new_version_path) == 0, "The version number of the new file is not correct."
         self._set_version(self.get_version_number_for_file_path(new_version_path))
 
-    def create_backup(self):
-        # Also copy to a backups folder just in case :)
-        backups_folder = os.path.join(os.path.dirname(self.main_path), '.backups')
-        if not os.path.exists(backups_folder):
-            os.makedirs(backups_folder)
-        shutil.copy(self.main_path, os.path.join(backups_folder, os.path.basename(self.main_path)))
-        log.info('Created backup of ' + self.main_path + ' at ' + os.path.join(backups_folder, os.path.basename(self.main_path)))
+    def _recover_manifest(self):
+        """
+        Rebuilds a corrupt manifest from the versions folder. The notes are lost, so the corrupt file is kept beside it.
+        """
+        corrupt_path = os.path.join(self.versions_folder, '.' + os.path.basename(self.version_note_file) + '.corrupt')
+        os.replace(self.version_note_file, corrupt_path)
+        log.error('Rebuilding the version manifest, the corrupt one was moved to ' + corrupt_path)
+
+        # The current version is the one linked to the main file
+        versions = self._get_versions()
+        current = [number for number, paths in versions.items() if any(os.path.islink(path) for path in paths)]
+        with self.manifest.update() as notes:
+            notes['current_version'] = current[0] if current else max(versions, default=0)
+
+    def create_backup(self, source=None):
+        """
+        Backs up the main file in the background, just in case :)
+
+        Args:
+            source (str): A stored copy of the main file to back up instead, which won't change while it's compressed.
+        Returns:
+            A future for the path of the backup.
+        """
+        future = self.backups.backup(source or self.main_path)
+        log.info('Backing up ' + self.main_path + ' to ' + self.backups.folder)
+        return future
+
+    def get_backups(self):
+        """
+        Returns the finished backups of the main file, newest first.
+        """
+        return self.backups.list_backups()
+
+    def restore_backup(self, backup=None):
+        """
+        Replaces the main file with a backup, the newest one by default. The main file is backed up first.
+        """
+        with self.manifest.locked():
+            self.backups.wait()
+            if backup is None:
+                backups = self.get_backups()
+                assert backups, "There are no backups to restore."
+                backup = backups[0]
+            self.create_backup()
+            self.backups.restore(backup, self.main_path)
     
     
     def get_main_path(self):
@@ -146,11 +447,8 @@ class VersionManager:
         """
         Sets the current version number but does not switch the version
         """
-        with open(self.version_note_file, 'r') as f:
-            notes = json.load(f)
+        with self.manifest.update() as notes:
             notes['current_version'] = version_number
-        with open(self.version_note_file, 'w') as f:
-            json.dump(notes, f)
         log.info('Set current version to ' + str(version_number))
     
     def get_version_number_for_file_path(self, file_path:str):
@@ -163,20 +461,14 @@ class VersionManager:
         """
         Returns the note associated with the given version number.
         """
-        with open(self.version_note_file, 'r') as f:
-            notes = json.load(f)
-            if str(version_number) not in notes:
-                return ''
-            return notes[str(version_number)]
+        return self.manifest.data.get(str(version_number), '')
 
     def set_note_for_version(self, version_number:int, note:str):
         """
         Sets the note associated with the given version number.
         """
-        notes = json.load(open(self.version_note_file, 'r'))
-        notes[str(version_number)] = note
-        with open(self.version_note_file, 'w') as f:
-            json.dump(notes, f)
+        with self.manifest.update() as notes:
+            notes[str(version_number)] = note
     
     def get_current_version_path(self):
         current_version = self.get_current_version_number()
@@ -187,29 +479,63 @@ class VersionManager:
         """
         Returns the current version number.
         """
-        with open(self.version_note_file, 'r') as f:
-            notes = json.load(f)
-            assert 'current_version' in notes, "The current version number is not in the version note file."
-            return notes['current_version']
+        notes = self.manifest.data
+        assert 'current_version' in notes, "The current version number is not in the version note file."
+        return notes['current_version']
     
     def get_current_version_timestamp(self):
         return os.path.getmtime(os.path.realpath(self.get_current_version_path()))
     
+    def _get_versions(self):
+        """
+        Maps each version number to the paths of its files, listing the versions folder only if it changed.
+        """
+        listing = self._directories.listdir(self.versions_folder)
+        if listing is not self._versions_listing:
+            versions = {}
+            for f in listing.files:
+                if f.startswith(self.file_name_without_extension) and not f.endswith('.json'):
+                    path = os.path.join(self.versions_folder, f)
+                    versions.setdefault(self.get_version_number_for_file_path(path), []).append(path)
+            self._versions = versions
+            self._timestamps = {}
+            self._versions_listing = listing
+        return self._versions
+
     def get_all_versions_associated_with_file(self):
-        return [os.path.join(self.versions_folder, f) for f in os.listdir(self.versions_folder) if f.startswith(self.file_name_without_extension) and not f.endswith('.json')]
+        return [path for paths in self._get_versions().values() for path in paths]
+
+    def _get_timestamp(self, path, saved_at):
+        # The current version is a symlink to the main file, which changes as the artist saves,
+        # but the other versions are never written to once they're in the versions folder
+        if os.path.islink(path):
+            return os.path.getmtime(os.path.realpath(path))
+        # Identical versions may share one blob, and so its mtime, so use the time each was saved
+        version_number = str(self.get_version_number_for_file_path(path))
+        if version_number in saved_at:
+            return saved_at[version_number]
+        # Stored before save times were recorded
+        if path not in self._timestamps:
+            self._timestamps[path] = os.path.getmtime(path)
+        return self._timestamps[path]
     
     def get_version_table(self):
         """
         Returns a list of tuples containing the file, version number, the timestamp, and the note.
         """
-        return [(f, extract_version(f)[0], os.path.getmtime(os.path.realpath(f)), self.get_note_for_version(extract_version(f)[0])) for f in self.get_all_versions_associated_with_file()]
+        notes = self.manifest.data
+        saved_at = notes.get('saved_at', {})
+        return [
+            (f, version_number, self._get_timestamp(f, saved_at), notes.get(str(version_number), ''))
+            for version_number, paths in self._get_versions().items()
+            for f in paths
+        ]
     
     def get_path_for_version(self, version_number:int):
         """
         Returns the path to the version with the given version number.
         """
-        matching_files = [f for f in self.get_all_versions_associated_with_file() if self.get_version_number_for_file_path(f) == version_number]
-        print(matching_files)
+        matching_files = self._get_versions().get(version_number, [])
         assert len(matching_files) == 1, "There should only be one file with the given version number."
         return matching_files[0]
     
@@ -219,42 +545,59 @@ class VersionManager:
         """
         return get_next_version(self.main_path)
 
+    def _store_current_version(self):
+        """
+        Replaces the current version's symlink with a stored copy of the main file, and backs the main file up.
+        """
+        previous_version_number = self.get_current_version_number()
+        previous_version_path = self.get_path_for_version(previous_version_number)
+        assert os.path.exists(previous_version_path), "The file does not exist."
+        assert os.path.islink(previous_version_path), "The file is not a symlink."
+        # Until now its timestamp was the main file's, so keep showing that
+        saved_at = os.path.getmtime(self.main_path)
+        os.remove(previous_version_path) # remove the symlink
+        # Store the current file at the previous path
+        method = self.storage.store(self.main_path, previous_version_path)
+        log.info('Stored ' + self.main_path + ' at ' + previous_version_path + ' (' + method + ')')
+        with self.manifest.update() as notes:
+            notes['saved_at'] = dict(notes.get('saved_at', {}), **{str(previous_version_number): saved_at})
+        self.create_backup(previous_version_path)
+
     def save_new_version(self, version_note=None):
         """
         Saves a new version of the file.
         """
-        new_version_path = self.get_next_version_path()
-        new_version_number = self.get_version_number_for_file_path(new_version_path)
-        assert not os.path.exists(new_version_path), "The file already exists in the versions folder."
-        shutil.copy(self.main_path, new_version_path) # At this point, the new version is just a copy of the current version
-        self.switch_to_version(new_version_number) # Obviously there are a couple more copies being made here than necessary, but it's fine for now.
+        with self.manifest.locked():
+            new_version_path = reserve_next_version(self.main_path)
+            new_version_number = self.get_version_number_for_file_path(new_version_path)
+            assert not os.path.exists(new_version_path), "The file already exists in the versions folder."
+            self._store_current_version()
+
+            # The new version is what's in the main file, so it only needs the symlink
+            os.symlink(self.main_path, new_version_path)
+            log.info('Made a symlink at ' + new_version_path + ' to ' + self.main_path)
+            self._set_version(new_version_number)
         
-        if version_note:
-            self.set_note_for_version(self.get_current_version_number(), version_note)
+            if version_note:
+                self.set_note_for_version(self.get_current_version_number(), version_note)
         
     
     def switch_to_version(self, version_number:int):
         """
         Reverts the file to the given version number.
         """
-        # Copy the current file to the current version
-        previous_version_path = self.get_path_for_version(self.get_current_version_number())
-        assert os.path.exists(previous_version_path), "The file does not exist."
-        assert os.path.islink(previous_version_path), "The file is not a symlink."
-        os.remove(previous_version_path) # remove the symlink
-        # Copy the current file to the previous path
-        shutil.copy(self.main_path, previous_version_path)
-        log.info('Copied ' + self.main_path + ' to ' + previous_version_path)
-        # Remove the main path and copy the new version to the main path
-        self.create_backup()
+        with self.manifest.locked():
+            new_version_path = self.get_path_for_version(version_number)
+            self._store_current_version()
 
-        os.remove(self.main_path)
-        new_version_path = self.get_path_for_version(version_number)
-        assert os.path.exists(new_version_path), "The file does not exist."
-        shutil.copy(new_version_path, self.main_path)
-        log.info('Copied ' + new_version_path + ' to ' + self.main_path)
-        # Remove the new_version_path and make it a symlink instead
-        os.remove(new_version_path)
-        os.symlink(self.main_path, new_version_path)
-        log.info('Made a symlink at ' + new_version_path + ' to ' + self.main_path)
-        self._set_version(version_number)
+            # Stored versions may share their data with other files, so give the main file its own copy
+            assert os.path.exists(new_version_path), "The file does not exist."
+            method = self.storage.copy(new_version_path, self.main_path)
+            log.info('Copied ' + new_version_path + ' to ' + self.main_path + ' (' + method + ')')
+            # Remove the new_version_path and make it a symlink instead
+            os.remove(new_version_path)
+            os.symlink(self.main_path, new_version_path)
+            log.info('Made a symlink at ' + new_version_path + ' to ' + self.main_path)
+            self._set_version(version_number)
+
+            self.storage.collect_garbage()
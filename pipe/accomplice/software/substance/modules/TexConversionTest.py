@@ -0,0 +1,165 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+# Run test from this directory with
+# python3 -m unittest TexConversionTest
+
+import tex_conversion
+
+# Stands in for txmake: records its arguments in the texture it writes,
+# and how many copies of it were running at once, and fails on maps named
+# Broken
+STAND_IN_TXMAKE = '''#!{python}
+import json, os, sys, time
+
+src, dst = sys.argv[-2:]
+running_dir = {running_dir!r}
+marker = os.path.join(running_dir, str(os.getpid()))
+open(marker, 'w').close()
+with open(os.path.join(running_dir, os.pardir, 'concurrency.log'), 'a') as log:
+    log.write(str(len(os.listdir(running_dir))) + '\\n')
+time.sleep(0.2)
+os.remove(marker)
+
+if 'Broken' in src:
+    print('txmake: unsupported image format', file=sys.stderr)
+    sys.exit(1)
+with open(dst, 'w') as f:
+    json.dump(sys.argv[1:], f)
+'''
+
+
+class TexConversionTest(unittest.TestCase):
+    def setUp(self): # Runs before each test
+        self.root = tempfile.mkdtemp(prefix='accomplice_tex_conversion_')
+        self.addCleanup(shutil.rmtree, self.root)
+
+        self.txmake = os.path.join(self.root, 'txmake')
+        running_dir = os.path.join(self.root, 'running')
+        os.makedirs(running_dir)
+        with open(self.txmake, 'w') as f:
+            f.write(STAND_IN_TXMAKE.format(python=sys.executable, running_dir=running_dir))
+        os.chmod(self.txmake, 0o755)
+
+        self.tmp_path = os.path.join(self.root, 'tmp')
+        self.export_path = os.path.join(self.root, 'textures')
+        os.makedirs(self.tmp_path)
+        os.makedirs(self.export_path)
+
+    def write_maps(self, names, directory=None):
+        directory = directory or self.tmp_path
+        os.makedirs(directory, exist_ok=True)
+        for name in names:
+            with open(os.path.join(directory, name), 'w') as f:
+                f.write(name)
+
+    def read_concurrency(self):
+        with open(os.path.join(self.root, 'concurrency.log')) as f:
+            return max(int(line) for line in f)
+
+    def test_convert_textures(self):
+        maps = [f'Body_{channel}.{udim}.png' for channel in ('BaseColor', 'Roughness', 'Normal') for udim in (1001, 1002)]
+        self.write_maps(maps)
+
+        progress = []
+        report = tex_conversion.convert_textures(
+            self.tmp_path, self.export_path, self.txmake, max_workers=3,
+            progress=lambda done, total, conversion, error: progress.append((done, total, error)),
+        )
+
+        # Normal maps become .b2r, and everything else .tex
+        self.assertEqual(sorted(os.listdir(self.export_path)), sorted(
+            os.path.splitext(name)[0] + ('.b2r' if 'Normal' in name else '.tex') for name in maps
+        ))
+        with open(os.path.join(self.export_path, 'Body_Normal.1001.b2r')) as f:
+            args = json.load(f)
+        self.assertEqual(args[:-2], tex_conversion.B2R_ARGS)
+        self.assertEqual(args[-2:], [
+            os.path.join(self.tmp_path, 'Body_Normal.1001.png'), os.path.join(self.export_path, 'Body_Normal.1001.b2r'),
+        ])
+        with open(os.path.join(self.export_path, 'Body_BaseColor.1002.tex')) as f:
+            self.assertEqual(json.load(f)[:-2], tex_conversion.TEX_ARGS)
+
+        self.assertEqual(len(report.converted), len(maps))
+        self.assertEqual((report.skipped, report.errors), ([], {}))
+        self.assertEqual(progress, [(done, len(maps), None) for done in range(1, len(maps) + 1)])
+
+        # The maps are converted a few at a time, but no more than asked
+        self.assertGreater(self.read_concurrency(), 1)
+        self.assertLessEqual(self.read_concurrency(), 3)
+
+    def test_skip_up_to_date(self):
+        self.write_maps(['Body_BaseColor.1001.png', 'Body_Roughness.1001.png'])
+        tex_conversion.convert_textures(self.tmp_path, self.export_path, self.txmake)
+
+        # Only the map that changed since is converted again
+        changed_map = os.path.join(self.tmp_path, 'Body_Roughness.1001.png')
+        stat = os.stat(changed_map)
+        os.utime(changed_map, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**10))
+        report = tex_conversion.convert_textures(self.tmp_path, self.export_path, self.txmake)
+        self.assertEqual(report.converted, [os.path.join(self.export_path, 'Body_Roughness.1001.tex')])
+        self.assertEqual(report.skipped, [os.path.join(self.export_path, 'Body_BaseColor.1001.tex')])
+
+    def test_collect_errors(self):
+        self.write_maps(['Body_BaseColor.1001.png', 'Broken_BaseColor.1001.png', 'Body_Normal.1001.png'])
+        report = tex_conversion.convert_textures(self.tmp_path, self.export_path, self.txmake)
+
+        # One map failing doesn't stop the others
+        self.assertEqual(sorted(report.converted), [
+            os.path.join(self.export_path, 'Body_BaseColor.1001.tex'), os.path.join(self.export_path, 'Body_Normal.1001.b2r'),
+        ])
+        broken_map = os.path.join(self.tmp_path, 'Broken_BaseColor.1001.png')
+        self.assertEqual(list(report.errors), [broken_map])
+        self.assertIn('unsupported image format', report.errors[broken_map])
+
+        # Nor does txmake not being there
+        report = tex_conversion.convert_textures(self.tmp_path, self.export_path, os.path.join(self.root, 'missing'))
+        self.assertEqual(list(report.errors), [broken_map])
+
+    def test_convert_while_exporting(self):
+        # Like the exporter, which exports each texture set's maps to its own folder
+        set_maps = {
+            texture_set: [f'{texture_set}_{channel}.1001.png' for channel in ('BaseColor', 'Roughness', 'Normal')]
+            for texture_set in ('Body', 'Eyes', 'Broken')
+        }
+        progress = []
+        with tex_conversion.TextureConverter(self.export_path, self.txmake, max_workers=3) as converter:
+            for texture_set, maps in set_maps.items():
+                set_tmp_path = os.path.join(self.tmp_path, texture_set)
+                self.write_maps(maps, set_tmp_path)
+                self.assertEqual(converter.add_maps(set_tmp_path, remove_when_done=True), len(maps))
+                converter.process_finished(lambda *args: progress.append(args))
+
+                # The set's maps convert while the next set exports
+                if texture_set == 'Body':
+                    time.sleep(1)
+                    self.assertFalse(os.path.exists(set_tmp_path))
+            report = converter.wait(lambda *args: progress.append(args))
+
+        self.assertEqual(len(report.converted), 6)
+        self.assertEqual(len(report.errors), 3)
+        # Body's maps finished while Eyes' exported, so they're reported once Eyes' are added
+        self.assertEqual([(done, total) for done, total, *_ in progress],
+                         [(done, 6) for done in range(1, 4)] + [(done, 9) for done in range(4, 10)])
+
+        # Each set's maps are removed once they're converted, unless one fails
+        self.assertEqual(os.listdir(self.tmp_path), ['Broken'])
+
+        # Sets that are already converted are removed straight away
+        set_tmp_path = os.path.join(self.tmp_path, 'Body')
+        self.write_maps(set_maps['Body'], set_tmp_path)
+        for name in os.listdir(self.export_path):
+            os.utime(os.path.join(self.export_path, name), (time.time() + 10, time.time() + 10))
+        with tex_conversion.TextureConverter(self.export_path, self.txmake) as converter:
+            self.assertEqual(converter.add_maps(set_tmp_path, remove_when_done=True), 0)
+            self.assertEqual(len(converter.wait().skipped), 3)
+        self.assertFalse(os.path.exists(set_tmp_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
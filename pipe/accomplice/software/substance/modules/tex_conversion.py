@@ -0,0 +1,270 @@
+"""Convert exported texture maps to RenderMan textures with txmake.
+
+Normal maps are converted to .b2r (bump to roughness) and every other
+map to .tex. Maps whose texture is already newer than them are skipped
+before anything is launched, and the rest are converted a few at a time,
+each in its own txmake process. One map failing doesn't stop the rest:
+each failure is collected with txmake's output, for reporting once
+they're all done.
+
+A TextureConverter takes maps as they're exported, one directory at a
+time, so they can be converted while the next ones export, and removes
+each directory once its maps are converted.
+
+This doesn't need Substance Painter, so it can be tested with a stand-in
+for txmake.
+"""
+
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+TEX_ARGS = [
+    '-resize', 'round-',
+    '-mode', 'clamp',
+    '-format', 'pixar',
+    '-compression', 'lossless',
+    '-newer',
+]
+
+B2R_ARGS = [
+    '-resize', 'round-',
+    '-mode', 'periodic',
+    '-filter', 'box',
+    '-mipfilter', 'box',
+    '-bumprough', '2', '0', '1', '0', '0', '1',
+    '-newer',
+]
+
+
+class Conversion(NamedTuple):
+    """A map to convert, and how."""
+
+    src: str
+    dst: str
+    args: Sequence[str]
+
+
+class ConversionReport(NamedTuple):
+    converted: List[str]
+    """The textures written"""
+    skipped: List[str]
+    """The textures already newer than their maps"""
+    errors: Dict[str, str]
+    """Why each map that failed to convert did, by its path"""
+
+
+def startupInfo():
+    """Returns a Windows-only object to make sure tasks launched through
+    subprocess don't open a cmd window.
+
+    Returns:
+        subprocess.STARTUPINFO -- the properly configured object if we are on
+                                  Windows, otherwise None
+    """
+    startupinfo = None
+    if str(os.name) == 'nt':
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return startupinfo
+
+
+def get_txmake() -> str:
+    """Get the txmake in the RenderMan install that RMANTREE points to."""
+    return os.path.join(os.environ['RMANTREE'], 'bin', 'txmake.exe' if os.name == 'nt' else 'txmake')
+
+
+def get_conversion(src: str, dst_dir: str) -> Conversion:
+    """Get how to convert a map, to a texture of the same name in dst_dir."""
+    filename = os.path.basename(src)
+    if 'Normal' in filename:
+        return Conversion(src, os.path.join(dst_dir, os.path.splitext(filename)[0] + '.b2r'), B2R_ARGS)
+    return Conversion(src, os.path.join(dst_dir, os.path.splitext(filename)[0] + '.tex'), TEX_ARGS)
+
+
+def is_up_to_date(conversion: Conversion) -> bool:
+    """Whether a map's texture exists, and is at least as new as the map."""
+    try:
+        return os.stat(conversion.dst).st_mtime_ns >= os.stat(conversion.src).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def convert(conversion: Conversion, txmake: str) -> Optional[str]:
+    """Convert a map with txmake. Returns why it failed, or None if it didn't."""
+    try:
+        result = subprocess.run(
+            [txmake, *conversion.args, conversion.src, conversion.dst],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            startupinfo=startupInfo(),
+        )
+    except OSError as e:
+        return str(e)
+    if result.returncode != 0:
+        output = result.stdout.decode(errors='replace').strip()
+        return f"txmake exited with {result.returncode}" + (f": {output}" if output else "")
+    if not os.path.exists(conversion.dst):
+        return "txmake didn't write the texture"
+    return None
+
+
+ProgressCallback = Callable[[int, int, Conversion, Optional[str]], None]
+"""Called with how many maps are done, how many there are so far, the map
+just done and why it failed (or None), as each one finishes"""
+
+
+class TextureConverter:
+    """Converts maps on a pool of txmake processes while more are added.
+
+    Progress is only reported, and the report only updated, on the thread
+    that calls process_finished() or wait(), so they can update the UI.
+    """
+
+    def __init__(self, dst_dir: str, txmake: Optional[str] = None, max_workers: Optional[int] = None) -> None:
+        """
+        Keyword arguments:
+        dst_dir -- the directory to write the textures to
+        txmake -- the txmake to convert with (default: RenderMan's)
+        max_workers -- how many maps to convert at once (default: the
+                       number of cores)
+        """
+        self.dst_dir = dst_dir
+        self.txmake = txmake or get_txmake()
+        self.report = ConversionReport([], [], {})
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or os.cpu_count() or 1, thread_name_prefix='Txmake'
+        )
+        self._finished: 'queue.Queue[tuple]' = queue.Queue()
+        self._total = 0
+        self._done = 0
+
+        # The maps left to convert in each directory, and the directories
+        # to remove once they're all converted
+        self._lock = threading.Lock()
+        self._remaining: Dict[str, int] = {}
+        self._failed_dirs = set()
+        self._remove_dirs = set()
+
+    def __enter__(self) -> 'TextureConverter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # Don't start the maps that are left if something went wrong
+        self.close(cancel=exc_type is not None)
+
+    def add_maps(self, src_dir: str, remove_when_done: bool = False) -> int:
+        """Start converting every map in a directory. Returns how many need converting.
+
+        Keyword arguments:
+        src_dir -- the directory of maps to convert
+        remove_when_done -- whether to remove the directory once its maps
+                            are converted. It's kept if any fail.
+        """
+        conversions = []
+        for filename in sorted(os.listdir(src_dir)):
+            if not os.path.isfile(os.path.join(src_dir, filename)):
+                continue
+            conversion = get_conversion(os.path.join(src_dir, filename), self.dst_dir)
+            if is_up_to_date(conversion):
+                self.report.skipped.append(conversion.dst)
+            else:
+                conversions.append(conversion)
+
+        if not conversions:
+            if remove_when_done:
+                shutil.rmtree(src_dir, ignore_errors=True)
+            return 0
+
+        with self._lock:
+            self._remaining[src_dir] = len(conversions)
+            if remove_when_done:
+                self._remove_dirs.add(src_dir)
+        self._total += len(conversions)
+        for conversion in conversions:
+            future = self._executor.submit(convert, conversion, self.txmake)
+            future.add_done_callback(lambda future, src_dir=src_dir, conversion=conversion:
+                                     self._finish(src_dir, conversion, future))
+        return len(conversions)
+
+    def _finish(self, src_dir: str, conversion: Conversion, future: Future) -> None:
+        # Runs on the thread that converted the map
+        if future.cancelled():
+            error = "Cancelled"
+        else:
+            try:
+                error = future.result()
+            except Exception as e:
+                error = str(e)
+
+        with self._lock:
+            self._remaining[src_dir] -= 1
+            if error is not None:
+                self._failed_dirs.add(src_dir)
+            remove = (
+                self._remaining[src_dir] == 0
+                and src_dir in self._remove_dirs
+                and src_dir not in self._failed_dirs
+            )
+        if remove:
+            shutil.rmtree(src_dir, ignore_errors=True)
+        self._finished.put((conversion, error))
+
+    def _record(self, conversion: Conversion, error: Optional[str], progress: Optional[ProgressCallback]) -> None:
+        self._done += 1
+        if error is None:
+            self.report.converted.append(conversion.dst)
+        else:
+            self.report.errors[conversion.src] = error
+        if progress is not None:
+            progress(self._done, self._total, conversion, error)
+
+    def process_finished(self, progress: Optional[ProgressCallback] = None) -> None:
+        """Report the maps that have finished converting since last time, without waiting for more."""
+        while True:
+            try:
+                finished = self._finished.get_nowait()
+            except queue.Empty:
+                return
+            self._record(*finished, progress)
+
+    def wait(self, progress: Optional[ProgressCallback] = None) -> ConversionReport:
+        """Wait for every map added to finish converting, reporting each one. Returns the report."""
+        while self._done < self._total:
+            self._record(*self._finished.get(), progress)
+        return self.report
+
+    def close(self, cancel: bool = False) -> None:
+        """Stop the pool, once the maps being converted are done.
+
+        Keyword arguments:
+        cancel -- whether to skip the maps that haven't started converting
+        """
+        self._executor.shutdown(wait=True, cancel_futures=cancel)
+
+
+def convert_textures(
+        src_dir: str,
+        dst_dir: str,
+        txmake: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> ConversionReport:
+    """Convert every map in a directory to a RenderMan texture.
+
+    Keyword arguments:
+    src_dir -- the directory of maps to convert
+    dst_dir -- the directory to write the textures to
+    txmake -- the txmake to convert with (default: RenderMan's)
+    max_workers -- how many maps to convert at once (default: the number
+                   of cores)
+    progress -- called as each map finishes, on the calling thread, so it
+                can update the UI
+    """
+    with TextureConverter(dst_dir, txmake, max_workers) as converter:
+        converter.add_maps(src_dir)
+        return converter.wait(progress)
@@ -3,12 +3,12 @@ import sys
 import importlib
 import pathlib
 import json
-import subprocess
 import shutil
 
 #pipe modules
 import pipe
 from pipe.shared import object
+import tex_conversion
 
 # Substance 3D Painter modules
 import substance_painter.ui
@@ -287,7 +287,11 @@ class SubstanceExporterWindow(QtWidgets.QMainWindow):
             substance_painter.resource.Usage.EXPORT)
 
         create_version(str(export_path))
-        
+
+        #convert each texture set's RenderMan maps while the next one exports
+        converter = tex_conversion.TextureConverter(str(export_path))
+        progress_dialog, report_progress = show_conversion_progress(self)
+
         #export each texture set
         for texture_set in self.texture_sets_dict:
             widget = self.texture_sets_dict[texture_set]
@@ -312,11 +316,16 @@ class SubstanceExporterWindow(QtWidgets.QMainWindow):
             #Get the currently active layer stack (paintable)
             stack = texture_set.all_stacks()[0]
 
+            #Keep each set's RenderMan maps apart, so they can be converted once it's exported
+            set_tmp_path = tmp_path / texture_set.name()
+            if not os.path.exists(str(set_tmp_path)):
+                os.makedirs(str(set_tmp_path))
+
             #Define export config for RenderMan
             
             RMAN_config = {
                 "exportShaderParams" 	: False,
-                "exportPath" 			: str(tmp_path),
+                "exportPath" 			: str(set_tmp_path),
                 "exportList"			: [ { "rootPath" : str(stack) } ],
                 "exportPresets" 		: [ { "name" : "default", "maps" : [] } ],
                 "defaultExportPreset" 	: RMAN_preset.identifier().url(),
@@ -366,18 +375,46 @@ class SubstanceExporterWindow(QtWidgets.QMainWindow):
                                             "An error occurred while exporting RMAN textures. Please check the console for more information.")
             
             if error:
+                converter.close(cancel=True)
+                progress_dialog.close()
                 QtWidgets.QMessageBox.warning(self, "Error", "An error occurred while exporting textures. Please check the console for more information.")
                 return
-            
-        #Convert to tex
+
+            #Convert to tex, removing the set's maps once they're converted
+            try:
+                converter.add_maps(str(set_tmp_path), remove_when_done=True)
+                converter.process_finished(report_progress)
+            except Exception as e:
+                error = True
+                print(e)
+                converter.close(cancel=True)
+                progress_dialog.close()
+                QtWidgets.QMessageBox.warning(self, "Error",
+                                                "Oh whoops, I screwed up")
+                return
+
+        #Wait for the last sets to convert
         try:
-            txmake(export_path, tmp_path)
-            shutil.rmtree(tmp_path)
+            report = converter.wait(report_progress)
+            if report.skipped:
+                print(f"Skipped {len(report.skipped)} textures that were already up to date")
+            if report.errors:
+                error = True
+                for src, message in report.errors.items():
+                    print(f"Failed to convert {src}: {message}")
+                QtWidgets.QMessageBox.warning(self, "Error",
+                    f"Failed to convert {len(report.errors)} of the textures to .tex and .b2r: "
+                    + ", ".join(os.path.basename(src) for src in report.errors))
+            else:
+                shutil.rmtree(tmp_path)
         except Exception as e:
             error = True
             print(e)
             QtWidgets.QMessageBox.warning(self, "Error",
                                             "Oh whoops, I screwed up")
+        finally:
+            converter.close()
+            progress_dialog.close()
         
         if error:
                 QtWidgets.QMessageBox.warning(self, "Error", "An error occurred while exporting textures. Please check the console for more information.")
@@ -397,64 +434,31 @@ class SubstanceExporterWindow(QtWidgets.QMainWindow):
 
         self.close()
 
-def startupInfo():
-    """Returns a Windows-only object to make sure tasks launched through
-    subprocess don't open a cmd window.
+def show_conversion_progress(parent=None):
+    """Show a dialog with the progress of converting textures.
 
     Returns:
-        subprocess.STARTUPINFO -- the properly configured object if we are on
-                                  Windows, otherwise None
+        the dialog, and the progress callback for a TextureConverter that updates it
     """
-    startupinfo = None
-    if str(os.name) == 'nt':
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-    return startupinfo
-
-def txmake(export_path, tmp_path):
-    rmantree = os.environ['RMANTREE']
-    binary = os.path.join(rmantree,'bin', 'txmake.exe')
-    cmd = [binary]
-
-    cmd += ['-resize', 'round-',
-            '-mode', 'clamp',
-            '-format', 'pixar',
-            '-compression', 'lossless',
-            '-newer',
-            'src', 'dst']
-    b2r_command = [binary]
-    
-    b2r_command += ['-resize', 'round-',
-                    '-mode', 'periodic',
-                    '-filter', 'box',
-                    '-mipfilter', 'box',
-                    '-bumprough', '2', '0', '1', '0', '0','1',
-                    '-newer',
-                    'src', 'dst']
-    
-    for img in os.listdir(tmp_path):
-
-        dirname, filename = os.path.split(img)
-        if 'Normal' in filename:
-            print("Converting " + filename + " to .b2r! Be Patient!")
-            b2rfile = os.path.splitext(filename)[0] + '.b2r'
-            b2r_command[-1] = os.path.join(export_path, b2rfile)
-            b2r_command[-2] = os.path.join(tmp_path, img)
-
-            p = subprocess.Popen(b2r_command, stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE,
-                            startupinfo=startupInfo())
-            p.wait()
+    progress_dialog = QtWidgets.QProgressDialog("Converting textures...", None, 0, 0, parent)
+    progress_dialog.setWindowTitle("Converting textures")
+    progress_dialog.setWindowModality(QtCore.Qt.WindowModal)
+    progress_dialog.setMinimumDuration(0)
+    progress_dialog.show()
+    QApplication.processEvents()
+
+    def report_progress(done, total, conversion, error):
+        filename = os.path.basename(conversion.dst)
+        if error is None:
+            print(f"Converted {filename} ({done}/{total})")
         else:
-            print("Converting " + filename + " to .tex! Be Patient!")
-            texfile = os.path.splitext(filename)[0] + '.tex'
-            cmd[-1] = os.path.join(export_path, texfile)
-            cmd[-2] = os.path.join(tmp_path, img)
-        
-            p = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE,
-                                startupinfo=startupInfo())
-            p.wait()
+            print(f"Failed to convert {filename} ({done}/{total}): {error}")
+        progress_dialog.setMaximum(total)
+        progress_dialog.setValue(done)
+        progress_dialog.setLabelText(f"Converted {done} of {total} textures")
+        QApplication.processEvents()
+
+    return progress_dialog, report_progress
 
 def create_version(path):
     #print(path)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+"""Benchmark saving and switching versions of a large file.
+
+Run from the pipe directory, e.g.
+
+    python3 -m accomplice.versionbench --size 512 --saves 4
+
+Saves versions of a file (changing a few bytes between saves, like an
+artist would), saves one more without changes, then switches back and
+forth between versions. Compares the time and disk space taken by the
+original copy-everything VersionManager against the version storage.
+The disk space includes the backups: the original kept one, overwriting
+it each time, while the backup store keeps several. The file is random
+bytes, so they don't compress the way scene files do.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from .software.shared.version_storage import CopyStorage
+from .software.shared.versions import VersionManager
+
+
+class LegacyVersionManager(VersionManager):
+    """Saves and switches versions the way VersionManager originally did."""
+
+    def __init__(self, current_file_location):
+        super().__init__(current_file_location, storage=CopyStorage())
+
+    def save_new_version(self, version_note=None):
+        new_version_path = self.get_next_version_path()
+        new_version_number = self.get_version_number_for_file_path(new_version_path)
+        shutil.copy(self.main_path, new_version_path)
+        self.switch_to_version(new_version_number)
+        if version_note:
+            self.set_note_for_version(self.get_current_version_number(), version_note)
+
+    def switch_to_version(self, version_number):
+        previous_version_path = self.get_path_for_version(self.get_current_version_number())
+        os.remove(previous_version_path)
+        shutil.copy(self.main_path, previous_version_path)
+        self.create_backup()
+        os.remove(self.main_path)
+        new_version_path = self.get_path_for_version(version_number)
+        shutil.copy(new_version_path, self.main_path)
+        os.remove(new_version_path)
+        os.symlink(self.main_path, new_version_path)
+        self._set_version(version_number)
+
+    def create_backup(self, source=None):
+        # Copied in full before carrying on, every time
+        backups_folder = os.path.join(os.path.dirname(self.main_path), '.backups')
+        if not os.path.exists(backups_folder):
+            os.makedirs(backups_folder)
+        shutil.copy(self.main_path, os.path.join(backups_folder, os.path.basename(self.main_path)))
+
+
+def disk_usage(folder: str) -> int:
+    """Get the bytes used by the files under a folder, counting hard links once."""
+    inodes = {}
+    for root, _, files in os.walk(folder):
+        for file in files:
+            stat = os.lstat(os.path.join(root, file))
+            inodes[(stat.st_dev, stat.st_ino)] = stat.st_blocks * 512
+    return sum(inodes.values())
+
+
+def _edit(path: str, saves: int) -> None:
+    # Change a few bytes, the way saving a scene changes its content
+    with open(path, 'r+b') as f:
+        f.seek(saves * 4096)
+        f.write(os.urandom(16))
+
+
+def run(manager_class, size: int, saves: int, switches: int) -> dict:
+    root = tempfile.mkdtemp(prefix='accomplice_versionbench_')
+    manager = None
+    try:
+        path = os.path.join(root, 'shot.hipnc')
+        with open(path, 'wb') as f:
+            for _ in range(size):
+                f.write(os.urandom(1024 * 1024))
+        manager = manager_class(path)
+        results = {}
+
+        start = time.perf_counter()
+        for save in range(saves):
+            _edit(path, save)
+            manager.save_new_version(f'save {save}')
+        manager.save_new_version('unchanged')
+        results['save'] = (time.perf_counter() - start) / (saves + 1)
+
+        start = time.perf_counter()
+        for switch in range(switches):
+            manager.switch_to_version(switch % (saves + 1))
+        results['switch'] = (time.perf_counter() - start) / switches
+
+        # Count the backups still being compressed in the background too
+        manager.backups.wait()
+        results['disk'] = disk_usage(root)
+        return results
+    finally:
+        if manager is not None:
+            manager.backups.close()
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=256, help="file size in MiB (default: %(default)s)")
+    parser.add_argument('--saves', type=int, default=4)
+    parser.add_argument('--switches', type=int, default=4)
+    args = parser.parse_args()
+
+    for name, manager_class in (('legacy copies', LegacyVersionManager), ('version storage', VersionManager)):
+        results = run(manager_class, args.size, args.saves, args.switches)
+        print(f"{name:16} save {results['save'] * 1000:8.1f} ms  "
+              f"switch {results['switch'] * 1000:8.1f} ms  "
+              f"disk {results['disk'] / 2**20:8.1f} MiB")
@@ -0,0 +1,242 @@
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timezone
+
+from shotgun_api3.lib import mockgun
+
+from .ShotGridDatabase import ShotGridDatabase
+from .cache import EntityCache
+
+# Run test from the pipe directory with
+# python3 -m unittest database.ShotGridCacheTest
+# or in Studini with
+# from database import ShotGridCacheTest; ShotGridCacheTest.run_tests()
+
+# Mockgun needs a copy of the site's schema. mockgun_schema.json has the
+# fields these tests use, in the format schema_read() returns them, so
+# the tests don't need to reach the site.
+_schema_dir = tempfile.mkdtemp(prefix='accomplice_mockgun_')
+_schema_path = os.path.join(_schema_dir, 'schema.pickle')
+_schema_entity_path = os.path.join(_schema_dir, 'schema_entity.pickle')
+with open(os.path.join(os.path.dirname(__file__), 'mockgun_schema.json')) as f:
+    _schema = json.load(f)
+with open(_schema_path, 'wb') as f:
+    pickle.dump(_schema['schema'], f)
+with open(_schema_entity_path, 'wb') as f:
+    pickle.dump(_schema['schema_entity'], f)
+mockgun.Shotgun.set_schema_paths(_schema_path, _schema_entity_path)
+
+
+class CountingMockgun(mockgun.Shotgun):
+    """Mockgun that counts how many times find() goes to the 'server', and
+    how many finds were running at once, and sets updated_at on writes
+    like ShotGrid does."""
+    find_count = 0
+    find_delay = 0.0
+    max_concurrent_finds = 0
+    _concurrent_finds = 0
+    _count_lock = threading.Lock()
+
+    def find(self, *args, **kwargs):
+        with self._count_lock:
+            self.find_count += 1
+            self._concurrent_finds += 1
+            self.max_concurrent_finds = max(self.max_concurrent_finds, self._concurrent_finds)
+        try:
+            time.sleep(self.find_delay)
+            return super().find(*args, **kwargs)
+        finally:
+            with self._count_lock:
+                self._concurrent_finds -= 1
+
+    def create(self, entity_type, data, return_fields=None):
+        return super().create(entity_type, dict(data, updated_at=datetime.now(timezone.utc)), return_fields)
+
+    def update(self, entity_type, entity_id, data, multi_entity_update_modes=None):
+        return super().update(entity_type, entity_id, dict(data, updated_at=datetime.now(timezone.utc)),
+                              multi_entity_update_modes)
+
+
+class FakeClock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ShotGridDatabaseCacheTest(unittest.TestCase):
+    def setUp(self): # Runs before each test
+        self.sg = CountingMockgun('https://mockgun.test', 'test', 'key')
+        self.project = self.sg.create('Project', {'name': 'Accomplice'})
+        self.db = ShotGridDatabase(None, None, None, self.project['id'], connection=self.sg)
+        self.clock = FakeClock()
+        self.db.cache._clock = self.clock
+
+        self.tree = self.db.create_asset('tree', '/environment/setdressing/tree')
+        self.sg.create('Shot', {
+            'project': self.project,
+            'code': 'A_010',
+            'sg_cut_in': 1001,
+            'sg_cut_out': 1050,
+        })
+        self.db.cache.clear()
+
+    def test_repeated_lookup_hits_cache(self):
+        first = self.db.get_asset('tree')
+        count = self.sg.find_count
+        second = self.db.get_asset('tree')
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(self.sg.find_count, count)
+        self.assertEqual(self.db.get_cache_stats()['hits'], 1)
+
+    def test_id_lookup_shares_cache(self):
+        self.db.get_asset('tree')
+        count = self.sg.find_count
+        self.assertEqual(self.db.get_asset_id('tree'), self.tree['id'])
+        self.assertEqual(self.sg.find_count, count)
+
+    def test_shot_list_is_cached(self):
+        self.assertEqual(self.db.get_shot_list(), ['A_010'])
+        count = self.sg.find_count
+        self.db.get_shot_list()
+        self.db.get_shot('A_010')
+        self.db.get_shot('A_010')
+        self.assertEqual(self.sg.find_count, count + 1)
+
+    def test_ttl_expiry(self):
+        self.db.get_shot_list()
+        count = self.sg.find_count
+        self.clock.now += self.db.cache.ttls['Shot'] + 1
+        self.db.get_shot_list()
+        self.assertEqual(self.sg.find_count, count + 1)
+
+    def test_create_invalidates(self):
+        self.assertNotIn('bench', self.db.get_asset_list())
+        self.db.create_asset('bench', '/environment/setdressing/bench')
+        self.assertIn('bench', self.db.get_asset_list())
+
+    def test_delete_invalidates(self):
+        bench = self.db.create_asset('bench', '/environment/setdressing/bench')
+        self.assertIn('bench', self.db.get_asset_list())
+        self.db.delete_asset_by_id(bench['id'])
+        self.assertNotIn('bench', self.db.get_asset_list())
+
+    def test_resolve_assets_uses_one_query(self):
+        self.db.create_asset('bench', '/environment/setdressing/bench')
+        self.db.cache.clear()
+        count = self.sg.find_count
+        assets = self.db.resolve_assets(['tree', 'bench', 'nonexistent'])
+        self.assertEqual(self.sg.find_count, count + 1)
+        self.assertEqual(sorted(assets), ['bench', 'tree'])
+        self.assertEqual(assets['tree'].id, self.tree['id'])
+
+        # Resolved assets are cached for single lookups too
+        self.db.get_asset('bench')
+        self.assertEqual(self.sg.find_count, count + 1)
+
+    def test_resolve_shots(self):
+        shots = self.db.resolve_shots(['A_010', 'Z_999'])
+        self.assertEqual(list(shots), ['A_010'])
+        self.assertEqual(shots['A_010']['sg_cut_in'], 1001)
+
+    def test_snapshot_serves_lists(self):
+        self.db.preload(refresh_interval=None)
+        count = self.sg.find_count
+        self.assertEqual(self.db.get_asset_list(), ['tree'])
+        self.assertEqual(self.db.get_shot_list(), ['A_010'])
+        self.assertEqual(self.db.get_asset_id('tree'), self.tree['id'])
+        self.assertEqual(self.sg.find_count, count)
+
+    def test_snapshot_sees_writes(self):
+        self.db.preload(refresh_interval=None)
+        bench = self.db.create_asset('bench', '/environment/setdressing/bench')
+        self.assertIn('bench', self.db.get_asset_list())
+        self.db.delete_asset_by_id(bench['id'])
+        self.assertNotIn('bench', self.db.get_asset_list())
+
+    def test_sync_drops_retired_entities(self):
+        self.db.preload(refresh_interval=None)
+        # Another process creates and then retires an asset
+        bench = self.sg.create('Asset', {
+            'project': self.project,
+            'code': 'bench',
+            'sg_path': '/environment/setdressing/bench',
+            'sg_asset_type': 'Environment',
+        })
+        self.db.refresh()
+        self.assertIn('bench', self.db.get_asset_list())
+        self.sg.delete('Asset', bench['id'])
+        generation = self.db.generation
+        self.db.refresh()
+        self.assertNotIn('bench', self.db.get_asset_list())
+        self.assertGreater(self.db.generation, generation)
+
+    def test_write_does_not_load_stale_snapshot(self):
+        self.db.preload(refresh_interval=None)
+        self.db.snapshot.is_stale = True # As it is after restoring it from disk
+        count = self.sg.find_count
+        self.db.set_shot_field('A_010', 'sg_cut_out', 1060)
+        self.assertEqual(self.db.get_shot('A_010')['sg_cut_out'], 1060)
+        self.assertEqual(self.sg.find_count, count + 1) # Only the shot that was written
+        self.assertTrue(self.db.snapshot.is_stale)
+
+    def test_load_and_sync_do_not_overlap(self):
+        self.db.preload(refresh_interval=None)
+        self.sg.find_delay = 0.05
+        self.sg.max_concurrent_finds = 0
+        threads = [threading.Thread(target=self.db.snapshot.load), threading.Thread(target=self.db.snapshot.sync)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.sg.max_concurrent_finds, 1)
+
+    def test_update_invalidates(self):
+        self.db.get_shot('A_010')
+        self.db.set_shot_field('A_010', 'sg_cut_out', 1060)
+        self.assertEqual(self.db.get_shot('A_010')['sg_cut_out'], 1060)
+
+    def test_generation_changes_on_write(self):
+        self.db.preload(refresh_interval=None)
+        generation = self.db.generation
+        self.db.get_asset_list()
+        self.assertEqual(self.db.generation, generation)
+        self.db.set_shot_field('A_010', 'sg_cut_out', 1060)
+        self.assertGreater(self.db.generation, generation)
+
+
+class EntityCacheTest(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = EntityCache(max_entries=2)
+        cache.put('Asset', 'a', 1)
+        cache.put('Asset', 'b', 2)
+        cache.get('Asset', 'a', lambda: None) # 'a' is now the most recently used
+        cache.put('Asset', 'c', 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.get('Asset', 'a', lambda: None), 1)
+        self.assertIsNone(cache.get('Asset', 'b', lambda: None))
+
+    def test_invalidate_only_touches_entity_type(self):
+        cache = EntityCache()
+        cache.put('Asset', 'list', ['tree'])
+        cache.put('Shot', 'list', ['A_010'])
+        cache.invalidate('Asset')
+        self.assertIsNone(cache.get('Asset', 'list', lambda: None))
+        self.assertEqual(cache.get('Shot', 'list', lambda: None), ['A_010'])
+
+
+def run_tests():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.TestLoader().loadTestsFromTestCase(ShotGridDatabaseCacheTest))
+    tests.addTest(unittest.TestLoader().loadTestsFromTestCase(EntityCacheTest))
+    runner = unittest.TextTestRunner(verbosity=3, failfast=True)
+    runner.run(tests)
+
+
+if __name__ == '__main__':
+    run_tests()
@@ -1,9 +1,12 @@
 import os
 import logging as log
-from typing import Iterable, Set, Sequence, Optional
+from typing import Iterable, Set, Sequence, Optional, Mapping, Dict
 from abc import ABC, abstractmethod
 
 from .baseclass import Database
+from .cache import EntityCache
+from .snapshot import ProjectSnapshot, SnapshotRefresher
+from .snapshot_store import SnapshotStore
 from shared.object import Asset # I think this one works, but for some reason the IDE wasn't getting it
 # from ..accomplice.software.shared.object import Shot, Asset
 
@@ -25,39 +28,151 @@ class ShotGridDatabase(Database):
                  shotgun_script: str,
                  shotgun_key:    str,
                  project_id:     int,
+                 cache_ttls:     Optional[Mapping[str, float]] = None,
+                 cache_size:     int = 2048,
+                 connection:     Optional[shotgun_api3.Shotgun] = None,
+                 snapshot_store: Optional[SnapshotStore] = None,
                 ):
-        self.sg= shotgun_api3.Shotgun(shotgun_server, shotgun_script, shotgun_key)
+        # A connection can be passed in to run against Mockgun in tests
+        if connection is None:
+            connection = shotgun_api3.Shotgun(shotgun_server, shotgun_script, shotgun_key)
+        self.sg = connection
         self.PROJECT_ID = project_id
+        self.cache = EntityCache(cache_ttls, cache_size)
+        self.snapshot = ProjectSnapshot(self.sg, project_id, ShotGridQueryHelper._untracked_asset_types, snapshot_store)
+        self._refresher = None
+        self._writes = 0
+
+        # Serve the last saved snapshot right away; preload() reconciles it with ShotGrid
+        self.snapshot.restore()
         super().__init__()
         pass
 
+    def preload(self, refresh_interval: Optional[float] = 60, background: bool = False) -> None:
+        """Load a snapshot of every asset and shot, then keep it in sync every refresh_interval seconds.
+
+        Until the snapshot has loaded, lookups fall back to querying ShotGrid.
+        """
+        if self._refresher is not None:
+            return
+        if not background:
+            self.snapshot.sync() # Loads everything unless the snapshot is already loaded and up to date
+        if refresh_interval or background:
+            # The refresher's first sync performs the full load if it hasn't happened yet
+            self._refresher = SnapshotRefresher(self.snapshot, refresh_interval or None)
+            self._refresher.start()
+
+    @property
+    def generation(self) -> int:
+        """A number that goes up whenever data served by the database may have changed."""
+        return self._writes + self.snapshot.generation
+
+    def refresh(self, full: bool = False) -> None:
+        """Bring the snapshot and cache up to date with ShotGrid right away."""
+        self.cache.clear()
+        self._writes += 1
+        if full:
+            self.snapshot.load()
+        else:
+            self.snapshot.sync() # Also does a full load if the snapshot hasn't been loaded yet
+
+    def stop_refreshing(self) -> None:
+        if self._refresher is not None:
+            self._refresher.stop()
+            self._refresher = None
+
+    def get_cache_stats(self) -> dict:
+        return self.cache.stats()
+
+    def _get_one_asset_json(self, name: str) -> dict:
+        if self.snapshot.is_loaded:
+            asset = self.snapshot.find_asset(name)
+            if asset is not None:
+                return asset
+        return self.cache.get('Asset', ('name', name), lambda: GetOneAssetByName(self, name).get())
+
+    def _get_one_shot_json(self, name: str) -> dict:
+        if self.snapshot.is_loaded:
+            shot = self.snapshot.find_shot(name)
+            if shot is not None:
+                return shot
+        return self.cache.get('Shot', ('name', name), lambda: GetOneShotByName(self, name).get())
+
+    def _after_write(self, entity_type: str, entity_id: int, deleted: bool = False) -> None:
+        self.cache.invalidate(entity_type)
+        self._writes += 1
+        if not self.snapshot.is_loaded:
+            return
+        # Only fetch what was written, so a write never waits on a full
+        # load of a stale snapshot; the refresher picks up the rest
+        if deleted:
+            self.snapshot.discard(entity_type, entity_id)
+        else:
+            self.snapshot.refresh_entity(entity_type, entity_id)
+        if self._refresher is not None:
+            self._refresher.wake()
+
     def get_asset(self, name: str) -> Asset:
-        asset = GetOneAssetByName(self, name).get()
+        asset = self._get_one_asset_json(name)
         sg_path = asset['sg_path']
         asset_name = os.path.basename(sg_path)
         assert name.lower() == asset_name
         return Asset(asset_name, path = asset['sg_path'], id = asset['id'])
         
     def get_assets(self, names: Iterable[str]) -> Set[Asset]:
-        assets = GetAllAssetsByName(self, names).get()
-        return set(
-            Asset(
-                os.path.basename(asset['sg_path']),
-                path = asset['sg_path']
-            ) for asset in assets
-        )
+        return set(self.resolve_assets(names).values())
+
+    def _resolve_json(self, entity_type: str, names: Iterable[str], query_helper) -> dict:
+        """Resolve names to entity JSON, querying ShotGrid once for every name that isn't cached."""
+        resolved = {}
+        missing = []
+        for name in dict.fromkeys(names): # Remove duplicates but keep the order
+            entity = None
+            if self.snapshot.is_loaded:
+                entity = self.snapshot.find_asset(name) if entity_type == 'Asset' else self.snapshot.find_shot(name)
+            if entity is None:
+                entity = self.cache.peek(entity_type, ('name', name))
+            if entity is None:
+                missing.append(name)
+            else:
+                resolved[name] = entity
+
+        if missing:
+            for name, entity in query_helper(self, missing).get().items():
+                self.cache.put(entity_type, ('name', name), entity)
+                resolved[name] = entity
+        return resolved
+
+    def resolve_assets(self, names: Iterable[str]) -> Dict[str, Asset]:
+        """Map each asset name to its Asset, using at most one ShotGrid query. Names that aren't found are left out."""
+        return {
+            name: Asset(os.path.basename(asset['sg_path']), path = asset['sg_path'], id = asset['id'])
+            for name, asset in self._resolve_json('Asset', names, ResolveAssetsByName).items()
+        }
+
+    def resolve_shots(self, names: Iterable[str]) -> Dict[str, dict]:
+        """Map each shot name to its shot dictionary, using at most one ShotGrid query. Names that aren't found are left out."""
+        return {
+            name: dict(shot)
+            for name, shot in self._resolve_json('Shot', names, ResolveShotsByName).items()
+        }
     
     def get_shot(self, name: str) -> dict:
-        shot_dictionary = GetOneShotByName(self, name).get()
+        shot_dictionary = dict(self._get_one_shot_json(name))
         return shot_dictionary
 
     def get_asset_id(self, name: str) -> int:
-        return GetOneAssetByName(self, name).get()['id']
+        return self._get_one_asset_json(name)['id']
 
     def get_shot_id(self, name: str):
-        return GetOneShotByName(self, name).get()['id']
+        return self._get_one_shot_json(name)['id']
 
     def get_asset_list(self) -> Sequence[str]:
+        if self.snapshot.is_loaded:
+            return self.snapshot.get_asset_list()
+        return list(self.cache.get('Asset', 'list', self._query_asset_list))
+
+    def _query_asset_list(self) -> Sequence[str]:
 
         def is_set_in_tag_name(asset):
             for tag in asset['tags']:
@@ -80,6 +195,11 @@ class ShotGridDatabase(Database):
 
     # TODO: For consistency, you could convert these to use the query helper, but for now I don't want to fix something that's not broken :)
     def get_set_list(self) -> Sequence[str]:
+        if self.snapshot.is_loaded:
+            return self.snapshot.get_set_list()
+        return list(self.cache.get('Asset', 'set_list', self._query_set_list))
+
+    def _query_set_list(self) -> Sequence[str]:
         filters = [
             [ 'project', 'is', { 'type': 'Project', 'id': self.PROJECT_ID } ],
             [ 'sg_status_list', 'is_not', 'oop' ],
@@ -108,6 +228,11 @@ class ShotGridDatabase(Database):
 
     # TODO: For consistency, you could convert these to use the query helper, but for now I don't want to fix something that's not broken :)
     def get_shot_list(self) -> Sequence[str]:
+        if self.snapshot.is_loaded:
+            return self.snapshot.get_shot_list()
+        return list(self.cache.get('Shot', 'list', self._query_shot_list))
+
+    def _query_shot_list(self) -> Sequence[str]:
         filters = [
             [ 'project', 'is', { 'type': 'Project', 'id': self.PROJECT_ID } ],
             [ 'sg_status_list', 'is_not', 'oop' ],
@@ -127,12 +252,18 @@ class ShotGridDatabase(Database):
     def set_asset_field(self, asset, field, value): 
         data = {field: value}
         asset_id = self.get_asset_id(asset)
-        self.sg.update("Asset", asset_id, data)
+        self.update("Asset", asset_id, data)
 
     def set_shot_field(self, shot, field, value):
         data = {field: value}
         shot_id = self.get_shot_id(shot)
-        self.sg.update("Shot", shot_id, data)
+        self.update("Shot", shot_id, data)
+
+    def update(self, entity_type: str, entity_id: int, data: dict) -> dict:
+        """Update an entity in ShotGrid and drop any cached or snapshotted results for its type."""
+        result = self.sg.update(entity_type, entity_id, data)
+        self._after_write(entity_type, entity_id)
+        return result
     
     def create_asset(self, name, asset_path, asset_type='Environment', parent_id: Optional[int]=None) -> dict:
         data = {
@@ -145,16 +276,19 @@ class ShotGridDatabase(Database):
         if parent_id is not None:
             data['parents'] = [{'type': 'Asset', 'id': parent_id}]
 
-        return self.sg.create('Asset', data)
+        result = self.sg.create('Asset', data)
+        self._after_write('Asset', result['id'])
+        return result
     
     def create_variant(self, name, parent_name) -> dict:
         parent = self.get_asset(parent_name)
         asset_path = parent.path
         parent_id = parent.id
-        return self.create_asset(name, asset_path, parent_id=parent_id)
+        return self.create_asset(name, asset_path, parent_id=parent_id) # create_asset invalidates the cache
 
     def delete_asset_by_id(self, id: int):
         self.sg.delete('Asset', id)
+        self._after_write('Asset', id, deleted=True)
 
 
 class ShotGridQueryHelper(ABC):
@@ -287,6 +421,42 @@ class GetAllAssetsByName(AssetQueryHelper):
         self.filters = self._create_base_filter()
         return self._get_all_assets_by_code_names(self.names)
 
+class ResolveAssetsByName(AssetQueryHelper):
+    """ Resolves many asset names with a single query, matching each name against the sg_path basename first and the code second. """
+    def __init__(self, database: ShotGridDatabase, names: Iterable[str], additional_fields: list = [], override_fields=False, filter_out_variants=True):
+        self.names = list(names)
+        super().__init__(database, additional_fields, override_fields, filter_out_variants)
+
+    def _get_path_or_code_name_filter(self, names: Iterable[str]) -> dict:
+        return {
+            'filter_operator': 'any',
+            'filters': self._get_path_name_filter(names)['filters'] + self._get_code_name_filter(names)['filters'],
+        }
+
+    # Override
+    def get(self) -> dict:
+        if not self.names:
+            return {}
+        self.filters.append(self._get_path_or_code_name_filter(self.names))
+        assets = self._get_all_asset_json()
+
+        # Index the results so that each name is matched in constant time
+        by_base_name = {}
+        by_code = {}
+        for asset in assets:
+            base_name = (asset['sg_path'] or '').split('/')[-1].lower()
+            if base_name in by_base_name:
+                log.warning(f"Multiple assets have a path ending in {base_name}")
+            by_base_name.setdefault(base_name, asset)
+            by_code.setdefault(asset['code'], asset)
+
+        resolved = {}
+        for name in self.names:
+            asset = by_base_name.get(name.lower(), by_code.get(name))
+            if asset is not None:
+                resolved[name] = asset
+        return resolved
+
 class GetOneAssetByName(GetAllAssetsByName):
     def __init__(self, database: ShotGridDatabase, name: Iterable[str], additional_fields: list = [], override_fields=False, filter_out_variants=True):
         self.name = name
@@ -341,6 +511,19 @@ class ShotQueryHelper(ShotGridQueryHelper):
         self.filters.append(self._get_code_name_filter(names))
         return self._get_all_shot_json()
 
+class ResolveShotsByName(ShotQueryHelper):
+    """ Resolves many shot names with a single query. """
+    def __init__(self, database: ShotGridDatabase, names: Iterable[str], additional_fields: list = [], override_fields=False):
+        self.names = list(names)
+        super().__init__(database, additional_fields, override_fields)
+
+    # Override
+    def get(self) -> dict:
+        if not self.names:
+            return {}
+        shots = {shot['code']: shot for shot in self._get_all_shots_by_code_names(self.names)}
+        return {name: shots[name] for name in self.names if name in shots}
+
 class GetOneShotByName(ShotQueryHelper):
     def __init__(self, database: ShotGridDatabase, shot_name, additional_fields: list = [], override_fields=False):
         self.shot_name = shot_name
@@ -0,0 +1,137 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from . import snapshot_store
+from .snapshot import ProjectSnapshot
+from .snapshot_store import SnapshotStore
+
+# Run test from the pipe directory with
+# python3 -m unittest database.SnapshotStoreTest
+# or in Studini with
+# from database import SnapshotStoreTest; SnapshotStoreTest.run_tests()
+
+PAYLOAD = {
+    'assets': [{
+        'type': 'Asset',
+        'id': 1,
+        'code': 'tree',
+        'sg_path': '/environment/setdressing/tree',
+        'sg_asset_type': 'Environment',
+        'sg_status_list': 'ip',
+        'parents': [],
+        'tags': [],
+    }],
+    'shots': [{
+        'type': 'Shot',
+        'id': 2,
+        'code': 'A_010',
+        'sg_cut_in': 1001,
+        'sg_cut_out': 1050,
+        'sg_status_list': 'ip',
+    }],
+    'last_updated': {'Asset': '2024-01-01T00:00:00+00:00', 'Shot': None},
+}
+
+
+class SnapshotStoreTest(unittest.TestCase):
+    def setUp(self): # Runs before each test
+        self.root = tempfile.mkdtemp(prefix='accomplice_snapshot_store_')
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, 'shotgrid_snapshot_1.json.gz')
+        self.store = SnapshotStore(1, self.path)
+
+    def read_document(self) -> dict:
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def write_document(self, document: dict) -> None:
+        with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+            json.dump(document, f)
+
+    def assertMiss(self) -> None:
+        self.assertIsNone(self.store.read())
+
+        # A snapshot restored from it falls back to loading from ShotGrid
+        snapshot = ProjectSnapshot(None, 1, store=self.store)
+        self.assertFalse(snapshot.restore())
+        self.assertFalse(snapshot.is_loaded)
+
+    def test_round_trip(self):
+        self.store.write(PAYLOAD)
+        self.assertEqual(self.store.read(), PAYLOAD)
+
+        snapshot = ProjectSnapshot(None, 1, store=self.store)
+        self.assertTrue(snapshot.restore())
+        self.assertTrue(snapshot.is_stale)
+        self.assertEqual(snapshot.get_asset_list(), ['tree'])
+        self.assertEqual(snapshot.find_shot('A_010')['sg_cut_out'], 1050)
+
+    def test_missing(self):
+        self.assertMiss()
+
+    def test_truncated(self):
+        self.store.write(PAYLOAD)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        for size in (len(data) - 8, len(data) // 2, 10, 0):
+            with open(self.path, 'wb') as f:
+                f.write(data[:size])
+            self.assertMiss()
+
+    def test_garbled(self):
+        self.store.write(PAYLOAD)
+        with open(self.path, 'r+b') as f:
+            f.seek(20)
+            f.write(b'\xff' * 16)
+        self.assertMiss()
+
+        with open(self.path, 'wb') as f:
+            f.write(b'Not gzipped')
+        self.assertMiss()
+
+        with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+            f.write('{"schema_version": 1, "payload":')
+        self.assertMiss()
+
+        self.write_document(['Not', 'a', 'document'])
+        self.assertMiss()
+
+    def test_checksum_mismatch(self):
+        self.store.write(PAYLOAD)
+        document = self.read_document()
+        document['payload']['shots'][0]['sg_cut_out'] = 1100
+        self.write_document(document)
+        self.assertMiss()
+
+    def test_schema_version(self):
+        self.store.write(PAYLOAD)
+        document = self.read_document()
+        document['schema_version'] = snapshot_store.SCHEMA_VERSION + 1
+        self.write_document(document)
+        self.assertMiss()
+
+    def test_project_id(self):
+        SnapshotStore(2, self.path).write(PAYLOAD)
+        self.assertMiss()
+
+    def test_malformed_payload(self):
+        # Stored intact, but not a snapshot
+        self.store.write({'assets': 'tree'})
+        snapshot = ProjectSnapshot(None, 1, store=self.store)
+        self.assertFalse(snapshot.restore())
+        self.assertFalse(snapshot.is_loaded)
+
+
+def run_tests():
+    tests = unittest.TestSuite()
+    tests.addTest(unittest.TestLoader().loadTestsFromTestCase(SnapshotStoreTest))
+    runner = unittest.TextTestRunner(verbosity=3, failfast=True)
+    runner.run(tests)
+
+
+if __name__ == '__main__':
+    run_tests()
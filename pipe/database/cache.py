@@ -0,0 +1,148 @@
+"""A small in-memory cache for ShotGrid entities."""
+
+import logging
+import time
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, Callable, Hashable, Mapping, Optional
+
+log = logging.getLogger(__name__)
+
+# How long (in seconds) cached results stay fresh for each entity type
+DEFAULT_TTLS = {
+    'Asset': 5 * 60,
+    'Shot': 10 * 60,
+}
+
+_MISSING = object()
+
+
+class EntityCache:
+    """A bounded, thread-safe LRU cache with per-entity-type TTLs.
+
+    Entries are keyed by the ShotGrid entity type (e.g. 'Asset') and a
+    key describing the query (e.g. ('name', 'tree') or 'list'). Writes to
+    ShotGrid should call invalidate() for the entity type they touch so
+    that stale query results are never served.
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Mapping[str, float]] = None,
+        max_entries: int = 2048,
+        default_ttl: float = 60,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize an EntityCache.
+
+        Keyword arguments:
+        - ttls -- maps entity types to their time-to-live in seconds
+        - max_entries -- the most entries to keep before evicting the
+          least recently used one
+        - default_ttl -- the time-to-live for entity types not in ttls
+        - clock -- returns the current time in seconds (for testing)
+        """
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _ttl(self, entity_type: str) -> float:
+        return self.ttls.get(entity_type, self.default_ttl)
+
+    def get(
+        self,
+        entity_type: str,
+        key: Hashable,
+        loader: Callable[[], Any],
+    ) -> Any:
+        """Return the cached value, calling loader() on a miss."""
+        value = self.peek(entity_type, key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        # Load outside the lock so one slow query doesn't block every
+        # other lookup
+        value = loader()
+        self.put(entity_type, key, value)
+        return value
+
+    def peek(
+        self,
+        entity_type: str,
+        key: Hashable,
+        default: Any = None,
+    ) -> Any:
+        """Return the cached value, or default if it is missing or stale.
+
+        Unlike get(), a miss doesn't load anything, which lets callers
+        batch the loads for several missing keys into one query.
+        """
+        cache_key = (entity_type, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                expires_at, value = entry
+                if self._clock() < expires_at:
+                    self._entries.move_to_end(cache_key)
+                    self.hits += 1
+                    return value
+                del self._entries[cache_key]
+            self.misses += 1
+            return default
+
+    def put(self, entity_type: str, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used if full."""
+        cache_key = (entity_type, key)
+        with self._lock:
+            self._entries[cache_key] = (
+                self._clock() + self._ttl(entity_type), value)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(
+        self,
+        entity_type: str,
+        key: Optional[Hashable] = None,
+    ) -> None:
+        """Drop one entry, or every entry of the entity type."""
+        with self._lock:
+            if key is not None:
+                self._entries.pop((entity_type, key), None)
+                return
+
+            stale = [k for k in self._entries if k[0] == entity_type]
+            for cache_key in stale:
+                del self._entries[cache_key]
+        log.debug(f"Invalidated {len(stale)} cached {entity_type} entries")
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> dict:
+        """Return the cache's hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
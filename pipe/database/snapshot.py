@@ -0,0 +1,400 @@
+"""An indexed, in-memory copy of the project's ShotGrid assets and shots."""
+
+import logging
+from datetime import datetime, timedelta
+from threading import Event, RLock, Thread
+from typing import Iterable, List, Optional, Sequence, Set
+
+from .snapshot_store import SnapshotStore
+
+log = logging.getLogger(__name__)
+
+ASSET_FIELDS = [
+    'code',
+    'id',
+    'sg_path',
+    'sg_asset_type',
+    'sg_status_list',
+    'parents',
+    'tags',
+    'updated_at',
+]
+
+SHOT_FIELDS = [
+    'code',
+    'id',
+    'sg_cut_in',
+    'sg_cut_out',
+    'sg_status_list',
+    'updated_at',
+]
+
+# Re-fetch a little before the last sync so updates made within the same
+# second as the previous poll aren't missed
+_SYNC_OVERLAP = timedelta(seconds=2)
+
+
+def _base_name(asset: dict) -> str:
+    return (asset['sg_path'] or '').split('/')[-1]
+
+
+def _is_set(asset: dict) -> bool:
+    return any("_Set_" in tag['name'] for tag in asset['tags'] or [])
+
+
+class _Index:
+    """Maps keys to the ids of the entities that have them."""
+
+    def __init__(self) -> None:
+        self._ids = {}
+
+    def add(self, key, entity_id: int) -> None:
+        self._ids.setdefault(key, set()).add(entity_id)
+
+    def discard(self, key, entity_id: int) -> None:
+        ids = self._ids.get(key)
+        if ids is not None:
+            ids.discard(entity_id)
+            if not ids:
+                del self._ids[key]
+
+    def get(self, key) -> Set:
+        return self._ids.get(key, frozenset())
+
+    def clear(self) -> None:
+        self._ids.clear()
+
+
+class ProjectSnapshot:
+    """Every tracked, non-oop Asset and Shot in the project, indexed.
+
+    load() pulls the whole project in one query per entity type; sync()
+    then only asks ShotGrid for entities whose updated_at is newer than
+    the last sync, and for the ids of retired entities, since retiring
+    an entity doesn't show up in the delta query. Only one load or sync
+    runs at a time.
+
+    If a store is given, the snapshot is saved to it after every change,
+    and restore() can warm the snapshot from it before ShotGrid has been
+    queried. A restored snapshot is served right away but marked stale,
+    so the next sync() reconciles it with a full load.
+    """
+
+    def __init__(
+        self,
+        sg,
+        project_id: int,
+        untracked_asset_types: Iterable[str] = (),
+        store: Optional[SnapshotStore] = None,
+    ) -> None:
+        self.sg = sg
+        self.project_id = project_id
+        self.untracked_asset_types = set(untracked_asset_types)
+        self.store = store
+
+        self._lock = RLock()
+        self._sync_lock = RLock() # Held for a whole load or sync, so they don't interleave
+        self._assets = {}
+        self._shots = {}
+        self._last_updated = {'Asset': None, 'Shot': None}
+
+        self.assets_by_code = _Index()
+        self.assets_by_base_name = _Index()
+        self.assets_by_tag = _Index()
+        self.assets_by_parent = _Index()
+        self.shots_by_code = _Index()
+
+        self.is_loaded = False
+        self.is_stale = False
+
+        self.generation = 0
+        """Incremented every time the snapshot's contents change."""
+
+    def _find(self, entity_type: str, fields: List[str], since=None) -> list:
+        filters = [
+            ['project', 'is', {'type': 'Project', 'id': self.project_id}],
+        ]
+        if since is None:
+            filters.append(['sg_status_list', 'is_not', 'oop'])
+        else:
+            # Include oop entities so that ones that were just marked oop
+            # get dropped from the snapshot
+            filters.append(['updated_at', 'greater_than', since - _SYNC_OVERLAP])
+        return self.sg.find(entity_type, filters, fields)
+
+    def _find_retired_ids(self, entity_type: str) -> Set[int]:
+        filters = [
+            ['project', 'is', {'type': 'Project', 'id': self.project_id}],
+        ]
+        return {entity['id'] for entity in self.sg.find(entity_type, filters, ['id'], retired_only=True)}
+
+    def _is_tracked_asset(self, asset: dict) -> bool:
+        return (asset['sg_status_list'] != 'oop'
+                and asset['sg_asset_type'] not in self.untracked_asset_types)
+
+    def _track_updated_at(self, entity_type: str, entity: dict, track: bool = True) -> None:
+        # updated_at is only needed for syncing, and datetimes aren't JSON
+        # serializable, so don't keep it on the entity
+        updated_at = entity.pop('updated_at', None)
+        last = self._last_updated[entity_type]
+        if track and updated_at is not None and (last is None or updated_at > last):
+            self._last_updated[entity_type] = updated_at
+
+    def _remove_asset(self, asset_id: int) -> None:
+        asset = self._assets.pop(asset_id, None)
+        if asset is None:
+            return
+        self.assets_by_code.discard(asset['code'], asset_id)
+        self.assets_by_base_name.discard(_base_name(asset).lower(), asset_id)
+        for tag in asset['tags'] or []:
+            self.assets_by_tag.discard(tag['name'], asset_id)
+        for parent in asset['parents'] or []:
+            self.assets_by_parent.discard(parent['id'], asset_id)
+
+    def _upsert_asset(self, asset: dict, track: bool = True) -> None:
+        self._track_updated_at('Asset', asset, track)
+        self._remove_asset(asset['id'])
+        if not self._is_tracked_asset(asset):
+            return
+        asset_id = asset['id']
+        self._assets[asset_id] = asset
+        self.assets_by_code.add(asset['code'], asset_id)
+        self.assets_by_base_name.add(_base_name(asset).lower(), asset_id)
+        for tag in asset['tags'] or []:
+            self.assets_by_tag.add(tag['name'], asset_id)
+        for parent in asset['parents'] or []:
+            self.assets_by_parent.add(parent['id'], asset_id)
+
+    def _remove_shot(self, shot_id: int) -> None:
+        shot = self._shots.pop(shot_id, None)
+        if shot is not None:
+            self.shots_by_code.discard(shot['code'], shot_id)
+
+    def _upsert_shot(self, shot: dict, track: bool = True) -> None:
+        self._track_updated_at('Shot', shot, track)
+        self._remove_shot(shot['id'])
+        if shot['sg_status_list'] == 'oop':
+            return
+        self._shots[shot['id']] = shot
+        self.shots_by_code.add(shot['code'], shot['id'])
+
+    def _replace(self, assets: Iterable[dict], shots: Iterable[dict]) -> None:
+        with self._lock:
+            self._assets.clear()
+            self._shots.clear()
+            self._last_updated = {'Asset': None, 'Shot': None}
+            for index in (self.assets_by_code, self.assets_by_base_name,
+                          self.assets_by_tag, self.assets_by_parent,
+                          self.shots_by_code):
+                index.clear()
+            for asset in assets:
+                self._upsert_asset(asset)
+            for shot in shots:
+                self._upsert_shot(shot)
+            self.is_loaded = True
+            self.generation += 1
+
+    def load(self) -> None:
+        """Replace the snapshot with a full copy of the project."""
+        with self._sync_lock:
+            assets = self._find('Asset', ASSET_FIELDS)
+            shots = self._find('Shot', SHOT_FIELDS)
+            self._replace(assets, shots)
+            self.is_stale = False
+            self.save()
+        log.info(f"Loaded {len(self._assets)} assets and "
+                 f"{len(self._shots)} shots from ShotGrid")
+
+    def sync(self) -> int:
+        """Pull entities changed since the last sync.
+
+        Returns the number of changed or removed entities. Falls back to
+        a full load if the snapshot hasn't been loaded yet or is stale.
+        """
+        with self._sync_lock:
+            if not self.is_loaded or self.is_stale:
+                self.load()
+                return len(self._assets) + len(self._shots)
+
+            assets = self._find('Asset', ASSET_FIELDS, self._last_updated['Asset'])
+            shots = self._find('Shot', SHOT_FIELDS, self._last_updated['Shot'])
+            retired_asset_ids = self._find_retired_ids('Asset')
+            retired_shot_ids = self._find_retired_ids('Shot')
+            with self._lock:
+                for asset in assets:
+                    self._upsert_asset(asset)
+                for shot in shots:
+                    self._upsert_shot(shot)
+                retired_asset_ids &= self._assets.keys()
+                retired_shot_ids &= self._shots.keys()
+                for asset_id in retired_asset_ids:
+                    self._remove_asset(asset_id)
+                for shot_id in retired_shot_ids:
+                    self._remove_shot(shot_id)
+                changed = len(assets) + len(shots) + len(retired_asset_ids) + len(retired_shot_ids)
+                if changed:
+                    self.generation += 1
+            if changed:
+                log.debug(f"Synced {len(assets)} assets and {len(shots)} shots, "
+                          f"and dropped {len(retired_asset_ids) + len(retired_shot_ids)} retired ones")
+                self.save()
+            return changed
+
+    def refresh_entity(self, entity_type: str, entity_id: int) -> None:
+        """Fetch one entity, e.g. after writing to it, without waiting for a sync.
+
+        This doesn't move the point the next sync queries from, so it
+        doesn't hide changes made elsewhere in the meantime.
+        """
+        filters = [['id', 'is', entity_id]]
+        if entity_type == 'Asset':
+            asset = self.sg.find_one('Asset', filters, ASSET_FIELDS)
+            with self._lock:
+                if asset is None: # Deleted
+                    self._remove_asset(entity_id)
+                else:
+                    self._upsert_asset(asset, track=False)
+                self.generation += 1
+        elif entity_type == 'Shot':
+            shot = self.sg.find_one('Shot', filters, SHOT_FIELDS)
+            with self._lock:
+                if shot is None: # Deleted
+                    self._remove_shot(entity_id)
+                else:
+                    self._upsert_shot(shot, track=False)
+                self.generation += 1
+
+    def to_payload(self) -> dict:
+        """Return the snapshot as JSON-serializable data."""
+        with self._lock:
+            return {
+                'assets': list(self._assets.values()),
+                'shots': list(self._shots.values()),
+                'last_updated': {
+                    entity_type: None if updated_at is None else updated_at.isoformat()
+                    for entity_type, updated_at in self._last_updated.items()
+                },
+            }
+
+    def save(self) -> None:
+        """Write the snapshot to the store, if there is one."""
+        if self.store is None:
+            return
+        try:
+            self.store.write(self.to_payload())
+        except OSError:
+            log.exception(f"Could not save the snapshot to {self.store.path}")
+
+    def restore(self) -> bool:
+        """Warm the snapshot from the store. Returns whether it worked."""
+        if self.store is None:
+            return False
+        payload = self.store.read()
+        if payload is None:
+            return False
+        with self._sync_lock:
+            try:
+                self._replace(payload['assets'], payload['shots'])
+                with self._lock:
+                    self._last_updated = {
+                        entity_type: None if updated_at is None else datetime.fromisoformat(updated_at)
+                        for entity_type, updated_at in payload['last_updated'].items()
+                    }
+            except (KeyError, TypeError, ValueError):
+                log.warning(f"Ignoring malformed snapshot cache at {self.store.path}")
+                self._replace([], [])
+                self.is_loaded = False
+                return False
+            self.is_stale = True
+        log.info(f"Restored {len(self._assets)} assets and "
+                 f"{len(self._shots)} shots from {self.store.path}")
+        return True
+
+    def discard(self, entity_type: str, entity_id: int) -> None:
+        """Drop an entity, e.g. after it has been deleted."""
+        with self._lock:
+            if entity_type == 'Asset':
+                self._remove_asset(entity_id)
+            elif entity_type == 'Shot':
+                self._remove_shot(entity_id)
+            self.generation += 1
+
+    def _get_assets(self, ids: Iterable[int]) -> List[dict]:
+        return [self._assets[asset_id] for asset_id in sorted(ids)]
+
+    def find_asset(self, name: str) -> Optional[dict]:
+        """Find a top-level asset by sg_path basename, then by code."""
+        with self._lock:
+            for ids in (self.assets_by_base_name.get(name.lower()),
+                        self.assets_by_code.get(name)):
+                assets = [a for a in self._get_assets(ids) if not a['parents']]
+                if assets:
+                    return assets[0]
+        return None
+
+    def find_shot(self, name: str) -> Optional[dict]:
+        with self._lock:
+            for shot_id in self.shots_by_code.get(name):
+                return self._shots[shot_id]
+        return None
+
+    def get_variants(self, parent_id: int) -> List[dict]:
+        with self._lock:
+            return self._get_assets(self.assets_by_parent.get(parent_id))
+
+    def get_assets_with_tag(self, tag: str) -> List[dict]:
+        with self._lock:
+            return self._get_assets(self.assets_by_tag.get(tag))
+
+    def get_asset_list(self) -> Sequence[str]:
+        with self._lock:
+            return [_base_name(asset) for asset in self._assets.values()
+                    if not asset['parents'] and not _is_set(asset)]
+
+    def get_set_list(self) -> Sequence[str]:
+        with self._lock:
+            return [asset['code'] for asset in self._assets.values()
+                    if _is_set(asset)]
+
+    def get_shot_list(self) -> Sequence[str]:
+        with self._lock:
+            # This excludes the test shots, which begin 'T_0...'
+            return [shot['code'] for shot in self._shots.values()
+                    if 't' not in shot['code'].lower()]
+
+
+class SnapshotRefresher(Thread):
+    """A thread that periodically syncs a ProjectSnapshot."""
+
+    def __init__(
+        self,
+        snapshot: ProjectSnapshot,
+        interval: Optional[float] = 60,
+    ) -> None:
+        """Initialize a SnapshotRefresher.
+
+        If interval is None, the snapshot is only synced when woken.
+        """
+        super().__init__(name='SnapshotRefresher', daemon=True)
+        self.snapshot = snapshot
+        self.interval = interval
+        self._stop_event = Event()
+        self._wake_event = Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            # Clear before syncing, so a wake() during the sync runs another
+            self._wake_event.clear()
+            try:
+                self.snapshot.sync()
+            except Exception:
+                log.exception("Could not sync the ShotGrid snapshot")
+            self._wake_event.wait(self.interval)
+
+    def wake(self) -> None:
+        """Sync now instead of waiting for the rest of the interval."""
+        self._wake_event.set()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._wake_event.set()
@@ -0,0 +1,103 @@
+"""Persist ShotGrid snapshots on disk so the pipe starts warm."""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import zlib
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+"""Bump this whenever the layout of the saved snapshot changes."""
+
+
+def default_cache_dir() -> str:
+    """Return the per-user directory the pipe caches data in."""
+    if str(os.name) == "nt":
+        base = os.getenv('LOCALAPPDATA', os.path.expanduser('~'))
+    else:
+        base = os.getenv('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    return os.path.join(base, 'accomplice')
+
+
+def _checksum(payload: dict) -> str:
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class SnapshotStore:
+    """A versioned, checksummed snapshot file.
+
+    Files are written to a temporary file in the same directory and then
+    renamed over the old one, so readers only ever see a complete file.
+    Anything that fails to validate is treated as a cache miss.
+    """
+
+    def __init__(self, project_id: int, path: Optional[str] = None) -> None:
+        if path is None:
+            path = os.path.join(default_cache_dir(),
+                                f'shotgrid_snapshot_{project_id}.json.gz')
+        self.project_id = project_id
+        self.path = path
+
+    def read(self) -> Optional[dict]:
+        """Return the saved payload, or None if it is missing or invalid."""
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                document = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, zlib.error):
+            log.warning(f"Ignoring corrupt snapshot cache at {self.path}")
+            return None
+
+        if not isinstance(document, dict):
+            log.warning(f"Ignoring corrupt snapshot cache at {self.path}")
+            return None
+        if document.get('schema_version') != SCHEMA_VERSION:
+            log.info(f"Ignoring snapshot cache with schema version "
+                     f"{document.get('schema_version')} at {self.path}")
+            return None
+        if document.get('project_id') != self.project_id:
+            log.warning(f"Ignoring snapshot cache for another project at {self.path}")
+            return None
+
+        payload = document.get('payload')
+        if not isinstance(payload, dict) or document.get('checksum') != _checksum(payload):
+            log.warning(f"Ignoring snapshot cache with a bad checksum at {self.path}")
+            return None
+        return payload
+
+    def write(self, payload: dict) -> None:
+        """Atomically replace the saved payload."""
+        document = {
+            'schema_version': SCHEMA_VERSION,
+            'project_id': self.project_id,
+            'checksum': _checksum(payload),
+            'payload': payload,
+        }
+
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot_')
+        try:
+            with os.fdopen(fd, 'wb') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                    f.write(json.dumps(document, separators=(',', ':')).encode('utf-8'))
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -19,6 +19,7 @@ from interface import PipeInterface
 pipe_true_root = os.path.realpath(os.path.dirname(__file__))
 
 _pipe_env_var = "BYU_FILM_PIPE"
+_server_engine_env_var = "PIPE_SERVER_ENGINE"
 
 
 # Configure logging
@@ -65,8 +66,18 @@ if __name__ == '__main__':
         default=os.getenv(_pipe_env_var),
     )
 
+    parser.add_argument(
+        '--server-engine',
+        help=f"serve pipe requests with the specified engine. Possible values are %(choices)s (defaults to ${_server_engine_env_var}, or threaded)",
+        choices=['threaded', 'asyncio'],
+        default=os.getenv(_server_engine_env_var, 'threaded'),
+    )
+
     args = parser.parse_args()
 
+    # Pipes read the engine when they're imported, so set it before launching
+    os.environ[_server_engine_env_var] = args.server_engine
+
     # Set the logging level
     logging.basicConfig(
         level=args.log_level,